@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark for Vector Memory chunkers
+
+Chunks the daily memory files and hourly summaries with the markdown and the
+fixed-window chunker and reports, for each:
+
+- chunk count, and chunk characters per source character (overlap redundancy)
+- the time to embed all chunks (bypassing the embedding cache)
+- how many list items (decisions, action items, ...) are cut across chunks
+- recall hit rate: each list item is used as a query, and a hit is a top-k
+  result that contains the whole item
+
+Usage:
+    python chunker-benchmark.py
+    python chunker-benchmark.py --memory-days 90 --queries 300 --k 3
+"""
+
+import os
+import sys
+import time
+import glob
+import argparse
+
+import numpy as np
+
+WORKSPACE_DIR = "/Users/karst/.openclaw/workspace"
+sys.path.append(WORKSPACE_DIR)
+
+import vector_memory_impl as vm
+from markdown_chunker import LIST_ITEM_PATTERN
+
+MIN_ITEM_WORDS = 5  # Shorter list items make poor queries
+
+def read_memory_files(days_back):
+    """(source, content) of the daily memory files and hourly summaries"""
+    patterns = [
+        os.path.join(vm.MEMORY_DIR, "*.md"),
+        os.path.join(vm.HOURLY_SUMMARIES_DIR, "*.md"),
+    ]
+    cutoff = time.time() - days_back * 86400
+
+    files = []
+    for pattern in patterns:
+        for file_path in sorted(glob.glob(pattern)):
+            if os.path.getmtime(file_path) < cutoff:
+                continue
+            with open(file_path, 'r') as f:
+                content = f.read()
+            if content.strip():
+                files.append((file_path, content))
+    return files
+
+def list_items(files):
+    """(source, item line) of the list items with at least MIN_ITEM_WORDS words"""
+    items = []
+    for source, content in files:
+        for line in content.splitlines():
+            if LIST_ITEM_PATTERN.match(line) and len(line.split()) > MIN_ITEM_WORDS:
+                items.append((source, line.strip()))
+    return items
+
+def benchmark_chunker(pipeline, chunker, files, items, k):
+    """Chunk and embed the files with one chunker and measure item recall"""
+    pipeline.chunker = chunker
+    start_time = time.time()
+    chunks = [chunk for source, content in files
+              for chunk in pipeline._create_chunks(content, source, "")]
+    chunk_s = time.time() - start_time
+
+    # The model is run directly, so the embedding cache does not favor the second chunker
+    texts = [chunk["text"] for chunk in chunks]
+    start_time = time.time()
+    vectors = pipeline._run_model(texts)
+    embed_s = time.time() - start_time
+
+    # Items cut in half are not contained whole in any chunk of their file
+    cut = sum(1 for source, item in items
+              if not any(item in chunk["text"] for chunk in chunks if chunk["source"] == source))
+
+    hits = 0
+    if items:
+        index = vm.build_index("flat", vectors)
+        queries = pipeline._run_model([LIST_ITEM_PATTERN.sub("", item) for _, item in items])
+        _, found = index.search(np.ascontiguousarray(queries, dtype='float32'), k)
+        for (source, item), ids in zip(items, found):
+            hits += any(item in texts[i] for i in ids if i != -1)
+
+    source_chars = sum(len(content) for _, content in files)
+    return {
+        "chunker": chunker,
+        "chunks": len(chunks),
+        "redundancy": sum(len(text) for text in texts) / max(1, source_chars),
+        "chunk_s": chunk_s,
+        "embed_s": embed_s,
+        "cut_items": cut,
+        "hit_rate": hits / max(1, len(items)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector Memory chunker benchmark")
+    parser.add_argument("--memory-days", type=int, default=365, help="Days of memory files to chunk")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled list item queries")
+    parser.add_argument("--k", type=int, default=3, help="Results per query")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for query sampling")
+    args = parser.parse_args()
+
+    files = read_memory_files(args.memory_days)
+    if not files:
+        print("No memory files to benchmark")
+        return
+
+    items = list_items(files)
+    rng = np.random.default_rng(args.seed)
+    if len(items) > args.queries:
+        items = [items[i] for i in sorted(rng.choice(len(items), size=args.queries, replace=False))]
+
+    pipeline = vm.VectorMemoryPipeline(read_only=True)
+    pipeline._load_model()
+    print(f"\nCorpus: {len(files)} files, {len(items)} list item queries, k={args.k}\n")
+    print(f"{'chunker':<10} {'chunks':>7} {'chars/src':>10} {'chunk s':>8} {'embed s':>8} "
+          f"{'cut items':>10} {'hit rate':>9}")
+
+    for chunker in vm.CHUNKERS:
+        result = benchmark_chunker(pipeline, chunker, files, items, args.k)
+        print(f"{result['chunker']:<10} {result['chunks']:>7} {result['redundancy']:>10.2f} "
+              f"{result['chunk_s']:>8.2f} {result['embed_s']:>8.2f} "
+              f"{result['cut_items']:>10} {result['hit_rate']:>9.3f}")
+
+if __name__ == "__main__":
+    main()
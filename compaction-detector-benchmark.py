@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the compaction detector
+
+Generates a synthetic stream of chat messages, a small share of them carrying
+a reset marker or a context window error, and times:
+
+- the per-rule scan the injector used before (lower-cased substring checks
+  for each reset marker, then re.search for each error pattern)
+- the compiled single-pass CompactionMatcher
+
+and checks that both flag the same messages.
+
+Usage:
+    python compaction-detector-benchmark.py
+    python compaction-detector-benchmark.py --messages 100000 --compaction-rate 0.01
+"""
+
+import re
+import sys
+import time
+import random
+import argparse
+
+WORKSPACE_DIR = "/Users/karst/.openclaw/workspace"
+sys.path.append(WORKSPACE_DIR)
+
+from compaction_detector import CompactionMatcher, RESET_MARKERS, ERROR_PATTERNS
+
+WORDS = ("the memory index summary session task decision context window token file "
+         "search result vector recall update hour note user assistant system message "
+         "deploy review plan check fix build test config cron job").split()
+
+COMPACTION_TEXTS = RESET_MARKERS + [
+    "Error: input length and max_tokens exceed context limit: 180000 > 16000",
+    "The context window size was exceeded for this request",
+    "token limit exceeded, please shorten the prompt",
+    "context buffer is completely full",
+    "Please retry with smaller context"
+]
+
+def synthetic_messages(count, compaction_rate, seed):
+    """Random chat messages of 5-200 words, compaction_rate of them with a compaction phrase"""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 200))]
+        if rng.random() < compaction_rate:
+            words.insert(rng.randint(0, len(words)), rng.choice(COMPACTION_TEXTS))
+        messages.append(" ".join(words))
+    return messages
+
+def per_rule_scan(content):
+    """The scan detect_compaction ran before the compiled matcher"""
+    for marker in RESET_MARKERS:
+        if marker.lower() in content.lower():
+            return True
+    for pattern in ERROR_PATTERNS:
+        if re.search(pattern, content, re.IGNORECASE):
+            return True
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Compaction detector benchmark")
+    parser.add_argument("--messages", type=int, default=100000, help="Number of synthetic messages")
+    parser.add_argument("--compaction-rate", type=float, default=0.01,
+                        help="Share of messages with a compaction phrase")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+
+    messages = synthetic_messages(args.messages, args.compaction_rate, args.seed)
+    print(f"\nStream: {len(messages)} messages, {sum(map(len, messages)) / len(messages):.0f} chars on average\n")
+
+    start_time = time.time()
+    expected = [per_rule_scan(message) for message in messages]
+    per_rule_s = time.time() - start_time
+
+    start_time = time.time()
+    matcher = CompactionMatcher()
+    compile_s = time.time() - start_time
+
+    start_time = time.time()
+    found = [matcher.search(message) for message in messages]
+    matcher_s = time.time() - start_time
+
+    mismatches = sum(1 for flagged, rule in zip(expected, found) if flagged != (rule is not None))
+    print(f"{'scan':<10} {'total s':>8} {'us/msg':>8} {'flagged':>8}")
+    print(f"{'per-rule':<10} {per_rule_s:>8.2f} {per_rule_s / len(messages) * 1e6:>8.1f} {sum(expected):>8}")
+    print(f"{'compiled':<10} {matcher_s:>8.2f} {matcher_s / len(messages) * 1e6:>8.1f} "
+          f"{sum(rule is not None for rule in found):>8}")
+    print(f"\nCompile time {compile_s * 1000:.2f}ms, speedup {per_rule_s / max(matcher_s, 1e-9):.1f}x, "
+          f"{mismatches} mismatches")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Compaction Detector - Context Retention System Component 2
+
+Precompiled compaction rules shared by the Post-Compaction Context Injector
+and the compaction handler script installed by --install-autocorrect.
+
+The reset markers (phrases the assistant uses after losing context) and the
+context window error patterns are compiled into one regex, so a message is
+scanned once instead of once per rule. A plain alternation of the rules
+would make the regex engine try every rule at every position, which is
+slower than the separate scans it replaces, so the lower-cased literal
+prefixes of the rules are merged into a trie first: at each position one
+character is compared, and only rules sharing that prefix are tried further.
+The message is lower-cased once and matched case-sensitively, which is
+several times faster than re.IGNORECASE; the regex parts of the error
+patterns after their literal prefix stay case-insensitive. An empty named
+group at the end of each rule tells which one matched. The first rule to
+match in the message is reported.
+"""
+
+import re
+from collections import namedtuple
+
+# Phrases that show the context was reset or lost
+RESET_MARKERS = [
+    "I'll start fresh",
+    "Let me start over",
+    "I'll reset and try again",
+    "Starting a new session",
+    "Context has been cleared",
+    "/new command detected",
+    "Previous context has been reset",
+    "input length and max_tokens exceed context limit",
+    "context window is full",
+    "context limit",
+    "exceed context limit",
+    "I don't have access to that information",
+    "I don't have that context",
+    "I don't have memory of that",
+    "I cannot access previous",
+    "seems I've lost some context"
+]
+
+# Context window errors
+ERROR_PATTERNS = [
+    r"input length .* exceed context limit",
+    r"context (?:window|limit) .* exceed",
+    r"token limit exceed",
+    r"context .* full",
+    r"retry with (?:smaller|less) (?:context|input)"
+]
+
+RESET_MARKER = "reset_marker"
+ERROR_PATTERN = "error_pattern"
+
+REGEX_SPECIAL = set(".^$*+?{}[]\\|()")
+QUANTIFIERS = set("*+?{")
+
+# name is the regex group of the rule, pattern the marker or error pattern as listed above
+CompactionRule = namedtuple("CompactionRule", ["name", "kind", "pattern"])
+
+def literal_prefix(pattern):
+    """Split a regex into its leading literal text and the rest of the pattern"""
+    end = 0
+    while end < len(pattern) and pattern[end] not in REGEX_SPECIAL:
+        end += 1
+    if end < len(pattern) and pattern[end] in QUANTIFIERS:
+        end = max(0, end - 1)  # The last literal character is quantified
+    return pattern[:end], pattern[end:]
+
+def trie_regex(node):
+    """
+    Regex for a trie of {character: subtrie}
+
+    The None key of a node holds (rest of the pattern, group name) of the
+    rules whose literal prefix ends there.
+    """
+    # Longer literals first, so a reset marker wins over an error pattern matching at the same position
+    branches = [re.escape(char) + trie_regex(child) for char, child in node.items() if char is not None]
+    branches += [f"(?i:{rest})(?P<{name}>)" if rest else f"(?P<{name}>)"
+                 for rest, name in node.get(None, [])]
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+class CompactionMatcher:
+    """Finds compaction rules in a message with a single regex scan"""
+
+    def __init__(self, reset_markers=RESET_MARKERS, error_patterns=ERROR_PATTERNS):
+        self.rules = {}
+        trie = {}
+        for kind, patterns in ((RESET_MARKER, reset_markers), (ERROR_PATTERN, error_patterns)):
+            for i, pattern in enumerate(patterns):
+                name = f"{kind}_{i}"
+                self.rules[name] = CompactionRule(name, kind, pattern)
+                if kind == RESET_MARKER:
+                    prefix, rest = pattern, ""
+                else:
+                    prefix, rest = literal_prefix(pattern)
+
+                node = trie
+                for char in prefix.lower():
+                    node = node.setdefault(char, {})
+                node.setdefault(None, []).append((rest, name))
+        self.regex = re.compile(trie_regex(trie))
+
+    def search(self, text):
+        """
+        Find the first compaction rule that matches the text
+
+        Returns:
+            The CompactionRule that fired, or None
+        """
+        match = self.regex.search(text.lower())
+        if match is None:
+            return None
+        return self.rules[match.lastgroup]
+
+_matcher = None
+
+def get_matcher():
+    """Process-wide CompactionMatcher over the default rules"""
+    global _matcher
+    if _matcher is None:
+        _matcher = CompactionMatcher()
+    return _matcher
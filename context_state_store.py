@@ -0,0 +1,262 @@
+"""
+Context State Store - Context Retention System Component 2
+
+Journaled state store for the Post-Compaction Context Injector.
+
+The state (sessions with their recent messages and compactions, recent
+message hashes and injections) is held in memory in bounded structures:
+
+- message hashes in a set for O(1) duplicate checks, with a ring buffer
+  that evicts the oldest hash once MAX_MESSAGE_HASHES are tracked
+- per-session ring buffers of the last MAX_SESSION_MESSAGES messages and
+  MAX_SESSION_COMPACTIONS compactions, and of the last MAX_INJECTIONS injections
+
+Every change is appended to a journal (context-state.journal) as one JSON
+line instead of rewriting the whole state file. Every SNAPSHOT_EVERY events
+the state is written to the snapshot (context-state.json, in the format the
+injector always used) and the journal is started afresh. Loading reads the
+snapshot and replays the journal, skipping a torn last line; the next
+append truncates it first.
+
+Several processes can share the store: appends and snapshots hold an
+exclusive lock on context-state.lock, and each process first replays the
+events other processes appended since its last write, so duplicate
+detection and message counts agree across processes.
+"""
+
+import os
+import json
+import fcntl
+import logging
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger('context-injector')
+
+# Constants
+MAX_SESSION_MESSAGES = 50  # Recent messages kept per session
+MAX_SESSION_COMPACTIONS = 50  # Recent compactions kept per session
+MAX_MESSAGE_HASHES = 100  # Recent message hashes checked for duplicates
+MAX_INJECTIONS = 50  # Recent injections kept
+SNAPSHOT_EVERY = 1000  # Journaled events before the snapshot is rewritten
+
+class ContextStateStore:
+    """In-memory context state with an append-only journal and periodic snapshots"""
+
+    def __init__(self, path, snapshot_every=SNAPSHOT_EVERY):
+        """
+        Args:
+            path: Snapshot path (context-state.json); the journal and lock file sit next to it
+            snapshot_every: Journaled events before the snapshot is rewritten
+        """
+        base_path = os.path.splitext(path)[0]
+        self.path = path
+        self.journal_path = base_path + ".journal"
+        self.lock_path = base_path + ".lock"
+        self.snapshot_every = snapshot_every
+        self._journal = None  # Open journal, appended to and read from
+        self._journal_inode = None
+        self._offset = 0  # Journal bytes applied to the in-memory state
+        self._events = 0  # Events in the journal
+        self.state = None
+        self._hash_set = set()
+        self._load()
+
+    def _new_state(self):
+        return {
+            "sessions": {},
+            "last_compaction_time": None,
+            "last_update": datetime.now().isoformat(),
+            "message_hashes": deque(maxlen=MAX_MESSAGE_HASHES),
+            "injections": deque(maxlen=MAX_INJECTIONS)
+        }
+
+    def _read_snapshot(self):
+        """State from the snapshot, a new state if there is none"""
+        state = self._new_state()
+        if not os.path.exists(self.path):
+            return state
+
+        try:
+            with open(self.path, 'r') as f:
+                snapshot = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Error loading state file: {e}")
+            return state
+
+        state["last_compaction_time"] = snapshot.get("last_compaction_time")
+        state["last_update"] = snapshot.get("last_update", state["last_update"])
+        state["message_hashes"].extend(snapshot.get("message_hashes", []))
+        state["injections"].extend(snapshot.get("injections", []))
+        for session_id, session in snapshot.get("sessions", {}).items():
+            state["sessions"][session_id] = self._new_session(session.get("last_activity"))
+            state["sessions"][session_id].update({
+                "last_message_id": session.get("last_message_id"),
+                "message_count": session.get("message_count", 0)
+            })
+            state["sessions"][session_id]["messages"].extend(session.get("messages", []))
+            state["sessions"][session_id]["compactions"].extend(session.get("compactions", []))
+        return state
+
+    @staticmethod
+    def _new_session(timestamp):
+        return {
+            "last_message_id": None,
+            "message_count": 0,
+            "messages": deque(maxlen=MAX_SESSION_MESSAGES),
+            "last_activity": timestamp,
+            "compactions": deque(maxlen=MAX_SESSION_COMPACTIONS)
+        }
+
+    def _load(self):
+        """Load the snapshot and replay the journal"""
+        self.state = self._read_snapshot()
+        self._hash_set = set(self.state["message_hashes"])
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, 'a+')
+        self._journal_inode = os.fstat(self._journal.fileno()).st_ino
+        self._offset = 0
+        self._events = 0
+        self._catch_up()
+
+    def _catch_up(self):
+        """Apply the events appended to the journal since it was last read"""
+        if os.stat(self.journal_path).st_ino != self._journal_inode:
+            # Another process wrote a snapshot and started a new journal
+            self._load()
+            return
+
+        self._journal.seek(self._offset)
+        for line in self._journal:
+            if not line.endswith("\n"):
+                break  # Torn write, the rest of the line is never coming
+            self._offset += len(line.encode())
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Skipping unreadable state journal entry: {e}")
+                continue
+            self._events += 1
+
+    def _apply(self, event):
+        """Apply one journaled event to the in-memory state"""
+        state = self.state
+        op = event["op"]
+        if op == "message":
+            session = state["sessions"].get(event["session_id"])
+            if session is None:
+                session = state["sessions"][event["session_id"]] = self._new_session(event["timestamp"])
+            session["messages"].append({
+                "id": event["id"],
+                "timestamp": event["timestamp"],
+                "role": event["role"],
+                "hash": event["hash"]
+            })
+            session["last_message_id"] = event["id"]
+            session["message_count"] += 1
+            session["last_activity"] = event["timestamp"]
+
+            hashes = state["message_hashes"]
+            if len(hashes) == hashes.maxlen:
+                self._hash_set.discard(hashes[0])
+            hashes.append(event["hash"])
+            self._hash_set.add(event["hash"])
+        elif op == "compaction":
+            session = state["sessions"].get(event["session_id"])
+            if session is not None:
+                session["compactions"].append({
+                    "timestamp": event["timestamp"],
+                    "message_count_before": session["message_count"]
+                })
+                state["last_compaction_time"] = event["timestamp"]
+        elif op == "injection":
+            state["injections"].append(event["injection"])
+        state["last_update"] = event.get("timestamp", state["last_update"])
+
+    def _lock(self):
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    @staticmethod
+    def _unlock(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def has_message_hash(self, content_hash):
+        """Whether a message with this content hash was registered recently"""
+        return content_hash in self._hash_set
+
+    def record(self, event, accept=None):
+        """
+        Journal an event and apply it
+
+        Args:
+            event: Event dictionary with an "op" key
+            accept: Optional check run on the caught-up state; the event is
+                dropped if it returns False
+
+        Returns:
+            True if the event was recorded
+        """
+        fd = self._lock()
+        try:
+            self._catch_up()
+            if accept is not None and not accept():
+                return False
+
+            # Drop a torn line left by a writer that died, so this event starts its own line
+            if os.fstat(self._journal.fileno()).st_size > self._offset:
+                self._journal.truncate(self._offset)
+
+            line = json.dumps(event) + "\n"
+            self._journal.seek(0, os.SEEK_END)
+            self._journal.write(line)
+            self._journal.flush()
+            self._offset = self._journal.tell()
+            self._apply(event)
+            self._events += 1
+
+            if self._events >= self.snapshot_every:
+                self._write_snapshot()
+        except IOError as e:
+            logger.error(f"Error writing state journal: {e}")
+            return False
+        finally:
+            self._unlock(fd)
+        return True
+
+    def snapshot(self):
+        """Write the current state to the snapshot and start a new journal"""
+        fd = self._lock()
+        try:
+            self._catch_up()
+            self._write_snapshot()
+        except IOError as e:
+            logger.error(f"Error saving state file: {e}")
+        finally:
+            self._unlock(fd)
+
+    def _write_snapshot(self):
+        """Write the snapshot atomically and start a new journal, with the lock held"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.state, f, indent=2, default=list)
+        os.replace(temp_path, self.path)
+
+        # A fresh journal file; other processes notice the new inode and reload
+        temp_journal = self.journal_path + ".tmp"
+        open(temp_journal, 'w').close()
+        os.replace(temp_journal, self.journal_path)
+        self._journal.close()
+        self._journal = open(self.journal_path, 'a+')
+        self._journal_inode = os.fstat(self._journal.fileno()).st_ino
+        self._offset = 0
+        self._events = 0
+        logger.debug(f"State saved to {self.path}")
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
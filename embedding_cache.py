@@ -0,0 +1,281 @@
+"""
+Embedding Cache - Context Retention System
+
+Shared on-disk cache of text embeddings, consulted by the vector memory
+pipeline, LocalEmbedder and SemanticCompressor before running the model, so
+text that was embedded once is never embedded again.
+
+Vectors are stored as float16 in a fixed-capacity memory-mapped array
+(embedding-cache.f16). A small SQLite database (embedding-cache.db) maps the
+content hash of each text to its slot in the array and tracks when the slot
+was last used; once the array is full the least recently used slots are
+reused. Keys include a namespace (the model and pooling used), so components
+that embed the same text differently never share vectors.
+
+Hit and miss counters are kept per process and accumulated in the database.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger('embedding-cache')
+
+# Constants
+WORKSPACE_DIR = "/Users/karst/.openclaw/workspace"
+CACHE_PATH = os.path.join(WORKSPACE_DIR, "memory", "vectors", "embedding-cache")
+CACHE_CAPACITY = 100000  # Cached vectors (77 MB of float16 at 384 dimensions)
+CACHE_DIM = 384  # all-MiniLM-L6-v2
+LOOKUP_BATCH = 500  # Keys per SQL lookup
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    slot INTEGER NOT NULL UNIQUE,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def cache_key(text, namespace):
+    """Content hash of a text within a namespace"""
+    return hashlib.sha1(f"{namespace}\0{text}".encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """LRU-bounded, memory-mapped float16 embedding cache"""
+
+    def __init__(self, path=CACHE_PATH, capacity=CACHE_CAPACITY, dim=CACHE_DIM):
+        """
+        Args:
+            path: Path prefix of the .db and .f16 files
+            capacity: Maximum number of cached vectors for a new cache
+            dim: Embedding dimension for a new cache
+        """
+        self.db_path = path + ".db"
+        self.vectors_path = path + ".f16"
+        self.capacity = capacity
+        self.dim = dim
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._vectors = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        """Open the database on first use"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+            # The layout of an existing cache wins over the constructor arguments
+            capacity = self._get_meta("capacity")
+            if capacity is None:
+                self._set_meta("capacity", self.capacity)
+                self._set_meta("dim", self.dim)
+            else:
+                self.capacity = capacity
+                self.dim = self._get_meta("dim")
+        return self._conn
+
+    @property
+    def vectors(self):
+        """Memory-map the vector array on first use"""
+        if self._vectors is None:
+            self.conn  # Reads the layout of an existing cache
+            mode = 'r+' if os.path.exists(self.vectors_path) else 'w+'
+            self._vectors = np.memmap(self.vectors_path, dtype='float16', mode=mode,
+                                      shape=(self.capacity, self.dim))
+        return self._vectors
+
+    def _get_meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value))
+        )
+
+    def close(self):
+        """Close the database and unmap the vectors"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._vectors = None
+
+    def _lookup(self, keys):
+        """Map keys to slots for the keys that are cached"""
+        slots = {}
+        keys = list(keys)
+        for i in range(0, len(keys), LOOKUP_BATCH):
+            batch = keys[i:i + LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            slots.update(self.conn.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", batch
+            ).fetchall())
+        return slots
+
+    def _allocate_slots(self, count):
+        """Reserve count slots, evicting the least recently used entries if full"""
+        next_slot = self._get_meta("next_slot", 0)
+        fresh = min(count, self.capacity - next_slot)
+        slots = list(range(next_slot, next_slot + fresh))
+        self._set_meta("next_slot", next_slot + fresh)
+
+        evict = count - fresh
+        if evict:
+            rows = self.conn.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (evict,)
+            ).fetchall()
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+            slots.extend(slot for _, slot in rows)
+            logger.debug(f"Evicted {len(rows)} least recently used embeddings")
+        return slots
+
+    def get(self, text, namespace):
+        """Cached vector of a text, or None"""
+        key = cache_key(text, namespace)
+        with self._lock:
+            slot = self._lookup([key]).get(key)
+            if slot is None:
+                return None
+            return np.asarray(self.vectors[slot], dtype='float32')
+
+    def _embed(self, keys, texts, known, encode_fn):
+        """
+        Embed the texts whose keys are not in known, each once even if it repeats
+
+        Returns:
+            {key: float32 vector}, rounded through float16 if it fits the cache
+        """
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in known and key not in missing:
+                missing[key] = text
+        if not missing:
+            return {}
+
+        embeddings = np.asarray(encode_fn(list(missing.values())), dtype='float32')
+        embeddings = embeddings.reshape(len(missing), -1)
+        if embeddings.shape[1] == self.dim:
+            embeddings = embeddings.astype('float16').astype('float32')
+        return dict(zip(missing, embeddings))
+
+    def encode(self, texts, encode_fn, namespace):
+        """
+        Embed texts, running encode_fn only for texts that are not cached
+
+        Args:
+            texts: List of texts
+            encode_fn: Function embedding a list of texts as a 2D array
+            namespace: Model (and pooling) the vectors belong to
+
+        Returns:
+            float32 array with one row per text, rounded through float16 so the
+            same text always gets the same vector
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype='float32')
+
+        keys = [cache_key(text, namespace) for text in texts]
+
+        with self._lock:
+            slots = self._lookup(set(keys))
+            fresh = self._embed(keys, texts, slots, encode_fn)
+
+            now = time.time()
+            written = []
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have cached or evicted some of the texts since the lookup
+                slots = self._lookup(set(keys))
+                fresh.update(self._embed(keys, texts, {**slots, **fresh}, encode_fn))
+                dims = {len(vector) for vector in fresh.values()}
+                cacheable = dims == {self.dim}
+                if fresh and not cacheable:
+                    logger.warning(f"Not caching {max(dims)}-dimensional embeddings "
+                                   f"in a {self.dim}-dimensional cache")
+
+                new_keys = [key for key in fresh if key not in slots] if cacheable else []
+                new_slots = self._allocate_slots(len(new_keys)) if new_keys else []
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    [(key, slot, now) for key, slot in zip(new_keys, new_slots)]
+                )
+                self.conn.executemany(
+                    "UPDATE entries SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in slots]
+                )
+
+                # Repeats of a text within the batch count as hits
+                miss_count = len(fresh)
+                hit_count = len(keys) - miss_count
+                self._set_meta("hits", self._get_meta("hits", 0) + hit_count)
+                self._set_meta("misses", self._get_meta("misses", 0) + miss_count)
+
+                # Vectors go last, a rollback cannot undo them
+                if new_slots:
+                    written = new_slots
+                    self.vectors[new_slots] = np.stack([fresh[key] for key in new_keys]).astype('float16')
+                    self.vectors.flush()
+
+                # Read before committing, so no other process can evict the slots first
+                cached = {key: np.asarray(self.vectors[slot], dtype='float32') for key, slot in slots.items()}
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                if written:
+                    # The restored entries of these slots point at vectors that were overwritten
+                    self.conn.executemany("DELETE FROM entries WHERE slot = ?", [(slot,) for slot in written])
+                raise
+
+            self.hits += hit_count
+            self.misses += miss_count
+
+        cached.update(fresh)
+        return np.stack([cached[key] for key in keys])
+
+    def stats(self):
+        """Hit-rate counters for this process and the lifetime of the cache"""
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            total_hits = self._get_meta("hits", 0)
+            total_misses = self._get_meta("misses", 0)
+
+        lookups = self.hits + self.misses
+        total_lookups = total_hits + total_misses
+        return {
+            "entries": entries,
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "total_hits": total_hits,
+            "total_misses": total_misses,
+            "total_hit_rate": total_hits / total_lookups if total_lookups else 0.0
+        }
+
+_shared_cache = None
+
+def get_embedding_cache():
+    """Process-wide cache at the default location"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = EmbeddingCache()
+    return _shared_cache
@@ -0,0 +1,122 @@
+"""
+Fake Gateway - test double for the local OpenClaw gateway
+
+Serves the gateway API on 127.0.0.1 on a free port, records every request
+and answers from a table of canned responses, so GatewayClient users can be
+tested without a running gateway:
+
+    with FakeGateway() as gateway:
+        gateway.respond("POST", "/api/v1/agent/message", {"ok": True})
+        gateway.fail("POST", "/api/v1/agent/message", 503, times=2)
+        gateway.delay("POST", "/api/v1/agent/message", 2)  # Answer after 2 seconds
+        client = GatewayClient(gateway.url, backoff=0)
+        ...
+        gateway.requests  # [(method, path, body), ...]
+"""
+
+import json
+import time
+import socket
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real gateway
+
+    def setup(self):
+        super().setup()
+        self.server.gateway._sockets.add(self.connection)
+
+    def finish(self):
+        self.server.gateway._sockets.discard(self.connection)
+        super().finish()
+
+    def _handle(self):
+        gateway = self.server.gateway
+        gateway.connections.add(self.client_address[1])
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        body = json.loads(raw) if raw else None
+        status, response, delay = gateway._next_response(self.command, self.path, body)
+        time.sleep(delay)
+
+        data = json.dumps(response).encode() if response is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeGateway:
+    """Local HTTP server standing in for the gateway"""
+
+    def __init__(self, api_path="/api/v1"):
+        self.api_path = api_path
+        self.requests = []  # (method, path, body)
+        self.connections = set()  # Client ports seen, to check connection reuse
+        self._responses = {}
+        self._failures = {}
+        self._delays = {}
+        self._sockets = set()  # Open server side connections
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.gateway = self
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{self.api_path}"
+
+    def respond(self, method, path, response, status=200):
+        """Answer requests to path (the path without the query) with a JSON response"""
+        self._responses[(method, path)] = (status, response)
+
+    def fail(self, method, path, status, times=1):
+        """Answer the next `times` requests to path with an error status"""
+        self._failures[(method, path)] = [status, times]
+
+    def delay(self, method, path, seconds):
+        """Answer requests to path only after `seconds`, to make clients time out"""
+        self._delays[(method, path)] = seconds
+
+    def close_connections(self):
+        """Close the kept-alive connections, as a gateway dropping idle clients does"""
+        for sock in list(self._sockets):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _next_response(self, method, path, body):
+        with self._lock:
+            self.requests.append((method, path, body))
+            key = (method, path.split("?", 1)[0])
+            delay = self._delays.get(key, 0)
+            failure = self._failures.get(key)
+            if failure and failure[1] > 0:
+                failure[1] -= 1
+                return failure[0], {"error": "fake failure"}, delay
+            return self._responses.get(key, (404, {"error": "not found"})) + (delay,)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
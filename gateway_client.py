@@ -0,0 +1,232 @@
+"""
+Gateway Client - OpenClaw local gateway
+
+Shared client for the local OpenClaw gateway (http://localhost:18789/api/v1),
+used by the context injector, send_message.py and the heartbeat scripts
+instead of starting an `openclaw` CLI or curl process per message.
+
+- Keep-alive: idle HTTP connections are pooled and reused, so a message
+  costs one request on an open connection instead of a new process.
+- Timeouts: every request has a socket timeout.
+- Retries: connection errors, 429 and 5xx responses are retried with
+  exponential backoff; other 4xx responses fail right away. A request that
+  is not idempotent (POST, unless the caller says otherwise) is only
+  resent if it never reached the gateway, or went out on a pooled
+  connection the gateway had already closed, or was turned away with 429 or
+  503; after a timeout, another 5xx or an error once it was sent, the
+  gateway may have acted on it, so it fails instead.
+
+Gateway tools (sessions_send, sessions_history, ...) are called through the
+gateway's tool invocation endpoint. Set OPENCLAW_GATEWAY_URL to talk to
+another gateway and OPENCLAW_GATEWAY_TOKEN if it requires a token.
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode
+
+logger = logging.getLogger('gateway-client')
+
+# Constants
+GATEWAY_URL = os.environ.get("OPENCLAW_GATEWAY_URL", "http://localhost:18789/api/v1")
+GATEWAY_TOKEN = os.environ.get("OPENCLAW_GATEWAY_TOKEN")
+TELEGRAM_TARGET = "535786496"  # Default Telegram chat for notifications
+TIMEOUT = 10.0  # Seconds per request
+RETRIES = 3  # Attempts per request
+BACKOFF = 0.5  # Seconds before the first retry, doubled for each further one
+POOL_SIZE = 4  # Idle connections kept open
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+NOT_PROCESSED_STATUSES = {429, 503}  # Retried for requests that are not idempotent too
+MISSING_ROUTE_STATUSES = (404, 405)  # Gateway without the route, callers may use the CLI instead
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+# Errors of a pooled connection the gateway closed before reading the request
+STALE_CONNECTION_ERRORS = (ConnectionResetError, BrokenPipeError)
+
+class GatewayError(Exception):
+    """The gateway rejected a request"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class GatewayUnavailable(GatewayError):
+    """The gateway could not be reached, or kept failing, after all retries"""
+
+class GatewayClient:
+    """HTTP client for the local gateway with a keep-alive connection pool"""
+
+    def __init__(self, base_url=GATEWAY_URL, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF,
+                 pool_size=POOL_SIZE, token=GATEWAY_TOKEN):
+        """
+        Args:
+            base_url: Gateway API root, e.g. http://localhost:18789/api/v1
+            timeout: Socket timeout per request in seconds
+            retries: Attempts per request
+            backoff: Seconds before the first retry, doubled for each further one
+            pool_size: Idle connections kept open
+            token: Optional bearer token
+        """
+        url = urlsplit(base_url)
+        self.base_url = base_url
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.https = url.scheme == "https"
+        self.base_path = url.path.rstrip("/")
+        self.timeout = timeout
+        self.retries = max(1, retries)
+        self.backoff = backoff
+        self.token = token
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _release(self, connection):
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(self, method, path, payload=None, params=None, idempotent=None):
+        """
+        Send a request to the gateway
+
+        Args:
+            method: HTTP method
+            path: Path below the API root, e.g. "/agent/message"
+            payload: Optional JSON body
+            params: Optional query parameters
+            idempotent: Whether the request may be resent after it reached the
+                gateway; by default true for every method but POST
+
+        Returns:
+            Decoded JSON response, None for an empty body
+
+        Raises:
+            GatewayError for a rejected request, or a request that is not
+            idempotent failing after it was sent; GatewayUnavailable if the
+            gateway cannot be reached or keeps failing
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        url = self.base_path + path
+        if params:
+            url += "?" + urlencode(params)
+        headers = {"Accept": "application/json"}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode()
+            headers["Content-Type"] = "application/json"
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+
+        error = None
+        for attempt in range(self.retries):
+            if attempt > 0:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            connection = self._acquire()
+            reused = connection.sock is not None
+            sent = False
+            response = None
+            try:
+                connection.request(method, url, body=body, headers=headers)
+                sent = True
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                # Refused, timed out, or an idle connection the gateway closed
+                connection.close()
+                error = f"{method} {path} failed: {e}"
+                logger.debug(f"Gateway attempt {attempt + 1}: {error}")
+                stale = reused and response is None and isinstance(e, STALE_CONNECTION_ERRORS)
+                if sent and not idempotent and not stale:
+                    raise GatewayError(f"{method} {path} failed after it was sent: {e}")
+                continue
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+
+            if response.status in (RETRY_STATUSES if idempotent else NOT_PROCESSED_STATUSES):
+                error = f"{method} {path} returned {response.status}"
+                logger.debug(f"Gateway attempt {attempt + 1}: {error}")
+                continue
+            if response.status >= 400:
+                raise GatewayError(f"{method} {path} returned {response.status}: {data[:200]!r}",
+                                   response.status)
+
+            if not data:
+                return None
+            try:
+                return json.loads(data)
+            except ValueError:
+                raise GatewayError(f"{method} {path} returned invalid JSON", response.status)
+
+        raise GatewayUnavailable(f"Gateway unavailable after {self.retries} attempts: {error}")
+
+    def send_message(self, message, channel="telegram", target=TELEGRAM_TARGET):
+        """Send a message to a channel target"""
+        payload = {"message": message}
+        if channel:
+            payload["channel"] = channel
+        if target:
+            payload["target"] = target
+        return self.request("POST", "/agent/message", payload)
+
+    def invoke_tool(self, tool, args, idempotent=False):
+        """Run a gateway tool and return its result; read-only tools may pass idempotent=True"""
+        response = self.request("POST", "/tools/invoke", {"tool": tool, "args": args},
+                                idempotent=idempotent)
+        if isinstance(response, dict) and "result" in response:
+            return response["result"]
+        return response
+
+    def sessions_send(self, session_key, message):
+        """Send a message into a session"""
+        return self.invoke_tool("sessions_send", {"sessionKey": session_key, "message": message})
+
+    def sessions_history(self, session_key, limit=10):
+        """
+        Recent messages of a session
+
+        Returns:
+            List of message dictionaries
+        """
+        result = self.invoke_tool("sessions_history", {"sessionKey": session_key, "limit": limit},
+                                  idempotent=True)
+        if isinstance(result, dict):
+            return result.get("messages", [])
+        return result or []
+
+    def close(self):
+        """Close the pooled connections"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Process-wide GatewayClient, so scripts share its connection pool"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GatewayClient()
+        return _client
@@ -5,6 +5,8 @@ import datetime
 import time
 import random
 
+from send_message import send_message as deliver_message
+
 # Constants
 REPO_DIR = "/Users/karst/.openclaw/workspace/glasswall-rebuild"
 LOGS_DIR = "/Users/karst/.openclaw/workspace/logs"
@@ -35,8 +37,8 @@ def log_message(message):
 def send_message(message):
     """Send a notification message through the autonomous system"""
     try:
-        message_script = os.path.expanduser("~/.openclaw/workspace/send_message.py")
-        subprocess.run(["python3", message_script, message], check=True)
+        if not deliver_message(message):
+            raise RuntimeError("all delivery methods failed")
         log_message(f"Notification sent: {message[:50]}...")
         return True
     except Exception as e:
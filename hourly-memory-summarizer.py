@@ -15,15 +15,15 @@ Features:
 
 import os
 import re
-import json
 import time
-import glob
 import argparse
 import logging
 from datetime import datetime, timedelta
 from collections import Counter, defaultdict
 import hashlib
 
+from session_log_reader import SessionLogReader, load_state, save_state
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -42,6 +42,7 @@ SESSION_LOGS_DIR = os.path.join(WORKSPACE_DIR, "logs", "sessions")
 SUMMARY_DIR = os.path.join(MEMORY_DIR, "hourly-summaries")
 DAILY_SUMMARY_PATH = os.path.join(MEMORY_DIR, "{date}.md")
 MEMORY_MD_PATH = os.path.join(WORKSPACE_DIR, "MEMORY.md")
+SESSION_OFFSETS_PATH = os.path.join(WORKSPACE_DIR, "logs", "summarizer-session-offsets.json")
 
 # Make sure directories exist
 os.makedirs(MEMORY_DIR, exist_ok=True)
@@ -128,47 +129,48 @@ class MessageProcessor:
 class ConversationSummarizer:
     """Generate structured summaries from conversation data"""
     
-    def __init__(self):
+    def __init__(self, state_path=SESSION_OFFSETS_PATH):
         self.processor = MessageProcessor()
-        
-    def get_session_logs(self, hours_back=1):
-        """Get session logs from the last N hours"""
+        self.state_path = state_path
+        self.reader = SessionLogReader(load_state(state_path))
+        
+    def get_session_messages(self, hours_back=1):
+        """
+        Stream the messages added since the last run to session logs modified
+        in the last N hours
+        """
         cutoff_time = time.time() - (hours_back * 3600)
-        log_files = glob.glob(os.path.join(SESSION_LOGS_DIR, "*.json"))
-        
-        recent_logs = []
-        for log_file in log_files:
-            file_stat = os.stat(log_file)
-            if file_stat.st_mtime >= cutoff_time:
-                try:
-                    with open(log_file, 'r') as f:
-                        log_data = json.load(f)
-                        if isinstance(log_data, dict) and 'messages' in log_data:
-                            recent_logs.append(log_data)
-                except (json.JSONDecodeError, IOError) as e:
-                    logger.error(f"Error reading log file {log_file}: {e}")
-        
-        return recent_logs
+        for log_file, message in self.reader.iter_new_messages(SESSION_LOGS_DIR, since=cutoff_time):
+            if isinstance(message, dict):
+                yield message
+    
+    def save_read_state(self):
+        """Remember how far each session log was summarized"""
+        save_state(self.state_path, self.reader.state)
     
     def process_logs(self, logs):
-        """Process logs and extract summary information"""
+        """Process log dictionaries and extract summary information"""
+        return self.process_messages(msg for log in logs for msg in log.get('messages', []))
+    
+    def process_messages(self, messages):
+        """Process a stream of messages and extract summary information"""
         all_messages = []
-        all_text = ""
+        text_parts = []
         tool_usage = Counter()
         
-        # First, extract all messages and combine text
-        for log in logs:
-            if 'messages' in log:
-                messages = log['messages']
-                all_messages.extend(messages)
+        # First, collect all messages and their text
+        for msg in messages:
+            all_messages.append(msg)
+            
+            if 'content' in msg:
+                text_parts.append(msg['content'])
                 
-                for msg in messages:
-                    if 'content' in msg:
-                        all_text += msg['content'] + "\n\n"
-                        
-                        # Extract tool usage from assistant messages
-                        if msg.get('role') == 'assistant':
-                            tool_usage.update(self.processor.extract_tool_usage(msg['content']))
+                # Extract tool usage from assistant messages
+                if msg.get('role') == 'assistant':
+                    tool_usage.update(self.processor.extract_tool_usage(msg['content']))
+        
+        # Join once instead of growing one string per message
+        all_text = "".join(part + "\n\n" for part in text_parts)
         
         # Sort messages by timestamp if available
         all_messages.sort(key=lambda m: m.get('timestamp', 0))
@@ -303,13 +305,12 @@ class ConversationSummarizer:
             
         logger.info(f"Starting summarization for hour {hour}")
         
-        # Get and process logs
-        logs = self.get_session_logs(hours_back)
-        if not logs:
-            logger.info(f"No logs found for the past {hours_back} hour(s)")
+        # Stream and process new messages
+        data = self.process_messages(self.get_session_messages(hours_back))
+        if not data['messages']:
+            logger.info(f"No new messages found for the past {hours_back} hour(s)")
+            self.save_read_state()
             return
-            
-        data = self.process_logs(logs)
         
         # Generate and save summaries
         hour_summary = self.generate_hourly_summary(data, hour)
@@ -319,6 +320,9 @@ class ConversationSummarizer:
         # Update long-term memory if needed
         self.update_memory_md(data)
         
+        # Only advance the log offsets once the summaries are written
+        self.save_read_state()
+        
         logger.info(f"Summarization complete. Hourly: {hourly_path}, Daily: {daily_path}")
         return {
             'hourly_path': hourly_path,
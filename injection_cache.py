@@ -0,0 +1,161 @@
+"""
+Injection Cache - Context Retention System Component 2
+
+Precomputed sections of the Post-Compaction Context Injector's injection.
+
+Building the injection reads MEMORY.md, the recent daily memory files, the
+hourly summaries and the task board, and runs the section regexes over them.
+None of that depends on the session or the moment of the compaction, so the
+sections are built once, with their token estimates, and kept in memory and
+in a JSON cache file shared by all injector processes.
+
+A cache entry records the (mtime, size) stamp of every file it was built
+from, and optionally a time it expires at (an hourly summary leaving the
+24 hour window). A lookup stats those files and rebuilds only if one of them
+changed, appeared or disappeared. Long-running processes can start a
+background refresher, so the rebuild happens before a compaction needs it.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger('context-injector')
+
+# Constants
+CACHE_VERSION = 1
+REFRESH_INTERVAL = 30  # Seconds between source checks of the background refresher
+
+def file_stamp(path):
+    """[mtime_ns, size] of a file or directory, None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+def estimate_tokens(text):
+    """Token estimate the injector budgets with"""
+    return len(text) // 4
+
+class InjectionCache:
+    """Injection sections cached on the stamps of the files they were built from"""
+
+    def __init__(self, build, sources, path):
+        """
+        Args:
+            build: Callable returning (sections, dependencies, valid_until); sections
+                must be JSON serializable, dependencies are files read besides the
+                sources, valid_until is a Unix time or None
+            sources: Callable returning the files the sections are always built
+                from; may change over time (today's memory file)
+            path: Cache file path
+        """
+        self.build = build
+        self.sources = sources
+        self.path = path
+        self.lock = threading.Lock()
+        self._entry = None
+        self._stop = threading.Event()
+        self._refresher = None
+
+    def _read(self):
+        """Cache entry from the cache file, None if there is no usable one"""
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path, 'r') as f:
+                entry = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(f"Ignoring unreadable injection cache: {e}")
+            return None
+
+        if entry.get("version") != CACHE_VERSION:
+            return None
+        return entry
+
+    def _write(self, entry):
+        """Write the cache file atomically"""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self.path)
+        except IOError as e:
+            logger.error(f"Error writing injection cache: {e}")
+
+    def _is_fresh(self, entry):
+        if entry is None:
+            return False
+        if entry["valid_until"] is not None and time.time() >= entry["valid_until"]:
+            return False
+
+        stamps = entry["stamps"]
+        if any(path not in stamps for path in self.sources()):
+            return False
+        return all(file_stamp(path) == stamp for path, stamp in stamps.items())
+
+    def _rebuild(self):
+        # Stamp the sources before reading them, so a change during the build is seen next time
+        stamps = {path: file_stamp(path) for path in self.sources()}
+        sections, dependencies, valid_until = self.build()
+        for path in dependencies:
+            stamps.setdefault(path, file_stamp(path))
+
+        entry = {
+            "version": CACHE_VERSION,
+            "built_at": time.time(),
+            "valid_until": valid_until,
+            "stamps": stamps,
+            "sections": sections
+        }
+        self._write(entry)
+        logger.debug(f"Injection cache rebuilt from {len(stamps)} sources")
+        return entry
+
+    def get(self):
+        """
+        Current injection sections, rebuilt if any source changed
+
+        Returns:
+            The sections returned by build
+        """
+        with self.lock:
+            if not self._is_fresh(self._entry):
+                entry = self._read()
+                self._entry = entry if self._is_fresh(entry) else self._rebuild()
+            return self._entry["sections"]
+
+    def invalidate(self):
+        """Force a rebuild on the next lookup"""
+        with self.lock:
+            self._entry = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def start_refresher(self, interval=REFRESH_INTERVAL):
+        """Check the sources every interval seconds and rebuild in a background thread"""
+        if self._refresher is not None:
+            return self._refresher
+
+        def refresh():
+            while not self._stop.wait(interval):
+                try:
+                    self.get()
+                except Exception as e:
+                    logger.error(f"Error refreshing injection cache: {e}")
+
+        self._stop.clear()
+        self._refresher = threading.Thread(target=refresh, name="injection-cache-refresher", daemon=True)
+        self._refresher.start()
+        return self._refresher
+
+    def stop_refresher(self):
+        """Stop the background refresher"""
+        if self._refresher is not None:
+            self._stop.set()
+            self._refresher.join()
+            self._refresher = None
@@ -1,21 +1,42 @@
 import torch
 from sentence_transformers import SentenceTransformer
 
+try:
+    from embedding_cache import get_embedding_cache
+except ImportError:
+    get_embedding_cache = None
+
 class LocalEmbedder:
-    def __init__(self, model_name='all-MiniLM-L6-v2'):
+    def __init__(self, model_name='all-MiniLM-L6-v2', embedding_cache=None):
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
+        
+        # Shared with the vector memory pipeline, which uses the same normalized vectors
+        if embedding_cache is None and get_embedding_cache is not None:
+            embedding_cache = get_embedding_cache()
+        self.embedding_cache = embedding_cache
+    
+    def _encode(self, texts):
+        return self.model.encode(texts, normalize_embeddings=True)
     
     def embed_text(self, texts):
         """
         Generate embeddings for input texts
         
+        Texts that were embedded before are read from the embedding cache.
+        
         Args:
             texts (list or str): Text(s) to embed
         
         Returns:
             numpy array of embeddings
         """
-        return self.model.encode(texts)
+        if self.embedding_cache is None:
+            return self._encode(texts)
+        
+        if isinstance(texts, str):
+            return self.embedding_cache.encode([texts], self._encode, namespace=self.model_name)[0]
+        return self.embedding_cache.encode(list(texts), self._encode, namespace=self.model_name)
     
     def semantic_search(self, query, corpus, top_k=5):
         """
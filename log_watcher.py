@@ -0,0 +1,166 @@
+"""
+Log Watcher - Context Retention System Component 2
+
+Waits for session log changes for the Post-Compaction Context Injector's
+log monitor.
+
+On Linux the watcher uses inotify through ctypes, so it wakes up as soon as
+a log in the directory is written, created or moved in. Elsewhere (macOS),
+or if inotify cannot be set up, it falls back to polling: every poll
+interval it compares the (mtime, size) of the logs with the previous poll.
+
+wait() returns the paths of the logs that changed; reading their new
+messages is left to a SessionLogReader.
+"""
+
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+logger = logging.getLogger('context-injector')
+
+# Constants
+POLL_INTERVAL = 0.5  # Seconds between polls when inotify is unavailable
+LOG_EXTENSIONS = (".json", ".jsonl")
+
+# inotify flags, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+READ_SIZE = 64 * 1024
+
+def _load_inotify():
+    """libc with the inotify functions, None if unavailable"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class LogWatcher:
+    """Waits for changes to the session logs in a directory"""
+
+    def __init__(self, log_dir, poll_interval=POLL_INTERVAL, use_inotify=True):
+        """
+        Args:
+            log_dir: Directory of session logs, created if missing
+            poll_interval: Seconds between polls in polling mode
+            use_inotify: Use inotify where available, polling otherwise
+        """
+        self.log_dir = log_dir
+        self.poll_interval = poll_interval
+        self.fd = None
+        os.makedirs(log_dir, exist_ok=True)
+
+        libc = _load_inotify() if use_inotify else None
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0 and libc.inotify_add_watch(fd, os.fsencode(log_dir), WATCH_MASK) >= 0:
+                self.fd = fd
+            else:
+                error = ctypes.get_errno()
+                if fd >= 0:
+                    os.close(fd)
+                logger.warning(f"inotify unavailable ({os.strerror(error)}), polling {log_dir}")
+
+        self.stamps = self._scan()
+        logger.info(f"Watching {log_dir} with {self.mode}")
+
+    @property
+    def mode(self):
+        return "inotify" if self.fd is not None else "polling"
+
+    def _scan(self):
+        """{path: (mtime_ns, size)} of the logs in the directory"""
+        stamps = {}
+        try:
+            entries = list(os.scandir(self.log_dir))
+        except OSError as e:
+            logger.error(f"Error listing {self.log_dir}: {e}")
+            return stamps
+
+        for entry in entries:
+            if not entry.name.endswith(LOG_EXTENSIONS):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            stamps[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def _poll(self):
+        stamps = self._scan()
+        changed = {path for path, stamp in stamps.items() if self.stamps.get(path) != stamp}
+        self.stamps = stamps
+        return changed
+
+    def _read_events(self):
+        """Paths of the logs named in the pending inotify events"""
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                return changed
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped, compare every log instead
+                    changed.update(self._scan())
+                elif name:
+                    path = os.path.join(self.log_dir, os.fsdecode(name))
+                    if path.endswith(LOG_EXTENSIONS):
+                        changed.add(path)
+
+    def wait(self, timeout=None):
+        """
+        Wait for logs to change
+
+        Args:
+            timeout: Seconds to wait at most, None to wait until a log changes
+
+        Returns:
+            Set of changed log paths, empty if the timeout passed first
+        """
+        if self.fd is None:
+            remaining = timeout
+            while True:
+                changed = self._poll()
+                if changed or remaining is not None and remaining <= 0:
+                    return changed
+                interval = self.poll_interval if remaining is None else min(self.poll_interval, remaining)
+                time.sleep(interval)
+                if remaining is not None:
+                    remaining -= interval
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        return self._read_events()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
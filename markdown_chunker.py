@@ -0,0 +1,255 @@
+"""
+Markdown Chunker - Context Retention System Component 3
+
+Structure-aware chunking for the Vector Memory Pipeline.
+
+Memory files and hourly summaries are markdown: `## HH:00 - HH:59` hour
+sections, `## Decisions` and `## Action Items` headers and bullet lists.
+Instead of cutting the text every CHUNK_SIZE characters, the chunker splits
+it into blocks (headers, list items, paragraphs and fenced code) and packs
+them into chunks of up to CHUNK_TOKENS tokens:
+
+- A section (a header and everything up to the next header) that fits the
+  budget is never split, and consecutive small sections share a chunk.
+- A larger section is split between its blocks, and its header stays with
+  the first of them, so a list item or decision is never cut in half. A
+  first block that does not fit next to the header is cut to the room left.
+- A single block over the budget is split at sentence, then word boundaries.
+
+Chunks do not overlap, and each records the path of headers it sits under
+("Daily Summary: 2026-02-10 > 14:00 - 14:59 > Decisions") as header_path.
+The `## Decisions` headers that the hourly summarizer copies into an hour
+section of a daily summary count as nested in it.
+"""
+
+import re
+from collections import namedtuple
+
+from token_budget import get_token_counter, SENTENCE_END, WORD_END, CHARS_PER_TOKEN
+
+# Constants
+CHUNK_TOKENS = 128  # Token budget per chunk; all-MiniLM-L6-v2 truncates input at 256 word pieces
+HEADER_SEPARATOR = " > "
+
+HEADER_PATTERN = re.compile(r"^(#{1,6})[ \t]+(.*?)[ \t#]*$")
+# Hour sections of daily summaries; the summary headers inside them are written at the same level
+HOUR_SECTION_PATTERN = re.compile(r"^\d{2}:00 - \d{2}:59$")
+LIST_ITEM_PATTERN = re.compile(r"^[ \t]*(?:[-*+]|\d+[.)])[ \t]+")
+FENCE_PATTERN = re.compile(r"^[ \t]*(```|~~~)")
+
+# A run of text[start:end] under the headers in path; header blocks start a section
+Block = namedtuple("Block", ["start", "end", "path", "header"])
+
+def parse_blocks(text):
+    """
+    Split markdown text into header, list item, paragraph and fenced code blocks
+
+    Blank lines end a block and belong to none. Lines that are neither
+    headers nor list items continue the current block, so wrapped list
+    items stay whole.
+
+    Returns:
+        List of Blocks in text order
+    """
+    blocks = []
+    headers = []  # (level, title) of the enclosing headers
+    current = None  # [start, end] of the open block
+    fence = None  # Marker of the open fenced code block
+
+    def close():
+        nonlocal current
+        if current is not None:
+            blocks.append(Block(current[0], current[1], tuple(title for _, title in headers), False))
+            current = None
+
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        start, end = offset, offset + len(line.rstrip("\r\n"))
+        offset += len(line)
+        stripped = line.strip()
+
+        if fence is not None:
+            current[1] = end
+            if stripped.startswith(fence):
+                fence = None
+                close()
+            continue
+
+        fence_match = FENCE_PATTERN.match(line)
+        if fence_match:
+            close()
+            fence = fence_match.group(1)
+            current = [start, end]
+            continue
+
+        if not stripped:
+            close()
+            continue
+
+        header_match = HEADER_PATTERN.match(line.rstrip("\r\n"))
+        if header_match:
+            close()
+            level = len(header_match.group(1))
+            if HOUR_SECTION_PATTERN.match(header_match.group(2)):
+                level -= 0.5
+            while headers and headers[-1][0] >= level:
+                headers.pop()
+            headers.append((level, header_match.group(2)))
+            blocks.append(Block(start, end, tuple(title for _, title in headers), True))
+            continue
+
+        if LIST_ITEM_PATTERN.match(line):
+            close()
+        if current is None:
+            current = [start, end]
+        else:
+            current[1] = end
+
+    close()
+    return blocks
+
+def common_path(paths):
+    """Longest header path shared by all paths"""
+    prefix = paths[0]
+    for path in paths[1:]:
+        length = 0
+        while length < min(len(prefix), len(path)) and prefix[length] == path[length]:
+            length += 1
+        prefix = prefix[:length]
+    return prefix
+
+class MarkdownChunker:
+    """Packs markdown blocks into chunks of at most max_tokens tokens"""
+
+    def __init__(self, max_tokens=CHUNK_TOKENS, counter=None):
+        """
+        Args:
+            max_tokens: Token budget per chunk
+            counter: token_budget.TokenCounter, defaults to the process-wide counter
+        """
+        self.max_tokens = max_tokens
+        self.counter = counter or get_token_counter()
+
+    def _tokens(self, text, start, end):
+        return self.counter.count(text[start:end])
+
+    def _split_block(self, text, block, origin=None):
+        """
+        Split a block over the budget at sentence, then word boundaries
+
+        Args:
+            origin: Offset the first piece is counted from, so text before
+                the block (a header) shares its budget; defaults to block.start
+        """
+        origin = block.start if origin is None else origin
+        if self._tokens(text, origin, block.end) <= self.max_tokens:
+            return [block]
+
+        segment = text[block.start:block.end]
+        boundaries = sorted({block.start + m.end() for m in SENTENCE_END.finditer(segment)} |
+                            {block.start + m.end() for m in WORD_END.finditer(segment)} |
+                            {block.end})
+        pieces = []
+        start = block.start
+        while start < block.end:
+            candidates = [b for b in boundaries if b > start]
+            # Furthest boundary that keeps the piece within budget
+            low, high, cut = 0, len(candidates) - 1, None
+            while low <= high:
+                middle = (low + high) // 2
+                if self._tokens(text, origin, candidates[middle]) <= self.max_tokens:
+                    cut, low = candidates[middle], middle + 1
+                else:
+                    high = middle - 1
+            if cut is None and origin < start:
+                # Not even one word fits after the text before the block, split it on its own
+                origin = start
+                continue
+            if cut is None:
+                # Not even one word fits, cut by characters
+                cut = min(block.end, start + max(1, int(self.max_tokens * CHARS_PER_TOKEN)))
+            pieces.append(Block(start, cut, block.path, False))
+            start = cut
+            while start < block.end and text[start].isspace():
+                start += 1
+            origin = start
+        return pieces
+
+    def _units(self, text, blocks):
+        """
+        Group blocks into the units chunks are packed from
+
+        Returns:
+            List of (blocks, fresh) tuples; fresh units start a new chunk
+        """
+        sections = []
+        for block in blocks:
+            if block.header or not sections:
+                sections.append([])
+            sections[-1].append(block)
+
+        units = []
+        for section in sections:
+            if self._tokens(text, section[0].start, section[-1].end) <= self.max_tokens:
+                units.append((section, False))
+                continue
+
+            # Split the section between its blocks, keeping the header with the first one,
+            # or with as much of it as fits next to the header
+            head, rest = [], section
+            if section[0].header and len(section) > 1:
+                first = self._split_block(text, section[1], origin=section[0].start)
+                if self._tokens(text, section[0].start, first[0].end) <= self.max_tokens:
+                    head, rest = [section[0], first[0]], first[1:] + section[2:]
+            pieces = [piece for block in rest for piece in self._split_block(text, block)]
+            if not head:
+                # Not even a word fits next to the header, it starts the section alone
+                head, pieces = pieces[:1], pieces[1:]
+            units.append((head, True))
+            units.extend(([piece], False) for piece in pieces)
+        return units
+
+    def chunk(self, text):
+        """
+        Chunk markdown text
+
+        Returns:
+            List of (start, end, header path) tuples; the header path is a tuple of titles
+        """
+        blocks = parse_blocks(text)
+        if not blocks:
+            return []
+
+        chunks = []
+        current = None  # [start, end, tokens, paths]
+        for unit, fresh in self._units(text, blocks):
+            start, end = unit[0].start, unit[-1].end
+            if current is not None and not fresh:
+                # Count the gap as well, so separators are within budget
+                tokens = current[2] + self._tokens(text, current[1], end)
+                if tokens <= self.max_tokens:
+                    current[1], current[2] = end, tokens
+                    current[3].append(unit[0].path)
+                    continue
+            if current is not None:
+                chunks.append(current)
+            current = [start, end, self._tokens(text, start, end), [unit[0].path]]
+        chunks.append(current)
+
+        return [(start, end, common_path(paths)) for start, end, _, paths in chunks]
+
+def chunk_markdown(text, source, timestamp, max_tokens=CHUNK_TOKENS, counter=None):
+    """
+    Chunk markdown text into chunk dictionaries for the Vector Memory Pipeline
+
+    Returns:
+        List of chunks with text, start, end, source, timestamp and header_path
+    """
+    return [{
+        "text": text[start:end],
+        "start": start,
+        "end": end,
+        "source": source,
+        "timestamp": timestamp,
+        "header_path": HEADER_SEPARATOR.join(path) or None
+    } for start, end, path in MarkdownChunker(max_tokens, counter).chunk(text)]
@@ -6,6 +6,8 @@ import datetime
 import signal
 import sys
 
+from send_message import send_message
+
 # Setup signal handlers for graceful shutdown
 running = True
 
@@ -117,11 +119,9 @@ def update_status_file(status):
 def notify_openclaw(message):
     """Send a notification through OpenClaw"""
     try:
-        # Use our Python utility script for messaging
-        send_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "send_message.py")
-        subprocess.run([
-            "python3", send_script, message
-        ], check=True)
+        # Send in-process over the shared gateway connection
+        if not send_message(message):
+            raise RuntimeError("all delivery methods failed")
         log_message(f"Sent notification: {message}")
         return True
     except Exception as e:
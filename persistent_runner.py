@@ -3,11 +3,12 @@ import os
 import time
 import random
 import datetime
-import subprocess
 import json
 import signal
 import sys
 
+from send_message import send_message
+
 # Setup signal handlers for graceful shutdown
 running = True
 
@@ -66,11 +67,9 @@ def send_telegram_update():
         # Log the message
         log_message(f"Sending Telegram update: {update}")
         
-        # Use our Python utility script for messaging
-        send_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "send_message.py")
-        subprocess.run([
-            "python3", send_script, message
-        ], check=True)
+        # Send in-process over the shared gateway connection
+        if not send_message(message):
+            raise RuntimeError("all delivery methods failed")
         log_message("Telegram update sent successfully")
         return True
     except Exception as e:
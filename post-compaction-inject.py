@@ -25,8 +25,16 @@ import logging
 import argparse
 import subprocess
 from datetime import datetime, timedelta
+from itertools import islice
 import hashlib
 
+from context_state_store import ContextStateStore, SNAPSHOT_EVERY
+from compaction_detector import get_matcher, RESET_MARKER
+from injection_cache import InjectionCache, estimate_tokens
+from session_log_reader import SessionLogReader, load_state, save_state, NEW, APPENDED, REWRITTEN
+from log_watcher import LogWatcher, POLL_INTERVAL
+from gateway_client import get_client, GatewayError, GatewayUnavailable, MISSING_ROUTE_STATUSES
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -45,6 +53,10 @@ HOURLY_SUMMARIES_DIR = os.path.join(MEMORY_DIR, "hourly-summaries")
 SESSION_LOGS_DIR = os.path.join(WORKSPACE_DIR, "logs", "sessions")
 CONTEXT_STATE_FILE = os.path.join(WORKSPACE_DIR, "context-state.json")
 MEMORY_FILE = os.path.join(WORKSPACE_DIR, "MEMORY.md")
+TASK_STATUS_FILE = os.path.join(WORKSPACE_DIR, "current-task-status.json")
+KANBAN_BOARD_FILE = os.path.join(WORKSPACE_DIR, "kanban-board.json")
+INJECTION_CACHE_FILE = os.path.join(WORKSPACE_DIR, "injection-cache.json")
+MONITOR_OFFSETS_PATH = os.path.join(WORKSPACE_DIR, "logs", "compaction-monitor-offsets.json")
 OPENCLAW_SCRIPT = "openclaw"  # Path to openclaw CLI
 
 # Make sure directories exist
@@ -53,90 +65,46 @@ os.makedirs(os.path.join(WORKSPACE_DIR, "logs"), exist_ok=True)
 os.makedirs(HOURLY_SUMMARIES_DIR, exist_ok=True)
 
 class ContextStateManager:
-    """Manages context state tracking for detecting compaction events"""
+    """Manages context state tracking for detecting compaction events
+    
+    The state lives in a ContextStateStore: registering a message appends one
+    line to the state journal instead of rewriting context-state.json.
+    """
     
-    def __init__(self, state_file=CONTEXT_STATE_FILE):
+    def __init__(self, state_file=CONTEXT_STATE_FILE, snapshot_every=SNAPSHOT_EVERY):
         self.state_file = state_file
-        self.state = self._load_state()
+        self.store = ContextStateStore(state_file, snapshot_every=snapshot_every)
     
-    def _load_state(self):
-        """Load state from file or create default state"""
-        if os.path.exists(self.state_file):
-            try:
-                with open(self.state_file, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError) as e:
-                logger.error(f"Error loading state file: {e}")
-                return self._create_default_state()
-        else:
-            return self._create_default_state()
-    
-    def _create_default_state(self):
-        """Create default state structure"""
-        return {
-            "sessions": {},
-            "last_compaction_time": None,
-            "last_update": datetime.now().isoformat(),
-            "message_hashes": [],
-            "injections": []
-        }
+    @property
+    def state(self):
+        """Current state: sessions, message_hashes, injections and last_compaction_time"""
+        return self.store.state
     
     def save_state(self):
-        """Save current state to file"""
-        try:
-            self.state["last_update"] = datetime.now().isoformat()
-            with open(self.state_file, 'w') as f:
-                json.dump(self.state, f, indent=2)
-            logger.debug(f"State saved to {self.state_file}")
-        except IOError as e:
-            logger.error(f"Error saving state file: {e}")
+        """Write a snapshot of the current state to the state file"""
+        self.store.snapshot()
     
     def register_message(self, session_id, message_id, content, role, timestamp=None):
         """Register a message for tracking"""
         if timestamp is None:
             timestamp = datetime.now().isoformat()
         
-        # Initialize session if it doesn't exist
-        if session_id not in self.state["sessions"]:
-            self.state["sessions"][session_id] = {
-                "last_message_id": None,
-                "message_count": 0,
-                "messages": [],
-                "last_activity": timestamp,
-                "compactions": []
-            }
-        
         # Create message hash for duplicate detection
         content_hash = hashlib.md5(content.encode()).hexdigest()
         
-        # Check if this is a duplicate message (can happen during reconnects)
-        if content_hash in self.state["message_hashes"]:
-            logger.debug(f"Duplicate message detected, skipping: {message_id}")
-            return False
-        
-        # Add message to tracking
-        self.state["sessions"][session_id]["messages"].append({
+        # Check if this is a duplicate message (can happen during reconnects),
+        # again under the store lock in case another process registered it
+        if self.store.has_message_hash(content_hash) or not self.store.record({
+            "op": "message",
+            "session_id": session_id,
             "id": message_id,
             "timestamp": timestamp,
             "role": role,
             "hash": content_hash
-        })
-        
-        # Keep only the last 50 messages per session
-        if len(self.state["sessions"][session_id]["messages"]) > 50:
-            self.state["sessions"][session_id]["messages"].pop(0)
-        
-        # Update session state
-        self.state["sessions"][session_id]["last_message_id"] = message_id
-        self.state["sessions"][session_id]["message_count"] += 1
-        self.state["sessions"][session_id]["last_activity"] = timestamp
-        
-        # Update global message hashes list (keep last 100)
-        self.state["message_hashes"].append(content_hash)
-        if len(self.state["message_hashes"]) > 100:
-            self.state["message_hashes"].pop(0)
+        }, accept=lambda: not self.store.has_message_hash(content_hash)):
+            logger.debug(f"Duplicate message detected, skipping: {message_id}")
+            return False
         
-        self.save_state()
         return True
     
     def detect_compaction(self, session_id, message_id, content, role):
@@ -149,111 +117,93 @@ class ContextStateManager:
         3. Explicit reset markers
         4. Context window overflow errors
         5. Memory reference failures
+        
+        Markers and error patterns are matched in one pass by the shared
+        compaction_detector matcher.
+        
+        Returns:
+            Name of the rule that fired ("repeated_system_message" or a
+            compaction_detector rule name), or None
         """
         if session_id not in self.state["sessions"]:
             # New session, not a compaction
-            return False
+            return None
         
         session_state = self.state["sessions"][session_id]
+        rule = get_matcher().search(content)
         
         # Strategy 1: Check for reset markers in content
-        reset_markers = [
-            "I'll start fresh",
-            "Let me start over",
-            "I'll reset and try again",
-            "Starting a new session",
-            "Context has been cleared",
-            "/new command detected",
-            "Previous context has been reset",
-            "input length and max_tokens exceed context limit",
-            "context window is full",
-            "context limit",
-            "exceed context limit",
-            "I don't have access to that information",
-            "I don't have that context",
-            "I don't have memory of that",
-            "I cannot access previous",
-            "seems I've lost some context"
-        ]
-        
-        for marker in reset_markers:
-            if marker.lower() in content.lower():
-                logger.info(f"Compaction detected in session {session_id} via reset marker: '{marker}'")
-                self._register_compaction(session_id)
-                return True
+        if rule is not None and rule.kind == RESET_MARKER:
+            logger.info(f"Compaction detected in session {session_id} via reset marker: '{rule.pattern}'")
+            self._register_compaction(session_id)
+            return rule.name
         
         # Strategy 2: Check for repeated system messages at beginning of conversations
         if role == "system" and session_state["message_count"] > 10:
             # Look for similar system messages in recent history
             content_hash = hashlib.md5(content.encode()).hexdigest()
             
-            for msg in session_state["messages"][:5]:  # Check first 5 messages
+            for msg in islice(session_state["messages"], 5):  # Check first 5 messages
                 if msg.get("hash") == content_hash:
                     logger.info(f"Compaction detected in session {session_id} via repeated system message")
                     self._register_compaction(session_id)
-                    return True
+                    return "repeated_system_message"
         
         # Strategy 3: Context window error patterns
-        error_patterns = [
-            r"input length .* exceed context limit",
-            r"context (?:window|limit) .* exceed",
-            r"token limit exceed",
-            r"context .* full",
-            r"retry with (?:smaller|less) (?:context|input)"
-        ]
-        
-        for pattern in error_patterns:
-            if re.search(pattern, content, re.IGNORECASE):
-                logger.info(f"Compaction detected in session {session_id} via error pattern: '{pattern}'")
-                self._register_compaction(session_id)
-                return True
+        if rule is not None:
+            logger.info(f"Compaction detected in session {session_id} via error pattern: '{rule.pattern}'")
+            self._register_compaction(session_id)
+            return rule.name
         
-        return False
+        return None
     
     def _register_compaction(self, session_id):
         """Register a compaction event"""
         if session_id in self.state["sessions"]:
-            compaction_time = datetime.now().isoformat()
-            self.state["sessions"][session_id]["compactions"].append({
-                "timestamp": compaction_time,
-                "message_count_before": self.state["sessions"][session_id]["message_count"]
+            self.store.record({
+                "op": "compaction",
+                "session_id": session_id,
+                "timestamp": datetime.now().isoformat()
             })
-            self.state["last_compaction_time"] = compaction_time
-            self.save_state()
     
     def register_injection(self, session_id, injection_content, trigger_event="compaction"):
         """Register a context injection event"""
         injection_id = f"inj_{int(time.time())}"
         
-        if "injections" not in self.state:
-            self.state["injections"] = []
-        
         # Create a hash of the injected content
         content_hash = hashlib.md5(injection_content.encode()).hexdigest()
         
         # Register the injection
-        self.state["injections"].append({
-            "id": injection_id,
-            "session_id": session_id,
-            "timestamp": datetime.now().isoformat(),
-            "trigger": trigger_event,
-            "content_hash": content_hash,
-            "content_length": len(injection_content)
+        timestamp = datetime.now().isoformat()
+        self.store.record({
+            "op": "injection",
+            "timestamp": timestamp,
+            "injection": {
+                "id": injection_id,
+                "session_id": session_id,
+                "timestamp": timestamp,
+                "trigger": trigger_event,
+                "content_hash": content_hash,
+                "content_length": len(injection_content)
+            }
         })
-        
-        # Keep only the last 50 injections
-        if len(self.state["injections"]) > 50:
-            self.state["injections"].pop(0)
-        
-        self.save_state()
         return injection_id
 
 class MemoryRetriever:
-    """Retrieves relevant memory content for injection after compaction"""
+    """Retrieves relevant memory content for injection after compaction
+    
+    The memory, task and summary sections of the injection are kept in an
+    InjectionCache, so an injection only rebuilds them when a source file
+    changed. Pass cache_file=None to build them on every injection.
+    """
     
-    def __init__(self, memory_dir=MEMORY_DIR, summaries_dir=HOURLY_SUMMARIES_DIR):
+    def __init__(self, memory_dir=MEMORY_DIR, summaries_dir=HOURLY_SUMMARIES_DIR, cache_file=INJECTION_CACHE_FILE):
         self.memory_dir = memory_dir
         self.summaries_dir = summaries_dir
+        self.gateway = get_client()
+        self.cache = None
+        if cache_file:
+            self.cache = InjectionCache(self._build_sections, self._section_sources, cache_file)
     
     def get_recent_summaries(self, hours_back=24):
         """Get summaries from the last N hours"""
@@ -341,6 +291,16 @@ class MemoryRetriever:
     
     def get_recent_messages(self, session_id, limit=10):
         """Get recent messages from a session"""
+        try:
+            return self.gateway.sessions_history(session_id, limit)
+        except GatewayUnavailable as e:
+            logger.warning(f"{e}, falling back to the openclaw CLI")
+        except GatewayError as e:
+            if e.status not in MISSING_ROUTE_STATUSES:
+                logger.warning(f"Failed to get session history: {e}")
+                return []
+            logger.warning(f"{e}, falling back to the openclaw CLI")
+        
         try:
             # Use openclaw sessions_history to get session messages
             cmd = [
@@ -374,8 +334,8 @@ class MemoryRetriever:
     def get_task_context(self):
         """Get current task information from kanban board"""
         try:
-            task_status_path = os.path.join(WORKSPACE_DIR, "current-task-status.json")
-            kanban_board_path = os.path.join(WORKSPACE_DIR, "kanban-board.json")
+            task_status_path = TASK_STATUS_FILE
+            kanban_board_path = KANBAN_BOARD_FILE
             
             current_task = {"status": "No task in progress"}
             
@@ -414,26 +374,29 @@ class MemoryRetriever:
             logger.error(f"Error retrieving task context: {e}")
             return {"status": "Unknown"}
     
-    def generate_context_injection(self, session_id, detected_compaction=False, max_tokens=2000):
-        """Generate content to be injected into the context after compaction"""
-        injection = "# Context Continuity\n\n"
-        
-        # Add timestamp and marker
-        injection += f"*Memory injection at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*\n\n"
-        
-        # Token budget tracking (rough estimate)
-        token_budget = max_tokens
-        token_budget -= len(injection) // 4  # Very rough token estimate
+    def _section_sources(self, days_back=2):
+        """Files the injection sections are always built from"""
+        now = datetime.now()
+        daily_files = [
+            os.path.join(self.memory_dir, f"{(now - timedelta(days=i)).strftime('%Y-%m-%d')}.md")
+            for i in range(days_back)
+        ]
+        # The summaries directory changes whenever an hourly summary is added
+        return [MEMORY_FILE, TASK_STATUS_FILE, KANBAN_BOARD_FILE, self.summaries_dir] + daily_files
+    
+    def _build_sections(self):
+        """
+        Build the session-independent sections of the injection
         
-        # Add information about the compaction event
-        if detected_compaction:
-            compaction_note = "## Continuity Note\n\n"
-            compaction_note += "The conversation context was reset or compacted. "
-            compaction_note += "This summary has been injected to maintain continuity.\n\n"
-            injection += compaction_note
-            token_budget -= len(compaction_note) // 4
+        Returns:
+            Tuple of (sections, dependencies, valid_until) for InjectionCache;
+            each section is a dict of its text and token estimate, or None
+        """
+        sections = {"task": None, "memory": None, "today": None, "summary": None}
+        dependencies = []
+        valid_until = None
         
-        # Add current task information (highest priority)
+        # Current task information
         task_context = self.get_task_context()
         if task_context and "title" in task_context:
             task_info = f"## Current Task\n\n"
@@ -447,12 +410,7 @@ class MemoryRetriever:
                     description = description[:300] + "..."
                 task_info += f"{description}\n\n"
             
-            injection += task_info
-            token_budget -= len(task_info) // 4
-        
-        # If not enough budget, return what we have
-        if token_budget < 400:  # Minimum viable size for remaining sections
-            return injection
+            sections["task"] = {"text": task_info, "tokens": estimate_tokens(task_info)}
         
         # Extract key information from MEMORY.md
         memory_content = self.get_main_memory_content()
@@ -478,16 +436,9 @@ class MemoryRetriever:
                     
                     memory_section += f"### {section}\n{content}\n\n"
             
-            # Check if we have budget for this section
-            if token_budget >= len(memory_section) // 4:
-                injection += memory_section
-                token_budget -= len(memory_section) // 4
-            
-            # If not enough budget, return what we have
-            if token_budget < 400:
-                return injection
+            sections["memory"] = {"text": memory_section, "tokens": estimate_tokens(memory_section)}
         
-        # Get daily memory files (lower priority)
+        # Get daily memory files
         daily_memories = self.get_daily_memory(days_back=2)
         if daily_memories:
             today = daily_memories[0]
@@ -499,38 +450,98 @@ class MemoryRetriever:
                 content_excerpt += "...\n\n"
             
             today_section += content_excerpt + "\n\n"
-            
-            # Add if within budget
-            if token_budget >= len(today_section) // 4:
-                injection += today_section
-                token_budget -= len(today_section) // 4
+            sections["today"] = {"text": today_section, "tokens": estimate_tokens(today_section)}
         
-        # Get recent summaries (lowest priority)
+        # Get recent summaries
         summaries = self.get_recent_summaries(hours_back=24)
-        if summaries and token_budget > 300:
+        if summaries:
             most_recent = summaries[0]
-            summary_section = f"## Recent Activity ({most_recent['date']} {most_recent['time']})\n\n"
-            
-            # Extract just the most relevant parts
-            summary_content = most_recent['content']
+            dependencies.append(most_recent['path'])
+            # The summary leaves the 24 hour window a day after it was written
+            summary_time = datetime.strptime(f"{most_recent['date']} {most_recent['time']}", "%Y-%m-%d %H:%M")
+            valid_until = (summary_time + timedelta(hours=24)).timestamp()
             
             # Try to extract just decisions and action items
+            summary_content = most_recent['content']
             decisions_match = re.search(r'## Decisions\s+(.+?)(?=##|\Z)', summary_content, re.DOTALL)
             actions_match = re.search(r'## Action Items\s+(.+?)(?=##|\Z)', summary_content, re.DOTALL)
             
-            if decisions_match and token_budget > 150:
-                decisions_text = "### Key Decisions\n" + decisions_match.group(1).strip() + "\n\n"
-                if len(decisions_text) > 300:
-                    decisions_text = decisions_text[:300] + "...\n\n"
-                summary_section += decisions_text
-                token_budget -= len(decisions_text) // 4
+            parts = []
+            for title, match in (("Key Decisions", decisions_match), ("Action Items", actions_match)):
+                if match:
+                    text = f"### {title}\n" + match.group(1).strip() + "\n\n"
+                    if len(text) > 300:
+                        text = text[:300] + "...\n\n"
+                    parts.append({"text": text, "tokens": estimate_tokens(text)})
+            
+            sections["summary"] = {
+                "header": f"## Recent Activity ({most_recent['date']} {most_recent['time']})\n\n",
+                "parts": parts
+            }
+        
+        return sections, dependencies, valid_until
+    
+    def get_sections(self):
+        """Session-independent injection sections, from the cache when it is enabled"""
+        if self.cache is not None:
+            return self.cache.get()
+        return self._build_sections()[0]
+    
+    def generate_context_injection(self, session_id, detected_compaction=False, max_tokens=2000):
+        """Generate content to be injected into the context after compaction"""
+        injection = "# Context Continuity\n\n"
+        
+        # Add timestamp and marker
+        injection += f"*Memory injection at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*\n\n"
+        
+        # Token budget tracking (rough estimate)
+        token_budget = max_tokens
+        token_budget -= estimate_tokens(injection)  # Very rough token estimate
+        
+        # Add information about the compaction event
+        if detected_compaction:
+            compaction_note = "## Continuity Note\n\n"
+            compaction_note += "The conversation context was reset or compacted. "
+            compaction_note += "This summary has been injected to maintain continuity.\n\n"
+            injection += compaction_note
+            token_budget -= estimate_tokens(compaction_note)
+        
+        sections = self.get_sections()
+        
+        # Add current task information (highest priority)
+        if sections["task"]:
+            injection += sections["task"]["text"]
+            token_budget -= sections["task"]["tokens"]
+        
+        # If not enough budget, return what we have
+        if token_budget < 400:  # Minimum viable size for remaining sections
+            return injection
+        
+        # Key information from MEMORY.md
+        if sections["memory"]:
+            # Check if we have budget for this section
+            if token_budget >= sections["memory"]["tokens"]:
+                injection += sections["memory"]["text"]
+                token_budget -= sections["memory"]["tokens"]
+            
+            # If not enough budget, return what we have
+            if token_budget < 400:
+                return injection
+        
+        # Daily memory (lower priority), added if within budget
+        if sections["today"] and token_budget >= sections["today"]["tokens"]:
+            injection += sections["today"]["text"]
+            token_budget -= sections["today"]["tokens"]
+        
+        # Recent summaries (lowest priority): decisions and action items
+        summary = sections["summary"]
+        if summary and token_budget > 300:
+            summary_section = summary["header"]
             
-            if actions_match and token_budget > 150:
-                actions_text = "### Action Items\n" + actions_match.group(1).strip() + "\n\n"
-                if len(actions_text) > 300:
-                    actions_text = actions_text[:300] + "...\n\n"
-                summary_section += actions_text
-                token_budget -= len(actions_text) // 4
+            for part in summary["parts"]:
+                if token_budget > 150:
+                    summary_section += part["text"]
+                    token_budget -= part["tokens"]
             
             # Add if content was extracted
             if len(summary_section) > 60:  # More than just the header
@@ -539,10 +550,30 @@ class MemoryRetriever:
         return injection
 
 class MessagingManager:
-    """Handles sending messages to sessions"""
+    """Handles sending messages to sessions
+    
+    Messages go through the local gateway over a pooled keep-alive
+    connection; the openclaw CLI is only started when the gateway is
+    unreachable or does not serve the tool route.
+    """
+    
+    def __init__(self, gateway=None):
+        self.gateway = gateway or get_client()
     
     def inject_context(self, session_id, content):
         """Inject context into a session"""
+        try:
+            self.gateway.sessions_send(session_id, content)
+            logger.info(f"Successfully injected context into session {session_id}")
+            return True
+        except GatewayUnavailable as e:
+            logger.warning(f"{e}, falling back to the openclaw CLI")
+        except GatewayError as e:
+            if e.status not in MISSING_ROUTE_STATUSES:
+                logger.error(f"Failed to inject context: {e}")
+                return False
+            logger.warning(f"{e}, falling back to the openclaw CLI")
+        
         try:
             # Use openclaw sessions_send to inject content
             cmd = [
@@ -587,10 +618,10 @@ class CompactionHandler:
             return None
         
         # Check for compaction
-        compaction_detected = self.state_manager.detect_compaction(session_id, message_id, content, role)
+        compaction_rule = self.state_manager.detect_compaction(session_id, message_id, content, role)
         
-        if compaction_detected:
-            logger.info(f"Compaction detected in session {session_id}, generating injection")
+        if compaction_rule:
+            logger.info(f"Compaction detected in session {session_id} ({compaction_rule}), generating injection")
             # Generate memory injection
             injection = self.memory_retriever.generate_context_injection(
                 session_id,
@@ -616,11 +647,88 @@ class CompactionHandler:
         
         return None
     
-    def monitor_logs(self):
-        """Monitor session logs for compaction events"""
-        # This would be implemented for a background monitoring process
-        # that continually scans logs for signs of compaction
-        pass
+    def monitor_logs(self, log_dir=SESSION_LOGS_DIR, state_path=MONITOR_OFFSETS_PATH,
+                     poll_interval=POLL_INTERVAL, use_inotify=True, stop_event=None):
+        """
+        Monitor session logs for compaction events
+        
+        Long-running replacement for the cron watcher: waits for session log
+        changes (inotify, or polling every poll_interval seconds), reads only
+        the messages appended since the last read and passes each one to
+        process_message. Logs seen for the first time are skipped to their
+        end, so old compactions are not injected for again; read offsets are
+        kept in state_path across restarts.
+        
+        Args:
+            log_dir: Directory of session logs
+            state_path: Where the per-log read offsets are saved
+            poll_interval: Seconds between polls without inotify
+            use_inotify: Use inotify where available
+            stop_event: Optional threading.Event that ends the monitor
+        """
+        reader = SessionLogReader(load_state(state_path))
+        watcher = LogWatcher(log_dir, poll_interval=poll_interval, use_inotify=use_inotify)
+        if self.memory_retriever.cache is not None:
+            self.memory_retriever.cache.start_refresher()
+        
+        # Start new logs at their end
+        for file_path, status in reader.iter_logs(log_dir):
+            if status == NEW:
+                for _ in reader.iter_messages(file_path, status):
+                    pass
+        save_state(state_path, reader.state)
+        
+        logger.info(f"Monitoring {log_dir} for compaction events")
+        try:
+            while stop_event is None or not stop_event.is_set():
+                # Wake up regularly so a stop request is noticed
+                changed = watcher.wait(timeout=max(poll_interval, 1.0))
+                if not changed:
+                    continue
+                
+                for file_path in sorted(changed):
+                    if not os.path.exists(file_path):
+                        continue
+                    self._process_log(reader, file_path)
+                save_state(state_path, reader.state)
+        except KeyboardInterrupt:
+            logger.info("Log monitor interrupted")
+        finally:
+            watcher.close()
+            if self.memory_retriever.cache is not None:
+                self.memory_retriever.cache.stop_refresher()
+            save_state(state_path, reader.state)
+    
+    def _process_log(self, reader, file_path):
+        """
+        Pass the new messages of a session log to process_message
+        
+        A rewritten log is read from the start, but the messages it had
+        before are skipped, so old compactions are not injected for again.
+        """
+        session_id = os.path.splitext(os.path.basename(file_path))[0]
+        try:
+            status = reader.check(file_path)
+            count = reader.message_count(file_path) if status == APPENDED else 0
+            seen = reader.message_count(file_path) if status == REWRITTEN else 0
+            for msg in reader.iter_messages(file_path, status):
+                count += 1
+                if count <= seen or not isinstance(msg, dict) or "content" not in msg:
+                    continue
+                
+                content = msg["content"]
+                if not isinstance(content, str):
+                    content = json.dumps(content)
+                timestamp = msg.get("timestamp")
+                self.process_message(
+                    msg.get("session_id", session_id),
+                    msg.get("id", f"{session_id}:{count}"),
+                    content,
+                    msg.get("role", "unknown"),
+                    timestamp if isinstance(timestamp, str) else None
+                )
+        except Exception as e:
+            logger.error(f"Error monitoring session log {file_path}: {e}")
     
     def setup_cron_watcher(self):
         """Set up a cron job to regularly check for compaction events"""
@@ -700,6 +808,9 @@ import logging
 import json
 import subprocess
 
+sys.path.append("/Users/karst/.openclaw/workspace")
+from compaction_detector import get_matcher
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -711,20 +822,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger('compaction-handler')
 
+SESSION_PATTERN = re.compile(r"session[_\\s]*(?:id|key)[:\\s]*([\\w-]+)", re.IGNORECASE)
+
 def handle_message(message):
     """Check if message indicates context compaction and run injector if needed"""
-    compaction_indicators = [
-        "input length .* exceed context limit",
-        "context (?:window|limit) .* exceed",
-        "token limit exceed",
-        "context .* full",
-        "I don't have access to that information",
-        "I don't have that context",
-        "I don't have memory of that"
-    ]
-    
     # Extract session info
-    session_match = re.search(r"session[_\\s]*(?:id|key)[:\\s]*([\\w-]+)", message, re.IGNORECASE)
+    session_match = SESSION_PATTERN.search(message)
     session_id = session_match.group(1) if session_match else None
     
     if not session_id:
@@ -735,22 +838,21 @@ def handle_message(message):
         logger.error("Could not determine session ID")
         return
     
-    # Check for compaction indicators
-    for pattern in compaction_indicators:
-        if re.search(pattern, message, re.IGNORECASE):
-            logger.info(f"Compaction indicator detected: {pattern}")
-            
-            # Run the injector
-            try:
-                subprocess.run(
-                    ["/Users/karst/.openclaw/workspace/post-compaction-inject.py", "--session", session_id, "--inject-now"],
-                    check=True
-                )
-                logger.info(f"Ran context injector for session {session_id}")
-                return
-            except Exception as e:
-                logger.error(f"Failed to run context injector: {e}")
-                return
+    # Check for compaction indicators (the injector's markers and error patterns)
+    rule = get_matcher().search(message)
+    if rule is not None:
+        logger.info(f"Compaction indicator detected: {rule.pattern} ({rule.name})")
+        
+        # Run the injector
+        try:
+            subprocess.run(
+                ["/Users/karst/.openclaw/workspace/post-compaction-inject.py", "--session", session_id, "--inject-now"],
+                check=True
+            )
+            logger.info(f"Ran context injector for session {session_id}")
+        except Exception as e:
+            logger.error(f"Failed to run context injector: {e}")
+        return
     
     logger.debug("No compaction indicators detected")
 
@@ -819,6 +921,7 @@ def main():
     parser.add_argument("--install-autocorrect", action="store_true", help="Install automatic correction mechanism")
     parser.add_argument("--inject-now", action="store_true", help="Force an injection now")
     parser.add_argument("--tokens", type=int, default=2000, help="Token limit for injection")
+    parser.add_argument("--monitor", action="store_true", help="Watch session logs and inject on compaction (long-running)")
     
     args = parser.parse_args()
     
@@ -832,6 +935,10 @@ def main():
         test_injection(args.session, args.tokens)
         return
     
+    if args.monitor:
+        handler.monitor_logs()
+        return
+    
     if args.simulate:
         logger.info("Simulating a compaction event")
         session_id = args.session or f"test-session-{int(time.time())}"
@@ -10,6 +10,8 @@ import json
 import datetime
 import sys
 
+from send_message import send_message
+
 # Constants
 WORKSPACE = "/Users/karst/.openclaw/workspace"
 LOGS_DIR = os.path.join(WORKSPACE, "logs")
@@ -105,11 +107,9 @@ def update_status_file():
 def send_notification(message):
     """Send a notification through OpenClaw"""
     try:
-        # Use our Python utility script for messaging
-        send_script = os.path.join(WORKSPACE, "send_message.py")
-        subprocess.run([
-            "python3", send_script, message
-        ], check=True)
+        # Send in-process over the shared gateway connection
+        if not send_message(message):
+            raise RuntimeError("all delivery methods failed")
         log_message(f"Sent notification: {message}")
         return True
     except Exception as e:
@@ -0,0 +1,167 @@
+"""
+Recall Cache - Context Retention System Component 4
+
+LRU cache of semantic recall results for the Semantic Recall Hook System.
+
+Heartbeats and repeated questions send the same prompt many times a day. The
+cache maps a normalized prompt, together with the search parameters and the
+generation of the vector index, to the ranked results of the search and the
+query embedding. An exact hit skips both the query embedding and the FAISS
+search. With near-duplicate lookup enabled, a prompt that misses is embedded
+once and compared against the cached query embeddings, so rephrasings of the
+same question can reuse results as well.
+
+The index generation is bumped by every committed index write, so entries
+never outlive the index they were computed from: the cache empties itself
+the first time it sees a new generation.
+"""
+
+import re
+import time
+import json
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger('semantic-recall')
+
+# Constants
+CACHE_SIZE = 256  # Cached prompts
+CACHE_TTL_SECONDS = 3600  # Entries expire so recency ranking stays current
+NEAR_DUPLICATE_SIMILARITY = 0.97  # Cosine similarity for a near-duplicate hit
+
+# Lookup outcomes
+HIT = "hit"
+NEAR_HIT = "near_hit"
+MISS = "miss"
+
+def normalize_prompt(prompt):
+    """Cache key text of a prompt: case-folded with collapsed whitespace"""
+    return re.sub(r"\s+", " ", prompt or "").strip().casefold()
+
+class QueryResultCache:
+    """LRU cache of ranked recall results keyed on prompt and index generation"""
+
+    def __init__(self, size=CACHE_SIZE, ttl_seconds=CACHE_TTL_SECONDS,
+                 near_duplicates=False, near_duplicate_similarity=NEAR_DUPLICATE_SIMILARITY):
+        """
+        Args:
+            size: Maximum number of cached prompts (0 disables the cache)
+            ttl_seconds: Maximum age of an entry
+            near_duplicates: Also match prompts by query embedding
+            near_duplicate_similarity: Cosine similarity needed for a near-duplicate hit
+        """
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self.near_duplicates = near_duplicates
+        self.near_duplicate_similarity = near_duplicate_similarity
+        self.generation = None
+        self.entries = OrderedDict()  # (normalized prompt, params) -> (results, embedding, stored_at)
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(prompt, params):
+        """Cache key of a prompt searched with the given parameters"""
+        return normalize_prompt(prompt), json.dumps(params, sort_keys=True)
+
+    def _check_generation(self, generation):
+        """Drop every entry once the index has been written"""
+        if generation != self.generation:
+            if self.entries:
+                logger.debug(f"Index generation changed to {generation}, "
+                             f"dropping {len(self.entries)} cached recalls")
+                self.invalidations += 1
+            self.entries.clear()
+            self.generation = generation
+
+    def _fresh(self, entry):
+        return time.time() - entry[2] <= self.ttl_seconds
+
+    def get(self, key, generation):
+        """
+        Look up the results of an exact (normalized) prompt match
+
+        Returns:
+            Cached results, or None
+        """
+        if not self.size:
+            return None
+
+        self._check_generation(generation)
+        entry = self.entries.get(key)
+        if entry is None or not self._fresh(entry):
+            self.entries.pop(key, None)
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return list(entry[0])
+
+    def get_similar(self, key, embedding, generation):
+        """
+        Look up the results of the most similar cached query with the same parameters
+
+        Args:
+            key: Cache key of the prompt
+            embedding: Normalized query embedding
+            generation: Current index generation
+
+        Returns:
+            Cached results, or None
+        """
+        if not self.size or not self.near_duplicates:
+            return None
+
+        self._check_generation(generation)
+        candidates = [(cached_key, entry) for cached_key, entry in self.entries.items()
+                      if cached_key[1] == key[1] and entry[1] is not None and self._fresh(entry)]
+        if not candidates:
+            return None
+
+        embeddings = np.stack([entry[1] for _, entry in candidates])
+        similarities = embeddings @ np.asarray(embedding, dtype='float32').ravel()
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.near_duplicate_similarity:
+            return None
+
+        cached_key, entry = candidates[best]
+        self.entries.move_to_end(cached_key)
+        self.near_hits += 1
+        return list(entry[0])
+
+    def put(self, key, generation, results, embedding=None):
+        """Cache the results of a search made at an index generation"""
+        if not self.size:
+            return
+
+        self._check_generation(generation)
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype='float32').ravel()
+        self.entries[key] = (list(results), embedding, time.time())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def record_miss(self):
+        self.misses += 1
+
+    def clear(self):
+        """Drop all entries"""
+        self.entries.clear()
+
+    def stats(self):
+        """Hit-rate counters"""
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "generation": self.generation
+        }
@@ -0,0 +1,257 @@
+"""
+Recall Telemetry - Context Retention System Component 4
+
+Per-stage latency histograms of semantic recall for the Semantic Recall Hook
+System.
+
+Recall records how many milliseconds each stage of a prompt took (waiting
+for the recall worker, query cache lookup, model load, query encoding, BM25
+keyword search, FAISS search, metadata lookup, ranking and formatting, see
+RecallTelemetry.STAGES). The timings of every recall are added to one
+histogram per stage with log-spaced buckets, so p50/p95/p99 latencies can be
+reported without keeping the individual samples.
+
+The histograms are written to a JSON file (logs/recall-stats.json) that
+dashboards can poll and `semantic-recall.py stats` prints. Existing counts
+are loaded when the telemetry is created, so the statistics survive restarts
+of the recall server. The resident server and in-process hooks share the
+file: a flush locks it, re-reads it and adds only what this process recorded
+since its last flush.
+"""
+
+import os
+import json
+import time
+import fcntl
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger('semantic-recall')
+
+# Constants
+WORKSPACE_DIR = "/Users/karst/.openclaw/workspace"
+TELEMETRY_PATH = os.path.join(WORKSPACE_DIR, "logs", "recall-stats.json")
+FLUSH_SECONDS = 10.0  # Minimum time between writes of the statistics file
+BUCKET_GROWTH = 1.2  # Ratio between bucket bounds, percentiles are accurate to 20%
+BUCKET_BOUNDS_MS = [round(0.05 * BUCKET_GROWTH ** i, 4) for i in range(76)]  # 0.05 ms to ~50 s
+PERCENTILES = (50, 95, 99)
+
+@contextmanager
+def timed(timings, stage):
+    """Add the milliseconds spent in the with block to timings[stage], if timings is not None"""
+    if timings is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start_time) * 1000
+
+class LatencyHistogram:
+    """Latency histogram with log-spaced buckets"""
+
+    def __init__(self, counts=None, total_ms=0.0, max_ms=0.0):
+        self.counts = list(counts) if counts else [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.total_ms = total_ms
+        self.max_ms = max_ms
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def record(self, ms):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def merge(self, other):
+        """Add the samples of another histogram"""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the given percentile, capped at the maximum"""
+        count = self.count
+        if not count:
+            return 0.0
+        rank = percent / 100 * count
+        cumulative = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank and bucket_count:
+                if bucket == len(BUCKET_BOUNDS_MS):
+                    return self.max_ms
+                return min(BUCKET_BOUNDS_MS[bucket], self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        """Count, mean, max and percentiles in milliseconds"""
+        count = self.count
+        summary = {
+            "count": count,
+            "mean_ms": round(self.total_ms / count, 3) if count else 0.0,
+            "max_ms": round(self.max_ms, 3)
+        }
+        for percent in PERCENTILES:
+            summary[f"p{percent}_ms"] = round(self.percentile(percent), 3)
+        return summary
+
+    def to_dict(self):
+        return {"counts": self.counts, "total_ms": self.total_ms, "max_ms": self.max_ms}
+
+    @classmethod
+    def from_dict(cls, data):
+        counts = data.get("counts")
+        if counts is not None and len(counts) != len(BUCKET_BOUNDS_MS) + 1:
+            counts = None  # Written with other bucket bounds
+        return cls(counts, data.get("total_ms", 0.0), data.get("max_ms", 0.0)) if counts else cls()
+
+class RecallTelemetry:
+    """Per-stage latency histograms and recall counters, persisted as JSON"""
+
+    # Stages in pipeline order, for display
+    STAGES = ("queue", "cache", "model_load", "index_load", "encode", "keyword", "faiss",
+              "metadata", "rank", "search", "format", "total")
+
+    def __init__(self, path=TELEMETRY_PATH, flush_seconds=FLUSH_SECONDS):
+        """
+        Args:
+            path: Statistics file, None to keep the statistics in memory
+            flush_seconds: Minimum time between writes of the statistics file
+        """
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.histograms = {}
+        self.counters = {}
+        self.since = datetime.now().isoformat()
+        self._pending = {}  # Histograms recorded since the last flush
+        self._pending_counters = {}  # Counters recorded since the last flush
+        self._last_flush = 0.0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load(load_stats(self.path) if self.path else None)
+
+    def _load(self, stats):
+        """Replace the totals with those of a statistics file, with the lock held or before sharing"""
+        self.histograms = {}
+        self.counters = {"recalls": 0, "timeouts": 0}
+        if not stats:
+            return
+        self.since = stats.get("since", self.since)
+        self.counters.update(stats.get("counters", {}))
+        for stage, data in stats.get("stages", {}).items():
+            self.histograms[stage] = LatencyHistogram.from_dict(data)
+
+    @staticmethod
+    def _merge(histograms, counters, more_histograms, more_counters):
+        """Add histograms and counters to others, with the lock held"""
+        for stage, histogram in more_histograms.items():
+            histograms.setdefault(stage, LatencyHistogram()).merge(histogram)
+        for key, count in more_counters.items():
+            counters[key] = counters.get(key, 0) + count
+
+    def _count(self, key):
+        for counters in (self.counters, self._pending_counters):
+            counters[key] = counters.get(key, 0) + 1
+
+    def record(self, timings, timed_out=False, cache_status=None):
+        """
+        Add the stage timings of one recall
+
+        Args:
+            timings: Milliseconds per stage
+            timed_out: Whether the recall missed its deadline
+            cache_status: Query cache outcome ("hit", "near_hit" or "miss")
+        """
+        with self._lock:
+            for stage, ms in timings.items():
+                for histograms in (self.histograms, self._pending):
+                    histograms.setdefault(stage, LatencyHistogram()).record(ms)
+            self._count("recalls")
+            if timed_out:
+                self._count("timeouts")
+            if cache_status:
+                self._count(f"cache_{cache_status}")
+            self._dirty = True
+
+        if time.time() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def summary(self):
+        """Per-stage latency summaries, in pipeline order"""
+        with self._lock:
+            return self._summary()
+
+    def _summary(self):
+        order = {stage: i for i, stage in enumerate(self.STAGES)}
+        stages = sorted(self.histograms, key=lambda stage: (order.get(stage, len(order)), stage))
+        return {stage: self.histograms[stage].summary() for stage in stages}
+
+    def snapshot(self):
+        """Machine-readable statistics, as written to the statistics file"""
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        summary = self._summary()
+        recalls = self.counters["recalls"]
+        return {
+            "updated_at": datetime.now().isoformat(),
+            "since": self.since,
+            "counters": dict(self.counters),
+            "timeout_rate": self.counters["timeouts"] / recalls if recalls else 0.0,
+            "bucket_bounds_ms": BUCKET_BOUNDS_MS,
+            "stages": {
+                stage: dict(summary[stage], **self.histograms[stage].to_dict())
+                for stage in summary
+            }
+        }
+
+    def flush(self):
+        """Add what was recorded since the last flush to the statistics file"""
+        if not self.path or not self._dirty:
+            return
+        self._last_flush = time.time()
+        lock_fd = None
+        pending = None
+        try:
+            lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+
+            # Other processes write the same file, so start from what they wrote
+            stats = load_stats(self.path)
+            with self._lock:
+                pending = (self._pending, self._pending_counters)
+                self._pending, self._pending_counters, self._dirty = {}, {}, False
+                self._load(stats)
+                self._merge(self.histograms, self.counters, *pending)
+                snapshot = self._snapshot()
+
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, self.path)
+        except IOError as e:
+            logger.error(f"Error writing recall statistics: {e}")
+            if pending is not None:
+                # Keep the changes for the next flush
+                with self._lock:
+                    self._merge(self._pending, self._pending_counters, *pending)
+                    self._dirty = True
+        finally:
+            if lock_fd is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+                os.close(lock_fd)
+
+def load_stats(path=TELEMETRY_PATH):
+    """Read a statistics file written by RecallTelemetry, None if there is none"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, json.JSONDecodeError):
+        return None
@@ -6,6 +6,9 @@ import logging
 import json
 import subprocess
 
+sys.path.append("/Users/karst/.openclaw/workspace")
+from compaction_detector import get_matcher
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -17,20 +20,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger('compaction-handler')
 
+SESSION_PATTERN = re.compile(r"session[_\s]*(?:id|key)[:\s]*([\w-]+)", re.IGNORECASE)
+
 def handle_message(message):
     """Check if message indicates context compaction and run injector if needed"""
-    compaction_indicators = [
-        "input length .* exceed context limit",
-        "context (?:window|limit) .* exceed",
-        "token limit exceed",
-        "context .* full",
-        "I don't have access to that information",
-        "I don't have that context",
-        "I don't have memory of that"
-    ]
-    
     # Extract session info
-    session_match = re.search(r"session[_\s]*(?:id|key)[:\s]*([\w-]+)", message, re.IGNORECASE)
+    session_match = SESSION_PATTERN.search(message)
     session_id = session_match.group(1) if session_match else None
     
     if not session_id:
@@ -41,22 +36,21 @@ def handle_message(message):
         logger.error("Could not determine session ID")
         return
     
-    # Check for compaction indicators
-    for pattern in compaction_indicators:
-        if re.search(pattern, message, re.IGNORECASE):
-            logger.info(f"Compaction indicator detected: {pattern}")
-            
-            # Run the injector
-            try:
-                subprocess.run(
-                    ["/Users/karst/.openclaw/workspace/post-compaction-inject.py", "--session", session_id, "--inject-now"],
-                    check=True
-                )
-                logger.info(f"Ran context injector for session {session_id}")
-                return
-            except Exception as e:
-                logger.error(f"Failed to run context injector: {e}")
-                return
+    # Check for compaction indicators (the injector's markers and error patterns)
+    rule = get_matcher().search(message)
+    if rule is not None:
+        logger.info(f"Compaction indicator detected: {rule.pattern} ({rule.name})")
+        
+        # Run the injector
+        try:
+            subprocess.run(
+                ["/Users/karst/.openclaw/workspace/post-compaction-inject.py", "--session", session_id, "--inject-now"],
+                check=True
+            )
+            logger.info(f"Ran context injector for session {session_id}")
+        except Exception as e:
+            logger.error(f"Failed to run context injector: {e}")
+        return
     
     logger.debug("No compaction indicators detected")
 
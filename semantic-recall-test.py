@@ -9,6 +9,8 @@ Semantic Recall Hook System functionality.
 import os
 import sys
 import json
+import time
+import asyncio
 import unittest
 from unittest import mock
 import tempfile
@@ -153,7 +155,8 @@ class TestSemanticRecallHook(unittest.TestCase):
         # Test empty text
         self.assertEqual(hook._estimate_tokens(""), 0)
         
-        # Test normal text
+        # Test normal text, counted by characters without a tokenizer
+        self.config.set("tokenizer", None)
         text = "This is a test" * 100  # 1400 characters
         self.assertEqual(hook._estimate_tokens(text), 350)  # 1400 / 4
         
@@ -303,6 +306,239 @@ class TestSemanticRecallHook(unittest.TestCase):
         # Verify token budget was enforced
         self.assertLessEqual(token_estimate, 100)
 
+    def test_token_packing(self):
+        """Test recalled context fills the token budget without exceeding it"""
+        sentences = " ".join(f"Decision {i} was recorded in the project notes." for i in range(40))
+        self.mock_vector_memory.index_generation.return_value = 1
+        self.mock_vector_memory.search.return_value = [
+            {"source": "memory/long.md", "timestamp": "2026-02-01T12:00:00", "similarity": 0.9,
+             "score": 0.9, "text": sentences},
+            {"source": "memory/short.md", "timestamp": "2026-02-02T12:00:00", "similarity": 0.7,
+             "score": 0.7, "text": "The gateway runs on port 18789."}
+        ]
+        self.config.set("max_tokens", 150)
+        hook = SemanticRecallHook(config=self.config, vector_memory=self.mock_vector_memory)
+        
+        injected_text, num_results, token_estimate = hook.process_prompt("What did we decide?")
+        
+        # The short result fits whole, the long one is cut at a sentence boundary
+        self.assertEqual(num_results, 2)
+        self.assertEqual(token_estimate, hook._estimate_tokens(injected_text))
+        self.assertLessEqual(token_estimate, 150)
+        self.assertGreaterEqual(token_estimate, 150 - 16)
+        self.assertIn("The gateway runs on port 18789.", injected_text)
+        self.assertIn("memory/long.md (2026-02-01) [truncated]", injected_text)
+        self.assertRegex(injected_text, r"project notes\.\n\n")
+        self.assertLess(injected_text.index("memory/long.md"), injected_text.index("memory/short.md"))
+
+    def test_nothing_fits_budget(self):
+        """Test a recall whose results do not fit the token budget is still timed and logged"""
+        self.mock_vector_memory.index_generation.return_value = 1
+        self.mock_vector_memory.search.return_value = [
+            {"source": "memory/long.md", "timestamp": "2026-02-01T12:00:00", "similarity": 0.9,
+             "score": 0.9, "text": "Decision recorded in the project notes. " * 20}
+        ]
+        self.config.set("max_tokens", 5)
+        hook = SemanticRecallHook(config=self.config, vector_memory=self.mock_vector_memory)
+        history_path = os.path.join(self.temp_path, "history.jsonl")
+        
+        with mock.patch('semantic_recall.HISTORY_PATH', history_path), \
+             mock.patch.object(hook, "_record_timings") as mock_record:
+            self.assertEqual(hook.process_prompt("What did we decide?"), ("", 0, 0))
+        
+        timings = mock_record.call_args[0][0]
+        self.assertIn("format", timings)
+        self.assertIn("total", timings)
+        with open(history_path) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual([entry["num_results"] for entry in entries], [0])
+    
+    def test_query_cache(self):
+        """Test repeated prompts are served from the cache until the index changes"""
+        self.mock_vector_memory.index_generation.return_value = 1
+        self.mock_vector_memory.search.return_value = [
+            {
+                "source": "test-source-1",
+                "timestamp": "2026-02-01T12:00:00",
+                "similarity": 0.8,
+                "text": "Test content 1"
+            }
+        ]
+        hook = SemanticRecallHook(config=self.config, vector_memory=self.mock_vector_memory)
+        
+        hook.process_prompt("Check the Kanban board")
+        hook.process_prompt("  check the kanban   BOARD ")
+        self.assertEqual(self.mock_vector_memory.search.call_count, 1)
+        self.assertEqual(hook.cache.stats()["hits"], 1)
+        
+        # An index write bumps the generation and invalidates the cache
+        self.mock_vector_memory.index_generation.return_value = 2
+        hook.process_prompt("Check the Kanban board")
+        self.assertEqual(self.mock_vector_memory.search.call_count, 2)
+        
+        # Near-duplicate prompts reuse results by query embedding
+        self.config.set("query_cache_near_duplicates", True)
+        self.mock_vector_memory.embed_query.return_value = [[1.0, 0.0]]
+        hook.process_prompt("Check the Kanban board")
+        self.mock_vector_memory.embed_query.return_value = [[0.999, 0.0447]]
+        hook.process_prompt("Check the Kanban board please")
+        self.assertEqual(self.mock_vector_memory.search.call_count, 3)
+        self.assertEqual(hook.cache.stats()["near_hits"], 1)
+
+    def test_process_prompt_deadline(self):
+        """Test a slow recall injects nothing, finishes in the background and is logged"""
+        history_path = os.path.join(self.temp_path, "recall-history.jsonl")
+        results = [{
+            "source": "test-source-1",
+            "timestamp": "2026-02-01T12:00:00",
+            "similarity": 0.8,
+            "text": "Test content 1"
+        }]
+        def slow_search(*args, **kwargs):
+            time.sleep(0.3)
+            return results
+        self.mock_vector_memory.index_generation.return_value = 1
+        self.mock_vector_memory.search.side_effect = slow_search
+        hook = SemanticRecallHook(config=self.config, vector_memory=self.mock_vector_memory)
+        
+        with mock.patch('semantic_recall.HISTORY_PATH', history_path):
+            start_time = time.time()
+            self.assertEqual(asyncio.run(hook.process_prompt_async("Check the Kanban board", deadline_ms=50)),
+                             ("", 0, 0))
+            self.assertLess(time.time() - start_time, 0.25)
+        
+            # The late recall warms the query cache for the next prompt
+            hook.submit(lambda: None).result()
+            injected_text, num_results, _ = asyncio.run(
+                hook.process_prompt_async("Check the Kanban board", deadline_ms=50))
+            self.assertEqual(num_results, 1)
+            self.assertIn("Test content 1", injected_text)
+        
+        with open(history_path) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual([entry["timed_out"] for entry in entries], [True, False])
+        self.assertEqual(entries[0]["deadline_ms"], 50)
+        self.assertGreaterEqual(entries[0]["timings_ms"]["search"], 300)
+        self.assertIn("format", entries[1]["timings_ms"])
+
+class TestRecallTelemetry(unittest.TestCase):
+    """Test the recall latency histograms"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.stats_path = os.path.join(self.temp_dir.name, "recall-stats.json")
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_histogram_percentiles(self):
+        """Test percentiles are within one bucket of the true values"""
+        from recall_telemetry import LatencyHistogram, BUCKET_GROWTH
+        histogram = LatencyHistogram()
+        for ms in range(1, 1001):
+            histogram.record(float(ms))
+        
+        self.assertEqual(histogram.count, 1000)
+        for percent, expected in ((50, 500), (95, 950), (99, 990)):
+            self.assertGreaterEqual(histogram.percentile(percent), expected)
+            self.assertLessEqual(histogram.percentile(percent), expected * BUCKET_GROWTH)
+        self.assertEqual(histogram.percentile(100), 1000)
+    
+    def test_hook_records_stages(self):
+        """Test recalls add their stage timings to the statistics file"""
+        from recall_telemetry import load_stats
+        config = SemanticRecallConfig(config_path=os.path.join(self.temp_dir.name, "config.json"))
+        vector_memory = mock.MagicMock()
+        vector_memory.index_generation.return_value = 1
+        def search(prompt, timings=None, **kwargs):
+            timings["faiss"] = 2.0
+            timings["metadata"] = 1.0
+            return [{"source": "test-source-1", "similarity": 0.8, "text": "Test content 1"}]
+        vector_memory.search.side_effect = search
+        
+        with mock.patch('semantic_recall.TELEMETRY_PATH', self.stats_path):
+            hook = SemanticRecallHook(config=config, vector_memory=vector_memory)
+            hook.process_prompt("Check the Kanban board")
+            hook.process_prompt("Check the Kanban board")
+            hook.flush_telemetry()
+        
+        stats = load_stats(self.stats_path)
+        self.assertEqual(stats["counters"]["recalls"], 2)
+        self.assertEqual(stats["counters"]["cache_miss"], 1)
+        self.assertEqual(stats["counters"]["cache_hit"], 1)
+        self.assertEqual(stats["stages"]["faiss"]["count"], 1)
+        self.assertEqual(stats["stages"]["total"]["count"], 2)
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            self.assertIn(key, stats["stages"]["search"])
+        
+        # A new process continues from the file
+        from recall_telemetry import RecallTelemetry
+        self.assertEqual(RecallTelemetry(self.stats_path).counters["recalls"], 2)
+
+    def test_processes_share_file(self):
+        """Test the server and in-process hooks add to each other's statistics"""
+        from recall_telemetry import RecallTelemetry, load_stats
+        server = RecallTelemetry(self.stats_path, flush_seconds=3600)
+        hook = RecallTelemetry(self.stats_path, flush_seconds=3600)
+        
+        server.record({"faiss": 2.0, "total": 5.0}, cache_status="miss")
+        hook.record({"total": 1.0}, timed_out=True, cache_status="hit")
+        server.flush()
+        hook.flush()
+        server.record({"total": 3.0})
+        server.flush()
+        
+        stats = load_stats(self.stats_path)
+        self.assertEqual(stats["counters"]["recalls"], 3)
+        self.assertEqual(stats["counters"]["timeouts"], 1)
+        self.assertEqual(stats["counters"]["cache_hit"], 1)
+        self.assertEqual(stats["stages"]["total"]["count"], 3)
+        self.assertEqual(stats["stages"]["faiss"]["count"], 1)
+        self.assertEqual(server.counters["recalls"], 3)
+
+class TestRecallServer(unittest.TestCase):
+    """Test the recall server client/server protocol"""
+    
+    def setUp(self):
+        """Start a server with a stub service"""
+        import threading
+        import semantic_recall_server
+        
+        class StubService:
+            def handle(self, request):
+                if request["op"] == "ping":
+                    return {"ok": True, "requests": 0, "uptime": 0}
+                return {
+                    "ok": True,
+                    "injected_text": f"context for {request['prompt']}",
+                    "num_results": 1,
+                    "token_estimate": 4
+                }
+        
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.temp_dir.name, "recall.sock")
+        self.server = semantic_recall_server.RecallServer(self.socket_path, StubService())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = semantic_recall_server.RecallClient(self.socket_path)
+    
+    def tearDown(self):
+        """Stop the server"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+    
+    def test_process_prompt(self):
+        """Test a prompt round trip through the server"""
+        self.assertTrue(self.client.ping())
+        result = self.client.process_prompt("Test prompt", session_id="test-session")
+        self.assertEqual(result, ("context for Test prompt", 1, 4))
+    
+    def test_server_unavailable(self):
+        """Test the client reports an unavailable server"""
+        import semantic_recall_server
+        client = semantic_recall_server.RecallClient(os.path.join(self.temp_dir.name, "missing.sock"))
+        self.assertIsNone(client.process_prompt("Test prompt"))
+
 def main():
     """Run the tests"""
     unittest.main()
@@ -18,8 +18,10 @@ import os
 import sys
 import json
 import time
+import asyncio
 import logging
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 
@@ -39,7 +41,7 @@ WORKSPACE_DIR = "/Users/karst/.openclaw/workspace"
 sys.path.append(WORKSPACE_DIR)
 
 try:
-    from vector_memory import VectorMemoryPipeline
+    from vector_memory import VectorMemoryPipeline, ShardedVectorMemoryPipeline
 except ImportError:
     logger.error("Required dependency not found: vector_memory.py")
     logger.error("Make sure to implement the Vector Memory Pipeline first")
@@ -49,15 +51,24 @@ except ImportError:
 CONFIG_PATH = os.path.join(WORKSPACE_DIR, "semantic-recall-config.json")
 HOOK_PATH = os.path.join(WORKSPACE_DIR, "semantic-recall-hook.json")
 HISTORY_PATH = os.path.join(WORKSPACE_DIR, "logs", "recall-history.jsonl")
+RECALL_SERVER_SCRIPT = os.path.join(WORKSPACE_DIR, "semantic_recall_server.py")
 DEFAULT_RELEVANCE_THRESHOLD = 0.65  # Higher than search to ensure quality
 DEFAULT_MAX_RESULTS = 3
 DEFAULT_MAX_TOKENS = 1500
+DEFAULT_RECENCY_HALF_LIFE_DAYS = 30.0
+DEFAULT_RECENCY_WEIGHT = 0.3
+DEFAULT_SEARCH_MODE = "hybrid"
+DEFAULT_DEADLINE_MS = 150  # Latency budget of a recall through process_prompt_async
 DEFAULT_RECALL_PREFIX = "# Recent Relevant Context\n\n"
 DEFAULT_RECALL_SUFFIX = "\n\nConsider the above context in your response.\n\n"
 
 # Make sure directories exist
 os.makedirs(os.path.join(WORKSPACE_DIR, "logs"), exist_ok=True)
 
+from recall_cache import QueryResultCache, CACHE_SIZE, CACHE_TTL_SECONDS, NEAR_DUPLICATE_SIMILARITY, HIT, NEAR_HIT, MISS
+from token_budget import get_token_counter, pack_results, TOKENIZER_ENCODING, CHARS_PER_TOKEN
+from recall_telemetry import RecallTelemetry, timed, load_stats, TELEMETRY_PATH
+
 class SemanticRecallConfig:
     """Configuration manager for Semantic Recall"""
     
@@ -87,10 +98,24 @@ class SemanticRecallConfig:
             "recall_suffix": DEFAULT_RECALL_SUFFIX,
             "enabled": True,
             "log_injections": True,
-            "token_estimation_ratio": 4.0,  # Characters per token
+            "tokenizer": TOKENIZER_ENCODING,  # tiktoken encoding for token counts, null to count by characters
+            "token_estimation_ratio": 4.0,  # Characters per token when no tokenizer is available
             "include_sources": True,
             "excluded_sessions": [],
             "context_format": "markdown",  # or "plain"
+            "use_recall_server": True,  # Route the hook through the resident recall server
+            "deadline_ms": DEFAULT_DEADLINE_MS,  # Recall later than this injects nothing, 0 waits for it
+            "telemetry": True,  # Keep per-stage latency histograms in logs/recall-stats.json
+            "recency_half_life_days": DEFAULT_RECENCY_HALF_LIFE_DAYS,  # 0 disables recency ranking
+            "recency_weight": DEFAULT_RECENCY_WEIGHT,  # Share of the score that decays with age
+            "source_weights": {},  # Overrides of the vector memory source type weights
+            "search_mode": DEFAULT_SEARCH_MODE,  # "vector", "keyword" (BM25) or "hybrid"
+            "shard_by": None,  # Vector memory layout: null for one index, "month" or "source" shards
+            "recall_window_days": None,  # Only recall memory from the last N days, null for all
+            "query_cache_size": CACHE_SIZE,  # Cached prompts, 0 disables the query cache
+            "query_cache_ttl_seconds": CACHE_TTL_SECONDS,
+            "query_cache_near_duplicates": False,  # Also reuse results of near-identical prompts
+            "query_cache_similarity": NEAR_DUPLICATE_SIMILARITY,
             "last_updated": datetime.now().isoformat()
         }
     
@@ -139,18 +164,138 @@ class SemanticRecallHook:
     
     def __init__(self, config=None, vector_memory=None):
         self.config = config or SemanticRecallConfig()
-        self.vector_memory = vector_memory or VectorMemoryPipeline()
+        self.vector_memory = vector_memory or self._create_vector_memory()
         self.recall_history = []
+        self.cache = None
+        self._cache_settings = None
+        self._executor = None
+        self.telemetry = None
+    
+    def _create_vector_memory(self):
+        """Search-only vector memory pipeline of the configured layout, sharing the index page cache"""
+        shard_by = self.config.get("shard_by")
+        if shard_by:
+            return ShardedVectorMemoryPipeline(shard_by=shard_by, read_only=True)
+        return VectorMemoryPipeline(read_only=True)
+    
+    def _get_telemetry(self):
+        """Per-stage latency histograms, None if telemetry is disabled"""
+        if not self.config.get("telemetry", True):
+            return None
+        if self.telemetry is None:
+            self.telemetry = RecallTelemetry(TELEMETRY_PATH)
+        return self.telemetry
+    
+    def flush_telemetry(self):
+        """Write pending latency statistics to the statistics file"""
+        if self.telemetry is not None:
+            self.telemetry.flush()
+    
+    def submit(self, fn, *args):
+        """
+        Run fn on the recall worker thread
+        
+        All recall work shares one thread because the vector memory pipeline
+        is not thread-safe, so calls run in the order they were submitted.
+        
+        Returns:
+            concurrent.futures.Future of the result
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="semantic-recall")
+        return self._executor.submit(fn, *args)
+    
+    def warm_up(self):
+        """Load the model, index and tokenizer so the next prompt does not wait for them"""
+        start_time = time.time()
+        self.vector_memory._load_model()
+        try:
+            self.vector_memory._load_index(create_if_missing=False)
+        except FileNotFoundError:
+            logger.warning("No index found yet, it will be loaded after the first indexing run")
+        self._get_token_counter()
+        logger.info(f"Semantic recall warmed up in {time.time() - start_time:.2f}s")
+    
+    def start_warm_up(self):
+        """Warm up on the recall worker without waiting for it"""
+        return self.submit(self.warm_up)
+    
+    def _get_cache(self):
+        """Query result cache, recreated when its configuration changes"""
+        settings = (
+            self.config.get("query_cache_size", CACHE_SIZE),
+            self.config.get("query_cache_ttl_seconds", CACHE_TTL_SECONDS),
+            self.config.get("query_cache_near_duplicates", False),
+            self.config.get("query_cache_similarity", NEAR_DUPLICATE_SIMILARITY)
+        )
+        if settings != self._cache_settings:
+            size, ttl_seconds, near_duplicates, similarity = settings
+            self.cache = QueryResultCache(size, ttl_seconds, near_duplicates, similarity)
+            self._cache_settings = settings
+        return self.cache
+    
+    def _search(self, prompt, search_params, timings=None):
+        """
+        Search vector memory through the query cache
+        
+        Args:
+            prompt: The user prompt
+            search_params: Keyword arguments of VectorMemoryPipeline.search
+            timings: Dictionary collecting milliseconds per stage
+        
+        Returns:
+            Tuple of (results, cache status)
+        """
+        with timed(timings, "cache"):
+            cache = self._get_cache()
+            generation = self.vector_memory.index_generation()
+            cache_key = cache.make_key(prompt, search_params)
+            results = cache.get(cache_key, generation)
+        if results is not None:
+            return results, HIT
+        
+        # Near-duplicate lookup embeds the prompt once, the search reuses the embedding
+        query_embedding = None
+        if cache.near_duplicates and cache.size:
+            query_embedding = self.vector_memory.embed_query(prompt, timings)
+            with timed(timings, "cache"):
+                results = cache.get_similar(cache_key, query_embedding, generation)
+            if results is not None:
+                return results, NEAR_HIT
+        
+        cache.record_miss()
+        results = self.vector_memory.search(prompt, query_embedding=query_embedding, timings=timings,
+                                            **search_params)
+        cache.put(cache_key, generation, results, query_embedding)
+        return results, MISS
+    
+    def _get_token_counter(self):
+        """Shared token counter for the configured tokenizer"""
+        return get_token_counter(
+            self.config.get("tokenizer", TOKENIZER_ENCODING),
+            self.config.get("token_estimation_ratio", CHARS_PER_TOKEN)
+        )
     
     def _estimate_tokens(self, text):
-        """Estimate the number of tokens in text"""
-        if not text:
-            return 0
-        ratio = self.config.get("token_estimation_ratio", 4.0)
-        return int(len(text) / ratio)
-    
-    def _log_recall(self, query, results, injected_text, token_estimate):
-        """Log recall event to history file"""
+        """Count the tokens in text, by characters if no tokenizer is available"""
+        return self._get_token_counter().count(text)
+    
+    def _record_timings(self, timings, deadline_ms=None, cache_status=None):
+        """Add the stage timings of a recall to the latency histograms"""
+        telemetry = self._get_telemetry()
+        if telemetry is not None:
+            timed_out = bool(deadline_ms) and timings.get("total", 0) > deadline_ms
+            telemetry.record(timings, timed_out, cache_status)
+    
+    def _log_recall(self, query, results, injected_text, token_estimate, cache_status=None,
+                    timings=None, deadline_ms=None):
+        """
+        Log recall event to history file
+        
+        Args:
+            timings: Milliseconds spent per stage
+            deadline_ms: Deadline of an async recall; the entry records whether it was missed
+        """
         if not self.config.get("log_injections", True):
             return
             
@@ -160,10 +305,20 @@ class SemanticRecallHook:
             "num_results": len(results),
             "token_estimate": token_estimate,
             "sources": [r.get("source") for r in results],
-            "similarity_range": [min([r.get("similarity", 0) for r in results] or [0]), 
-                                max([r.get("similarity", 0) for r in results] or [0])]
+            "similarity_range": [min([r.get("similarity") or 0 for r in results] or [0]), 
+                                max([r.get("similarity") or 0 for r in results] or [0])]
         }
         
+        if cache_status and self.cache is not None:
+            log_entry["cache"] = cache_status
+            log_entry["cache_hit_rate"] = round(self.cache.stats()["hit_rate"], 4)
+        
+        if timings:
+            log_entry["timings_ms"] = {stage: round(ms, 2) for stage, ms in timings.items()}
+        if deadline_ms:
+            log_entry["deadline_ms"] = deadline_ms
+            log_entry["timed_out"] = (timings or {}).get("total", 0) > deadline_ms
+        
         # Keep records of past recalls
         self.recall_history.append(log_entry)
         
@@ -178,61 +333,76 @@ class SemanticRecallHook:
         except IOError as e:
             logger.error(f"Error writing to recall history: {e}")
     
+    def _format_result(self, position, result, text=None, truncated=False):
+        """Format one recalled result at a 0-based position"""
+        source = result.get("source", "unknown")
+        timestamp = result.get("timestamp")
+        if text is None:
+            text = result.get("text", "")
+        
+        if self.config.get("context_format", "markdown") == "markdown":
+            parts = [f"### Source {position + 1}"]
+        else:
+            parts = [f"--- Source {position + 1}"]
+        
+        if self.config.get("include_sources", True):
+            parts.append(f": {source}")
+            if result.get("header_path"):
+                parts.append(f" > {result['header_path']}")
+            if timestamp:
+                try:
+                    dt = datetime.fromisoformat(timestamp)
+                    parts.append(f" ({dt.strftime('%Y-%m-%d')})")
+                except:
+                    pass
+        
+        if truncated:
+            parts.append(" [truncated]")
+        if self.config.get("context_format", "markdown") != "markdown":
+            parts.append(" ---")
+        parts.append(f"\n\n{text}\n\n")
+        return "".join(parts)
+    
     def format_recalled_context(self, results):
         """Format recalled context for injection"""
         if not results:
             return ""
         
-        context_format = self.config.get("context_format", "markdown")
-        include_sources = self.config.get("include_sources", True)
-        formatted_text = self.config.get("recall_prefix", DEFAULT_RECALL_PREFIX)
+        parts = [self.config.get("recall_prefix", DEFAULT_RECALL_PREFIX)]
+        parts.extend(self._format_result(i, result) for i, result in enumerate(results))
+        parts.append(self.config.get("recall_suffix", DEFAULT_RECALL_SUFFIX))
+        return "".join(parts)
+    
+    def pack_recalled_context(self, results, max_tokens):
+        """
+        Format as much recalled context as fits in max_tokens
         
-        for i, result in enumerate(results):
-            source = result.get("source", "unknown")
-            timestamp = result.get("timestamp")
-            similarity = result.get("similarity", 0)
-            text = result.get("text", "")
-            
-            if context_format == "markdown":
-                # Format as markdown
-                formatted_text += f"### Source {i+1}"
-                
-                if include_sources:
-                    formatted_text += f": {source}"
-                    if timestamp:
-                        try:
-                            dt = datetime.fromisoformat(timestamp)
-                            formatted_text += f" ({dt.strftime('%Y-%m-%d')})"
-                        except:
-                            pass
-                
-                formatted_text += f"\n\n{text}\n\n"
-                
-            else:
-                # Format as plain text
-                formatted_text += f"--- Source {i+1}"
-                
-                if include_sources:
-                    formatted_text += f": {source}"
-                    if timestamp:
-                        try:
-                            dt = datetime.fromisoformat(timestamp)
-                            formatted_text += f" ({dt.strftime('%Y-%m-%d')})"
-                        except:
-                            pass
-                
-                formatted_text += f" ---\n\n{text}\n\n"
+        Results are packed by relevance per token and the remaining budget is
+        filled with a result cut at a sentence boundary (see token_budget).
         
-        formatted_text += self.config.get("recall_suffix", DEFAULT_RECALL_SUFFIX)
-        return formatted_text
-    
-    def process_prompt(self, prompt, session_id=None):
+        Returns:
+            Tuple of (injected_text, packed results, token count)
+        """
+        return pack_results(
+            results,
+            self._format_result,
+            max_tokens,
+            prefix=self.config.get("recall_prefix", DEFAULT_RECALL_PREFIX),
+            suffix=self.config.get("recall_suffix", DEFAULT_RECALL_SUFFIX),
+            counter=self._get_token_counter()
+        )
+    
+    def process_prompt(self, prompt, session_id=None, deadline_ms=None, submitted_at=None):
         """
         Process a prompt and return relevant context
         
         Args:
             prompt: The user prompt to process
             session_id: Optional session ID for logging
+            deadline_ms: Deadline the caller waits for (see process_prompt_async),
+                recalls are logged with whether they missed it
+            submitted_at: time.time() when the recall was requested, so the
+                wait for the recall worker counts towards the deadline
             
         Returns:
             Tuple of (injected_text, num_results, token_estimate)
@@ -256,40 +426,55 @@ class SemanticRecallHook:
         # Search vector memory
         try:
             start_time = time.time()
-            results = self.vector_memory.search(
-                prompt,
-                k=max_results * 2,  # Request more to allow filtering
-                threshold=relevance_threshold
-            )
+            submitted_at = submitted_at or start_time
+            timings = {"queue": (start_time - submitted_at) * 1000}
+            # Results are ranked by similarity, recency and source type
+            search_params = {
+                "k": max_results * 2,  # Request more to allow filtering
+                "threshold": relevance_threshold,
+                "half_life_days": self.config.get("recency_half_life_days", DEFAULT_RECENCY_HALF_LIFE_DAYS),
+                "recency_weight": self.config.get("recency_weight", DEFAULT_RECENCY_WEIGHT),
+                "source_weights": self.config.get("source_weights"),
+                "mode": self.config.get("search_mode", DEFAULT_SEARCH_MODE)
+            }
+            # A recall window skips month shards outside it
+            window_days = self.config.get("recall_window_days")
+            if window_days:
+                search_params["since"] = (datetime.now() - timedelta(days=window_days)).date().isoformat()
+            results, cache_status = self._search(prompt, search_params, timings)
             search_time = time.time() - start_time
+            timings["search"] = search_time * 1000
             
-            logger.info(f"Vector search found {len(results)} results in {search_time:.2f}s")
+            logger.info(f"Vector search found {len(results)} results in {search_time:.2f}s (cache {cache_status})")
+            logger.debug("Recall stages: " + ", ".join(f"{stage} {ms:.1f}ms" for stage, ms in timings.items()))
             
-            # Limit to max_results
+            # Keep the best scored results
             results = results[:max_results]
             
             if not results:
                 logger.debug(f"No relevant results found for prompt: {prompt[:50]}...")
+                timings["total"] = (time.time() - submitted_at) * 1000
+                self._record_timings(timings, deadline_ms, cache_status)
+                if deadline_ms:
+                    self._log_recall(prompt, [], "", 0, cache_status, timings, deadline_ms)
                 return "", 0, 0
             
-            # Format the context
-            injected_text = self.format_recalled_context(results)
+            # Format the context within the token budget
+            found = len(results)
+            format_start = time.time()
+            injected_text, results, token_estimate = self.pack_recalled_context(results, max_tokens)
+            timings["format"] = (time.time() - format_start) * 1000
+            if len(results) < found:
+                logger.info(f"Packed {len(results)} of {found} results into {token_estimate} tokens")
             
-            # Estimate token usage
-            token_estimate = self._estimate_tokens(injected_text)
-            
-            # Check if within token budget
-            if token_estimate > max_tokens:
-                # Trim results to fit budget
-                results_to_keep = max(1, int(len(results) * max_tokens / token_estimate))
-                results = results[:results_to_keep]
-                injected_text = self.format_recalled_context(results)
-                token_estimate = self._estimate_tokens(injected_text)
-                
-                logger.info(f"Trimmed results to {results_to_keep} to fit token budget")
+            if not results:
+                logger.debug(f"No result fits the token budget of {max_tokens}")
+                injected_text, token_estimate = "", 0
             
-            # Log the recall
-            self._log_recall(prompt, results, injected_text, token_estimate)
+            # Log the recall, also when nothing fit the budget
+            timings["total"] = (time.time() - submitted_at) * 1000
+            self._record_timings(timings, deadline_ms, cache_status)
+            self._log_recall(prompt, results, injected_text, token_estimate, cache_status, timings, deadline_ms)
             
             return injected_text, len(results), token_estimate
             
@@ -297,12 +482,51 @@ class SemanticRecallHook:
             logger.error(f"Error in semantic recall: {e}")
             return "", 0, 0
     
+    async def process_prompt_async(self, prompt, session_id=None, deadline_ms=None):
+        """
+        Process a prompt, giving up on injecting context after a deadline
+        
+        Recall runs on the recall worker thread, so the event loop is never
+        blocked. If the recall has not finished when the deadline passes
+        (a cold model or index load, a slow disk), nothing is injected, but
+        the recall keeps running in the background: the model and index end
+        up loaded and its results cached for the next prompt. The recall is
+        logged to the history with its stage timings when it finishes.
+        
+        Args:
+            prompt: The user prompt to process
+            session_id: Optional session ID for logging
+            deadline_ms: Latency budget, defaults to the deadline_ms setting (0 waits for the recall)
+            
+        Returns:
+            Tuple of (injected_text, num_results, token_estimate), empty if the deadline passed
+        """
+        if deadline_ms is None:
+            deadline_ms = self.config.get("deadline_ms", DEFAULT_DEADLINE_MS)
+        
+        future = asyncio.wrap_future(self.submit(self.process_prompt, prompt, session_id, deadline_ms, time.time()))
+        if not deadline_ms:
+            return await future
+        
+        try:
+            # Shielded so the recall finishes in the background after a timeout
+            return await asyncio.wait_for(asyncio.shield(future), deadline_ms / 1000)
+        except asyncio.TimeoutError:
+            logger.warning(f"Semantic recall missed its {deadline_ms}ms deadline, injecting nothing")
+            return "", 0, 0
+    
     def register_hook(self):
         """Register the hook with OpenClaw"""
+        # The server client keeps the hook fast; it falls back to in-process recall
+        if self.config.get("use_recall_server", True):
+            script = RECALL_SERVER_SCRIPT
+        else:
+            script = os.path.abspath(__file__)
+        
         hook_data = {
             "type": "pre_prompt",
             "name": "semantic_recall",
-            "script": os.path.abspath(__file__),
+            "script": script,
             "function": "hook_entry_point",
             "enabled": self.config.is_enabled(),
             "registered_at": datetime.now().isoformat()
@@ -334,19 +558,52 @@ def hook_entry_point(prompt, session_id=None):
     """
     Entry point for OpenClaw hook system
     
-    This function is called by OpenClaw before processing a prompt
+    This function is called by OpenClaw before processing a prompt. The
+    resident recall server is used when it is running, so the model and
+    index do not have to be loaded for every prompt.
     """
     config = SemanticRecallConfig()
-    vector_memory = VectorMemoryPipeline()
-    hook = SemanticRecallHook(config, vector_memory)
+    
+    if config.get("use_recall_server", True):
+        from semantic_recall_server import RecallClient
+        result = RecallClient().process_prompt(prompt, session_id)
+        if result is not None:
+            return result[0]
+    
+    hook = SemanticRecallHook(config)
     
     injected_text, num_results, token_estimate = hook.process_prompt(prompt, session_id)
+    hook.flush_telemetry()
     
     if injected_text:
         logger.info(f"Injected {num_results} results ({token_estimate} tokens) for prompt")
     
     return injected_text
 
+def print_stats(path=TELEMETRY_PATH, as_json=False):
+    """Print the recall latency statistics written by the hook"""
+    stats = load_stats(path)
+    if stats is None:
+        print(f"No recall statistics yet ({path})")
+        return
+    
+    if as_json:
+        print(json.dumps({key: value for key, value in stats.items() if key != "bucket_bounds_ms"}, indent=2))
+        return
+    
+    counters = stats.get("counters", {})
+    print(f"Recalls since {stats.get('since')}: {counters.get('recalls', 0)} "
+          f"({counters.get('timeouts', 0)} missed the deadline, {stats.get('timeout_rate', 0):.1%})")
+    cache = {key[len("cache_"):]: value for key, value in counters.items() if key.startswith("cache_")}
+    if cache:
+        print("Query cache: " + ", ".join(f"{count} {status}" for status, count in cache.items()))
+    
+    print(f"\n{'Stage':<12} {'Count':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for stage, summary in stats.get("stages", {}).items():
+        print(f"{stage:<12} {summary['count']:>8} {summary['p50_ms']:>10.2f} {summary['p95_ms']:>10.2f} "
+              f"{summary['p99_ms']:>10.2f} {summary['max_ms']:>10.2f}")
+    print(f"\nUpdated {stats.get('updated_at')}")
+
 def main():
     """Main function for CLI usage"""
     parser = argparse.ArgumentParser(description="Semantic Recall Hook System")
@@ -374,13 +631,31 @@ def main():
     test_parser = subparsers.add_parser("test", help="Test semantic recall")
     test_parser.add_argument("prompt", help="Prompt to test")
     
+    # Serve command
+    serve_parser = subparsers.add_parser("serve", help="Run the resident recall server")
+    
+    # Stats command
+    stats_parser = subparsers.add_parser("stats", help="Show recall latency percentiles per stage")
+    stats_parser.add_argument("--json", action="store_true", help="Print the raw statistics file")
+    
     # Parse arguments
     args = parser.parse_args()
     
-    # Initialize components
+    # The server loads its own components
+    if args.command == "serve":
+        import semantic_recall_server
+        semantic_recall_server.serve()
+        return
+    
+    # Statistics are read from the file the hook writes
+    if args.command == "stats":
+        print_stats(as_json=args.json)
+        return
+    
+    # Initialize components; only the commands that use the hook create the pipeline
     config = SemanticRecallConfig()
-    vector_memory = VectorMemoryPipeline()
-    hook = SemanticRecallHook(config, vector_memory)
+    if args.command in ("register", "unregister", "test"):
+        hook = SemanticRecallHook(config)
     
     # Execute command
     if args.command == "register":
@@ -38,6 +38,12 @@ except ImportError:
     from sklearn.cluster import SpectralClustering
     from sklearn.metrics.pairwise import cosine_similarity
 
+# Optional shared embedding cache from the OpenClaw workspace
+try:
+    from embedding_cache import get_embedding_cache
+except ImportError:
+    get_embedding_cache = None
+
 class SemanticCompressor:
     """Compress text while preserving semantic meaning using embedding-based clustering and summarization."""
     
@@ -46,7 +52,8 @@ class SemanticCompressor:
         embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
         summarizer_model: str = "facebook/bart-large-cnn",
         device: str = None,
-        cache_dir: str = None
+        cache_dir: str = None,
+        embedding_cache=None
     ):
         """Initialize the compressor with specified models."""
         if device is None:
@@ -57,6 +64,7 @@ class SemanticCompressor:
         logger.info(f"Using device: {self.device}")
         
         # Load embedding model
+        self.embedding_model_name = embedding_model
         self.embedding_tokenizer = AutoTokenizer.from_pretrained(embedding_model, cache_dir=cache_dir)
         self.embedding_model = AutoModel.from_pretrained(embedding_model, cache_dir=cache_dir).to(self.device)
         
@@ -68,6 +76,11 @@ class SemanticCompressor:
             cache_dir=cache_dir
         )
         
+        # Segments embedded before are read from the shared embedding cache
+        if embedding_cache is None and get_embedding_cache is not None:
+            embedding_cache = get_embedding_cache()
+        self.embedding_cache = embedding_cache
+        
         logger.info("Models loaded successfully")
     
     def _split_into_segments(
@@ -94,7 +107,16 @@ class SemanticCompressor:
         return segments
     
     def _generate_embeddings(self, segments: List[str]) -> np.ndarray:
-        """Generate embeddings for text segments."""
+        """Generate embeddings for text segments, reusing cached ones."""
+        if self.embedding_cache is None:
+            return self._embed_segments(segments)
+        
+        # Mean pooling over 512 tokens differs from sentence-transformers output
+        namespace = f"{self.embedding_model_name}:mean-pooled-512"
+        return self.embedding_cache.encode(segments, self._embed_segments, namespace=namespace)
+    
+    def _embed_segments(self, segments: List[str]) -> np.ndarray:
+        """Run the embedding model on text segments."""
         embeddings = []
         
         for segment in tqdm(segments, desc="Generating embeddings"):
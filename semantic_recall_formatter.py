@@ -4,7 +4,8 @@ Token-Aware Formatter for Semantic Recall Hook System
 
 This module handles the intelligent formatting of search results for
 injection into the context window, respecting token limits and
-priority ordering.
+priority ordering. Tokens are counted with the shared tokenizer of
+token_budget, and results are packed by relevance per token.
 """
 
 import os
@@ -24,6 +25,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger('semantic-recall-formatter')
 
+from token_budget import get_token_counter, pack_results, TOKENIZER_ENCODING
+
 class TokenAwareFormatter:
     """
     Formats search results for context injection while respecting token limits
@@ -32,16 +35,22 @@ class TokenAwareFormatter:
     def __init__(self, config=None):
         """Initialize with optional config"""
         self.config = config or {}
-        self.token_estimation_ratio = self.config.get('token_estimation_ratio', 4.0)  # chars per token
+        self.token_estimation_ratio = self.config.get('token_estimation_ratio', 4.0)  # chars per token without a tokenizer
+        self.tokenizer = self.config.get('tokenizer', TOKENIZER_ENCODING)
         self.max_tokens = self.config.get('max_tokens', 1500)
         self.include_sources = self.config.get('include_sources', True)
         self.context_format = self.config.get('context_format', 'markdown')
         self.recall_prefix = self.config.get('recall_prefix', '# Relevant Context\n\n*Semantic recall detected relevant information*\n\n')
         self.recall_suffix = self.config.get('recall_suffix', '\n\n---\n\n')
         
+    @property
+    def token_counter(self):
+        """Shared counter for the configured tokenizer"""
+        return get_token_counter(self.tokenizer, self.token_estimation_ratio)
+    
     def estimate_tokens(self, text):
-        """Estimate token count based on character count"""
-        return len(text) / self.token_estimation_ratio if text else 0
+        """Count tokens, by characters if no tokenizer is available"""
+        return self.token_counter.count(text)
     
     def format_results(self, results, max_tokens=None):
         """
@@ -62,105 +71,42 @@ class TokenAwareFormatter:
         # Sort results by score (highest first)
         sorted_results = sorted(results, key=lambda x: x.get('score', 0), reverse=True)
         
-        # Start with prefix
-        formatted_text = self.recall_prefix
-        current_tokens = self.estimate_tokens(formatted_text)
-        suffix_tokens = self.estimate_tokens(self.recall_suffix)
-        
-        # Reserve tokens for suffix
-        available_tokens = max_tokens - suffix_tokens
-        
-        # Add results one by one until we hit token limit
-        added_results = []
-        
-        for result in sorted_results:
-            # Format this result
-            result_text = self._format_single_result(result)
-            result_tokens = self.estimate_tokens(result_text)
-            
-            # Check if we can add it
-            if current_tokens + result_tokens <= available_tokens:
-                formatted_text += result_text
-                current_tokens += result_tokens
-                added_results.append(result)
-            else:
-                # Try truncated version if this is first result
-                if not added_results:
-                    truncated = self._truncate_result(
-                        result, 
-                        available_tokens - current_tokens
-                    )
-                    if truncated:
-                        formatted_text += truncated
-                        added_results.append(result)
-                break
-                
-        # Add suffix if we added any results
-        if added_results:
-            formatted_text += self.recall_suffix
+        # Pack whole results by relevance per token, then fill the rest with a truncated one
+        formatted_text, added_results, tokens = pack_results(
+            sorted_results,
+            lambda position, result, text, truncated: self._format_single_result(result, text, truncated),
+            max_tokens,
+            prefix=self.recall_prefix,
+            suffix=self.recall_suffix,
+            counter=self.token_counter,
+            relevance=lambda result: result.get('score', 0)
+        )
             
         # Log what we did
         logger.info(f"Formatted {len(added_results)} of {len(results)} results " +
-                   f"using ~{int(current_tokens + suffix_tokens)} tokens " +
+                   f"using {tokens} tokens " +
                    f"(limit: {max_tokens})")
         
         return formatted_text if added_results else None
     
-    def _format_single_result(self, result):
-        """Format a single search result"""
-        text = result.get('text', '')
+    def _format_single_result(self, result, text=None, truncated=False):
+        """Format a single search result, optionally showing truncated text"""
+        if text is None:
+            text = result.get('text', '')
         source = result.get('source', 'Unknown')
         score = result.get('score', 0)
+        notice = " [truncated]" if truncated else ""
         
         if self.context_format == 'markdown':
-            formatted = f"## {source}\n\n"
-            formatted += text.strip() + "\n\n"
+            parts = [f"## {source}\n\n", text.strip(), "\n\n"]
             if self.include_sources:
-                formatted += f"*Source: {source} (relevance: {score:.2f})*\n\n"
+                parts.append(f"*Source: {source} (relevance: {score:.2f}){notice}*\n\n")
         else:  # plain text
-            formatted = f"{source}:\n\n"
-            formatted += text.strip() + "\n\n"
+            parts = [f"{source}:\n\n", text.strip(), "\n\n"]
             if self.include_sources:
-                formatted += f"Source: {source} (relevance: {score:.2f})\n\n"
+                parts.append(f"Source: {source} (relevance: {score:.2f}){notice}\n\n")
                 
-        return formatted
-    
-    def _truncate_result(self, result, available_token_count):
-        """Truncate a result to fit within available tokens"""
-        if available_token_count < 100:
-            return None  # Too small to be useful
-            
-        text = result.get('text', '')
-        source = result.get('source', 'Unknown')
-        score = result.get('score', 0)
-        
-        # Calculate how many chars we can keep
-        chars_to_keep = int(available_token_count * self.token_estimation_ratio)
-        
-        # Reserve space for header, source, and truncation notice
-        if self.context_format == 'markdown':
-            header = f"## {source}\n\n"
-            footer = f"\n\n*Source: {source} (relevance: {score:.2f}) [truncated]*\n\n"
-        else:
-            header = f"{source}:\n\n"
-            footer = f"\n\nSource: {source} (relevance: {score:.2f}) [truncated]\n\n"
-            
-        reserved_chars = len(header) + len(footer)
-        
-        if chars_to_keep <= reserved_chars:
-            return None  # Too small to be useful
-            
-        # Truncate the text
-        content_chars = chars_to_keep - reserved_chars
-        truncated_text = text[:content_chars] + "..."
-        
-        # Format the result
-        if self.context_format == 'markdown':
-            formatted = header + truncated_text + footer
-        else:
-            formatted = header + truncated_text + footer
-            
-        return formatted
+        return "".join(parts)
         
     def format_metadata(self, results, prompt=None):
         """
@@ -181,7 +127,7 @@ class TokenAwareFormatter:
             "prompt_snippet": prompt[:100] + "..." if prompt and len(prompt) > 100 else prompt,
             "results_count": len(results),
             "top_sources": [r.get('source', 'Unknown') for r in results[:3]],
-            "token_estimate": int(self.estimate_tokens(self._format_single_result(results[0]))),
+            "token_estimate": self.estimate_tokens(self._format_single_result(results[0])),
             "score_range": [
                 min([r.get('score', 0) for r in results]),
                 max([r.get('score', 0) for r in results])
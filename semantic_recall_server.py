@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Semantic Recall Server - Context Retention System Component 4
+
+Long-lived local server that keeps the embedding model, FAISS index and
+vector metadata resident so the pre-prompt hook does not pay model and index
+load time on every prompt.
+
+The server listens on a Unix socket and speaks newline-delimited JSON, one
+request per connection:
+
+    {"op": "process_prompt", "prompt": "...", "session_id": "...", "deadline_ms": 150}
+    {"op": "ping"}
+    {"op": "reload"}
+
+The index and configuration are hot-reloaded when their files change on disk,
+so the nightly indexing job is picked up without restarting the server.
+
+Prompts are answered within a deadline (deadline_ms in the request, or the
+deadline_ms setting): a recall that takes longer injects nothing and finishes
+in the background. The server starts listening right away and loads the
+model and index in the background, so early prompts are never blocked on it.
+
+This module keeps its top-level imports to the standard library: the hook
+client path never imports the model or FAISS. If the server is not running,
+hook_entry_point falls back to running recall in-process.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import socket
+import signal
+import logging
+import argparse
+import threading
+import socketserver
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[
+        logging.FileHandler("/Users/karst/.openclaw/workspace/logs/semantic-recall-server.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger('semantic-recall-server')
+
+# Constants
+WORKSPACE_DIR = "/Users/karst/.openclaw/workspace"
+SOCKET_PATH = os.path.join(WORKSPACE_DIR, "logs", "semantic-recall.sock")
+PID_PATH = os.path.join(WORKSPACE_DIR, "logs", "semantic-recall-server.pid")
+CLIENT_TIMEOUT = 2.0  # Seconds the hook waits for the server before falling back
+MAX_REQUEST_BYTES = 1024 * 1024
+
+# Make sure directories exist
+os.makedirs(os.path.join(WORKSPACE_DIR, "logs"), exist_ok=True)
+
+class RecallClient:
+    """Client for the semantic recall server"""
+
+    def __init__(self, socket_path=SOCKET_PATH, timeout=CLIENT_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def request(self, payload):
+        """
+        Send a request to the server
+
+        Returns:
+            Response dictionary, or None if the server is unavailable
+        """
+        if not os.path.exists(self.socket_path):
+            return None
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+                sock.sendall(json.dumps(payload).encode() + b"\n")
+
+                buffer = b""
+                while not buffer.endswith(b"\n"):
+                    data = sock.recv(65536)
+                    if not data:
+                        break
+                    buffer += data
+
+            if not buffer:
+                return None
+            return json.loads(buffer)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Recall server unavailable: {e}")
+            return None
+
+    def ping(self):
+        """Check whether the server is running"""
+        response = self.request({"op": "ping"})
+        return bool(response and response.get("ok"))
+
+    def process_prompt(self, prompt, session_id=None, deadline_ms=None):
+        """
+        Run semantic recall on the server
+
+        Args:
+            prompt: The user prompt
+            session_id: Optional session ID for logging
+            deadline_ms: Latency budget, defaults to the server's deadline_ms setting
+
+        Returns:
+            Tuple of (injected_text, num_results, token_estimate), or None if
+            the server is unavailable
+        """
+        response = self.request({
+            "op": "process_prompt",
+            "prompt": prompt,
+            "session_id": session_id,
+            "deadline_ms": deadline_ms
+        })
+        if not response or not response.get("ok"):
+            return None
+        return response["injected_text"], response["num_results"], response["token_estimate"]
+
+class RecallService:
+    """Resident semantic recall state shared by all server connections"""
+
+    def __init__(self):
+        # Heavy imports happen here, never on the client path
+        from semantic_recall import SemanticRecallConfig, SemanticRecallHook, CONFIG_PATH
+
+        self._config_class = SemanticRecallConfig
+        self.config_path = CONFIG_PATH
+        self.config_mtime = self._config_mtime()
+        self.hook = SemanticRecallHook(SemanticRecallConfig())
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.started_at = time.time()
+
+    def _config_mtime(self):
+        try:
+            return os.path.getmtime(self.config_path)
+        except OSError:
+            return None
+
+    def warm_up(self):
+        """Load the model and index on the recall worker before the first prompt needs them"""
+        return self.hook.start_warm_up()
+
+    def reload_if_changed(self):
+        """Pick up index and configuration changes made by other processes"""
+        reloaded = self.hook.vector_memory.reload_if_changed()
+
+        config_mtime = self._config_mtime()
+        if config_mtime != self.config_mtime:
+            logger.info("Configuration changed on disk, reloading")
+            self.hook.config = self._config_class()
+            self.config_mtime = config_mtime
+            if self.hook.config.get("shard_by") != getattr(self.hook.vector_memory, "shard_by", None):
+                logger.info("Vector memory layout changed, switching pipelines")
+                self.hook.vector_memory = self.hook._create_vector_memory()
+            reloaded = True
+
+        return reloaded
+
+    def handle(self, request):
+        """Dispatch a decoded request"""
+        op = request.get("op")
+
+        if op == "ping":
+            cache = self.hook.cache.stats() if self.hook.cache is not None else None
+            return {"ok": True, "requests": self.requests, "uptime": time.time() - self.started_at,
+                    "cache": cache}
+
+        # Recall work runs in order on the hook's worker thread
+        if op == "reload":
+            return {"ok": True, "reloaded": self.hook.submit(self.reload_if_changed).result()}
+
+        if op == "process_prompt":
+            with self.lock:
+                self.requests += 1
+            self.hook.submit(self.reload_if_changed)
+            injected_text, num_results, token_estimate = asyncio.run(self.hook.process_prompt_async(
+                request.get("prompt", ""),
+                request.get("session_id"),
+                request.get("deadline_ms")
+            ))
+            return {
+                "ok": True,
+                "injected_text": injected_text,
+                "num_results": num_results,
+                "token_estimate": token_estimate
+            }
+
+        return {"ok": False, "error": f"Unknown op: {op}"}
+
+class RecallRequestHandler(socketserver.StreamRequestHandler):
+    """Handles one newline-delimited JSON request per connection"""
+
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        try:
+            request = json.loads(line)
+            response = self.server.service.handle(request)
+        except ValueError as e:
+            response = {"ok": False, "error": f"Invalid request: {e}"}
+        except Exception as e:
+            logger.error(f"Error handling request: {e}")
+            response = {"ok": False, "error": str(e)}
+
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+class RecallServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server holding a warm RecallService"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, service):
+        self.service = service
+        self.socket_path = socket_path
+        super().__init__(socket_path, RecallRequestHandler)
+        os.chmod(socket_path, 0o600)
+
+def serve(socket_path=SOCKET_PATH, pid_path=PID_PATH):
+    """Run the recall server in the foreground until interrupted"""
+    client = RecallClient(socket_path)
+    if client.ping():
+        logger.info(f"Recall server already running on {socket_path}")
+        return False
+
+    # Remove a stale socket left by a crashed server
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    service = RecallService()
+    service.warm_up()
+
+    server = RecallServer(socket_path, service)
+    with open(pid_path, 'w') as f:
+        f.write(str(os.getpid()))
+
+    def shutdown(signum, frame):
+        logger.info(f"Received signal {signum}, shutting down")
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    logger.info(f"Semantic recall server listening on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.hook.flush_telemetry()
+        for path in (socket_path, pid_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return True
+
+def stop(pid_path=PID_PATH):
+    """Stop a running recall server"""
+    if not os.path.exists(pid_path):
+        return False
+
+    try:
+        with open(pid_path, 'r') as f:
+            pid = int(f.read().strip())
+        os.kill(pid, signal.SIGTERM)
+        return True
+    except (ValueError, OSError) as e:
+        logger.error(f"Error stopping recall server: {e}")
+        return False
+
+def hook_entry_point(prompt, session_id=None):
+    """
+    Entry point for OpenClaw hook system
+
+    Asks the resident recall server first and only loads the model in-process
+    when the server is not running.
+    """
+    result = RecallClient().process_prompt(prompt, session_id)
+    if result is not None:
+        return result[0]
+
+    logger.info("Recall server not running, falling back to in-process recall")
+    from semantic_recall import SemanticRecallConfig, SemanticRecallHook
+
+    hook = SemanticRecallHook(SemanticRecallConfig())
+    injected_text, num_results, token_estimate = hook.process_prompt(prompt, session_id)
+    hook.flush_telemetry()
+    return injected_text
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Semantic Recall Server")
+    subparsers = parser.add_subparsers(dest="command", help="Command to run")
+
+    subparsers.add_parser("serve", help="Run the recall server in the foreground")
+    subparsers.add_parser("stop", help="Stop the running recall server")
+    subparsers.add_parser("status", help="Check whether the recall server is running")
+    subparsers.add_parser("reload", help="Reload the index and configuration if changed")
+
+    query_parser = subparsers.add_parser("query", help="Run a prompt through the recall server")
+    query_parser.add_argument("prompt", help="Prompt to test")
+
+    args = parser.parse_args()
+    client = RecallClient()
+
+    if args.command == "serve":
+        sys.path.append(WORKSPACE_DIR)
+        serve()
+
+    elif args.command == "stop":
+        if stop():
+            print("Semantic recall server stopped")
+        else:
+            print("Semantic recall server is not running")
+
+    elif args.command == "status":
+        response = client.request({"op": "ping"})
+        if response and response.get("ok"):
+            print(f"Running: {response['requests']} requests served, up {response['uptime']:.0f}s")
+            cache = response.get("cache")
+            if cache:
+                print(f"Query cache: {cache['entries']} prompts, {cache['hit_rate']:.1%} hit rate "
+                      f"({cache['hits']} hits, {cache['near_hits']} near-duplicate hits, {cache['misses']} misses)")
+        else:
+            print("Semantic recall server is not running")
+
+    elif args.command == "reload":
+        response = client.request({"op": "reload"})
+        if response and response.get("ok"):
+            print("Reloaded" if response["reloaded"] else "Index and configuration unchanged")
+        else:
+            print("Semantic recall server is not running")
+
+    elif args.command == "query":
+        start_time = time.time()
+        result = client.process_prompt(args.prompt)
+        elapsed_ms = (time.time() - start_time) * 1000
+        if result is None:
+            print("Semantic recall server is not running")
+        elif result[0]:
+            print(f"Found {result[1]} relevant results ({result[2]} tokens) in {elapsed_ms:.1f}ms:\n")
+            print(result[0])
+        else:
+            print(f"No relevant context found for this prompt ({elapsed_ms:.1f}ms)")
+
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -3,62 +3,55 @@
 Send Message utility for the autonomous system
 Uses multiple approaches for maximum reliability
 Optimized for Telegram with redundant delivery methods
+
+Scripts can import send_message() to send in-process over the shared
+gateway connection pool instead of running this script.
 """
 import sys
 import os
-import time
-import json
 import datetime
 import subprocess
 
+from gateway_client import get_client, GatewayError, GatewayUnavailable, MISSING_ROUTE_STATUSES, TELEGRAM_TARGET
+
 def send_message(message):
     """
     Send a message using multiple methods for reliability
-    1. Direct OpenClaw message via Telegram with retries
-    2. File-based approach for heartbeat checks
-    3. Multiple API fallback methods
+    1. Local gateway API via Telegram, with retries and backoff
+    2. OpenClaw CLI if the gateway is unreachable or does not serve the message route;
+       a message the gateway rejected or may have received is not resent
+    3. File-based approach for heartbeat checks
     """
     success = False
     errors = []
     
     try:
-        # 1. First attempt: Direct OpenClaw message call via Telegram with retries
-        for attempt in range(3):  # Try up to 3 times
+        # 1. First attempt: the gateway client retries with backoff on a pooled connection
+        fallback = False
+        try:
+            get_client().send_message(message, channel="telegram", target=TELEGRAM_TARGET)
+            print("Message sent via gateway API")
+            success = True
+        except GatewayError as e:
+            errors.append(f"Gateway delivery failed: {str(e)}")
+            fallback = isinstance(e, GatewayUnavailable) or e.status in MISSING_ROUTE_STATUSES
+        
+        if fallback:
+            # 2. Alternative: the OpenClaw CLI, which may reach the gateway another way
             try:
-                # Add a small delay between retries to avoid rate limiting
-                if attempt > 0:
-                    time.sleep(2)
-                    
-                result = subprocess.run([
+                subprocess.run([
                     "openclaw", "message", "send",
                     "--channel", "telegram", 
-                    "--target", "535786496",
-                    "--message", message  # Don't add attempt tracking to avoid spam
+                    "--target", TELEGRAM_TARGET,
+                    "--message", message
                 ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=10)
                 
-                print(f"Message sent via Telegram (attempt {attempt+1})")
+                print("Message sent via Telegram CLI")
                 success = True
-                break  # Exit the retry loop if successful
-            except Exception as e:
-                errors.append(f"Telegram delivery attempt {attempt+1} failed: {str(e)}")
-                
-                # On final attempt failure, try an alternative approach
-                if attempt == 2:  
-                    try:
-                        # Alternative: Try using a direct API call
-                        message_json = json.dumps(message)
-                        alt_cmd = [
-                            "curl", "-s", "-X", "POST", "http://localhost:18789/api/v1/agent/message",
-                            "-H", "Content-Type: application/json",
-                            "-d", f'{{"channel":"telegram","target":"535786496","message":{message_json}}}'
-                        ]
-                        subprocess.run(alt_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=10)
-                        print("Message sent via alternative API method")
-                        success = True
-                    except Exception as e2:
-                        errors.append(f"Alternative delivery method failed: {str(e2)}")
+            except Exception as e2:
+                errors.append(f"Telegram CLI delivery failed: {str(e2)}")
         
-        # 2. Create file-based message for heartbeat checks
+        # 3. Create file-based message for heartbeat checks
         try:
             # Create messages directory if it doesn't exist
             messages_dir = os.path.expanduser("~/.openclaw/workspace/autonomous_messages")
@@ -86,26 +79,6 @@ def send_message(message):
         except Exception as e:
             errors.append(f"File storage failed: {str(e)}")
         
-        # 3. Try one more API approach as final fallback
-        if not success:
-            try:
-                # Escape quotes in the message for JSON
-                message_json = json.dumps(message)
-                
-                # Use curl with different parameters as final fallback
-                curl_cmd = [
-                    "curl", "-s", "-m", "15", "-X", "POST", "http://localhost:18789/api/v1/agent/message",
-                    "-H", "Content-Type: application/json",
-                    "-H", "Accept: application/json",
-                    "-d", f'{{"channel":"telegram","target":"535786496","message":{message_json}}}'
-                ]
-                
-                result = subprocess.run(curl_cmd, check=True, capture_output=True, text=True)
-                print(f"Message sent via fallback API method")
-                success = True
-            except Exception as e:
-                errors.append(f"Final fallback approach failed: {str(e)}")
-        
         # Also log the message for debugging
         log_file = os.path.expanduser("~/.openclaw/workspace/logs/message_delivery.log")
         os.makedirs(os.path.dirname(log_file), exist_ok=True)
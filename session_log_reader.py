@@ -0,0 +1,293 @@
+"""
+Session Log Reader - Context Retention System
+
+Incremental, streaming reader for the session logs in logs/sessions, shared
+by the vector memory pipeline and the hourly memory summarizer.
+
+Session logs are JSON objects with a "messages" array ({"session_id": ...,
+"messages": [...]}) or JSONL files with one message per line. Messages are
+decoded one at a time from a small read buffer, so a long-running session
+never has to be loaded into memory at once.
+
+The reader remembers, per file, the byte offset just after the last message
+it yielded, the number of messages read and a hash of the bytes before that
+offset. The next read of a file that only grew (new messages appended, or a
+JSON log rewritten with the same prefix) seeks to the offset and yields only
+the new messages; a file whose prefix changed is read again from the start.
+A complete JSONL line that is not valid JSON is logged and skipped.
+
+The state is a plain dictionary so each consumer can persist it alongside
+its own results and only advance it when its work was committed.
+"""
+
+import os
+import json
+import codecs
+import hashlib
+import logging
+
+logger = logging.getLogger('session-log-reader')
+
+# Constants
+WORKSPACE_DIR = "/Users/karst/.openclaw/workspace"
+SESSION_LOGS_DIR = os.path.join(WORKSPACE_DIR, "logs", "sessions")
+READ_SIZE = 64 * 1024  # Bytes read per refill of the decode buffer
+TAIL_BYTES = 64  # Bytes before the stored offset used to detect rewritten files
+
+# File states reported by SessionLogReader.check
+UNCHANGED = "unchanged"
+APPENDED = "appended"
+REWRITTEN = "rewritten"
+NEW = "new"
+_MALFORMED = object()  # Yielded by _iter_jsonl for a complete line that is not JSON
+
+class _JSONStream:
+    """Incremental JSON tokenizer over a binary file that tracks byte offsets"""
+
+    WHITESPACE = " \t\r\n"
+
+    def __init__(self, f, offset=0):
+        self.f = f
+        self.buffer = ""
+        self.offset = offset  # Byte offset of buffer[0] in the file
+        self.read_size = READ_SIZE
+        self.decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def _fill(self):
+        """Append the next block of the file to the buffer, False at EOF"""
+        data = self.f.read(self.read_size)
+        if not data:
+            return False
+        self.buffer += self._utf8.decode(data)
+        return True
+
+    def _consume(self, length):
+        """Drop length characters from the buffer"""
+        consumed = self.buffer[:length]
+        self.buffer = self.buffer[length:]
+        self.offset += len(consumed.encode('utf-8'))
+
+    def peek(self, skip=WHITESPACE):
+        """Next character after skipping the given characters, None at EOF"""
+        while True:
+            stripped = self.buffer.lstrip(skip)
+            if len(stripped) != len(self.buffer):
+                self._consume(len(self.buffer) - len(stripped))
+            if self.buffer:
+                return self.buffer[0]
+            if not self._fill():
+                return None
+
+    def expect(self, char, skip=WHITESPACE):
+        """Consume char, False if the next character is something else"""
+        if self.peek(skip) != char:
+            return False
+        self._consume(1)
+        return True
+
+    def value(self, skip=WHITESPACE):
+        """
+        Decode the next complete JSON value
+
+        Returns:
+            The value, or raises EOFError if the file ends before it is complete
+        """
+        self.peek(skip)
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer)
+                # A number at the end of the buffer may continue in the next block
+                if end < len(self.buffer) or not isinstance(value, (int, float)):
+                    self._consume(end)
+                    self.read_size = READ_SIZE
+                    return value
+            except json.JSONDecodeError:
+                pass
+            if not self._fill():
+                raise EOFError("Incomplete JSON value")
+            # Grow reads for large values so decoding stays linear
+            self.read_size *= 2
+
+class SessionLogReader:
+    """Streams messages from session logs, resuming where the last read stopped"""
+
+    def __init__(self, state=None):
+        """
+        Args:
+            state: Per-file read state from a previous run (see `state`)
+        """
+        self.state = dict(state or {})
+
+    @staticmethod
+    def _tail_hash(f, offset):
+        """Hash of the TAIL_BYTES before offset"""
+        start = max(0, offset - TAIL_BYTES)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+    def check(self, file_path):
+        """
+        Compare a file with its stored read state
+
+        Returns:
+            NEW, UNCHANGED, APPENDED or REWRITTEN
+        """
+        entry = self.state.get(file_path)
+        if entry is None:
+            return NEW
+
+        file_stat = os.stat(file_path)
+        if file_stat.st_size == entry["size"] and file_stat.st_mtime == entry["mtime"]:
+            return UNCHANGED
+        if file_stat.st_size < entry["offset"]:
+            return REWRITTEN
+
+        with open(file_path, 'rb') as f:
+            if self._tail_hash(f, entry["offset"]) != entry["tail"]:
+                return REWRITTEN
+        return APPENDED
+
+    def message_count(self, file_path):
+        """Number of messages read from a file so far"""
+        entry = self.state.get(file_path)
+        return entry["messages"] if entry else 0
+
+    def iter_messages(self, file_path, status=None):
+        """
+        Yield the messages of a file that were not read before
+
+        Once the iteration ends (or the generator is closed) the stored state
+        points just after the last yielded message. A message that is still
+        being written (truncated JSON) ends the iteration and is read on the
+        next run.
+
+        Args:
+            file_path: Session log path (.json or .jsonl)
+            status: Result of check() if the caller already has it
+        """
+        if status is None:
+            status = self.check(file_path)
+        if status == UNCHANGED:
+            return
+
+        file_stat = os.stat(file_path)
+        entry = self.state.get(file_path)
+        if status == APPENDED:
+            offset, count = entry["offset"], entry["messages"]
+        else:
+            offset, count = 0, 0
+
+        jsonl = file_path.endswith(".jsonl")
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            messages = self._iter_jsonl(f, offset) if jsonl else self._iter_json(f, offset)
+            try:
+                for message, end_offset in messages:
+                    offset = end_offset
+                    if message is _MALFORMED:
+                        continue
+                    count += 1
+                    yield message
+            except ValueError as e:
+                logger.error(f"Error reading session log {file_path}: {e}")
+            finally:
+                self.state[file_path] = {
+                    "offset": offset,
+                    "messages": count,
+                    "size": file_stat.st_size,
+                    "mtime": file_stat.st_mtime,
+                    "tail": self._tail_hash(f, offset)
+                }
+
+    def _iter_json(self, f, offset):
+        """Yield (message, end_offset) from a {"messages": [...]} log"""
+        stream = _JSONStream(f, offset)
+
+        if offset == 0:
+            # Walk the top-level object up to the messages array
+            if not stream.expect("{"):
+                raise ValueError("Session log is not a JSON object")
+            while True:
+                if stream.expect("}", skip=stream.WHITESPACE + ","):
+                    return
+                try:
+                    key = stream.value(skip=stream.WHITESPACE + ",")
+                except EOFError:
+                    return
+                if not stream.expect(":"):
+                    raise ValueError("Malformed session log")
+                if key == "messages":
+                    if not stream.expect("["):
+                        raise ValueError("messages is not an array")
+                    break
+                try:
+                    stream.value()
+                except EOFError:
+                    return
+
+        # Inside the messages array, just after "[" or after a message
+        while True:
+            if stream.peek(skip=stream.WHITESPACE + ",") in ("]", None):
+                return
+            try:
+                message = stream.value(skip=stream.WHITESPACE + ",")
+            except EOFError:
+                return
+            yield message, stream.offset
+
+    def _iter_jsonl(self, f, offset):
+        """Yield (message, end_offset) from a log with one message per line"""
+        for line in f:
+            # A line without newline may still be being written
+            if not line.endswith(b"\n"):
+                return
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError as e:
+                # Skipped, so one bad line does not stop every later read at it
+                logger.warning(f"Skipping malformed line in session log {f.name}: {e}")
+                message = _MALFORMED
+            yield message, offset
+
+    def iter_logs(self, log_dir=SESSION_LOGS_DIR, since=None):
+        """
+        Yield (file_path, status) for the session logs with unread messages
+
+        Args:
+            log_dir: Directory of session logs
+            since: Only consider files modified at or after this Unix time
+        """
+        for name in sorted(os.listdir(log_dir)) if os.path.isdir(log_dir) else []:
+            if not name.endswith((".json", ".jsonl")):
+                continue
+            file_path = os.path.join(log_dir, name)
+            if since is not None and os.path.getmtime(file_path) < since:
+                continue
+            status = self.check(file_path)
+            if status != UNCHANGED:
+                yield file_path, status
+
+    def iter_new_messages(self, log_dir=SESSION_LOGS_DIR, since=None):
+        """Yield (file_path, message) for every message not read before"""
+        for file_path, status in self.iter_logs(log_dir, since):
+            for message in self.iter_messages(file_path, status):
+                yield file_path, message
+
+def load_state(path):
+    """Read reader state saved with save_state"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, json.JSONDecodeError):
+        return {}
+
+def save_state(path, state):
+    """Write reader state atomically"""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the memory tool entry points
+
+Runs each command line under `python -X importtime` and reports the total
+import time, the wall time of the run and the slowest imports. Commands that
+only read configuration or stored metadata must not import faiss,
+sentence-transformers or torch; a run that does fails the benchmark.
+
+With --save the results become the baseline (logs/startup-baseline.json).
+Later runs fail if an entry point imports more than TOLERANCE slower than
+its baseline, so startup regressions are caught before they ship.
+
+Usage:
+    python startup-benchmark.py
+    python startup-benchmark.py --runs 5 --top 10
+    python startup-benchmark.py --save
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+WORKSPACE_DIR = "/Users/karst/.openclaw/workspace"
+BASELINE_PATH = os.path.join(WORKSPACE_DIR, "logs", "startup-baseline.json")
+HEAVY_MODULES = ("faiss", "sentence_transformers", "torch", "transformers")
+TOLERANCE = 0.25  # Allowed import time growth over the baseline
+TOLERANCE_MS = 20.0  # Allowed absolute growth, for entry points that import little
+
+# Name, command line and whether heavy modules are allowed
+ENTRY_POINTS = [
+    ("vector-memory --help", ["vector-memory.py", "--help"], False),
+    ("vector-memory --stats", ["vector-memory.py", "--stats"], False),
+    ("semantic-recall config", ["semantic-recall.py", "config", "--get", "enabled"], False),
+    ("semantic-recall stats", ["semantic-recall.py", "stats"], False),
+    ("recall-server status", ["semantic_recall_server.py", "status"], False),
+]
+
+def parse_importtime(stderr):
+    """
+    Parse -X importtime output
+
+    Returns:
+        Tuple of (total import microseconds, {module: cumulative microseconds}
+        for top-level imports, set of all imported modules)
+    """
+    total_us = 0
+    top_level = {}
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        module = name.strip()
+        modules.add(module)
+        # Nested imports are indented by two spaces per level
+        if len(name) - len(name.lstrip()) <= 1:
+            top_level[module] = int(cumulative_us)
+    return total_us, top_level, modules
+
+def run_entry_point(argv, runs):
+    """Run a command line runs times, returning median import and wall times in ms"""
+    import_ms, wall_ms = [], []
+    top_level, modules = {}, set()
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime"] + argv,
+            cwd=WORKSPACE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        wall_ms.append((time.perf_counter() - start_time) * 1000)
+        total_us, top_level, modules = parse_importtime(process.stderr)
+        import_ms.append(total_us / 1000)
+    return {
+        "import_ms": statistics.median(import_ms),
+        "wall_ms": statistics.median(wall_ms),
+        "top_imports_ms": {module: us / 1000 for module, us in
+                           sorted(top_level.items(), key=lambda item: -item[1])},
+        "heavy_modules": sorted(module for module in modules
+                                if module.split(".")[0] in HEAVY_MODULES and "." not in module)
+    }
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, json.JSONDecodeError):
+        return {}
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup-time benchmark for the memory tool entry points")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per entry point (median is reported)")
+    parser.add_argument("--top", type=int, default=5, help="Slowest top-level imports to show")
+    parser.add_argument("--save", action="store_true", help="Save the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    failures = []
+
+    print(f"{'Entry point':<26} {'Import ms':>10} {'Wall ms':>10} {'Baseline':>10}")
+    for name, argv, heavy_allowed in ENTRY_POINTS:
+        result = run_entry_point(argv, args.runs)
+        results[name] = result
+
+        reference = baseline.get(name, {}).get("import_ms")
+        print(f"{name:<26} {result['import_ms']:>10.1f} {result['wall_ms']:>10.1f} "
+              f"{reference if reference is not None else '-':>10}")
+        for module, ms in list(result["top_imports_ms"].items())[:args.top]:
+            print(f"    {module:<30} {ms:>8.1f} ms")
+
+        if result["heavy_modules"] and not heavy_allowed:
+            failures.append(f"{name} imports {', '.join(result['heavy_modules'])}")
+        if reference is not None and result["import_ms"] > reference * (1 + TOLERANCE) + TOLERANCE_MS:
+            failures.append(f"{name} imports in {result['import_ms']:.1f} ms, baseline {reference:.1f} ms")
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({name: {"import_ms": result["import_ms"], "wall_ms": result["wall_ms"]}
+                       for name, result in results.items()}, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+
+    if failures:
+        print("\nStartup regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nNo startup regressions")
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,12 @@ Post-Compaction Context Injector functionality.
 """
 
 import os
+import re
 import sys
 import json
+import time
+import shutil
+import threading
 import unittest
 from unittest import mock
 import subprocess
@@ -18,6 +22,9 @@ from datetime import datetime
 # Import the post-compaction-inject module
 sys.path.append('/Users/karst/.openclaw/workspace')
 import post_compaction_inject
+import compaction_detector
+from gateway_client import GatewayClient
+from fake_gateway import FakeGateway
 
 class TestContextStateManager(unittest.TestCase):
     """Test the ContextStateManager class"""
@@ -28,9 +35,12 @@ class TestContextStateManager(unittest.TestCase):
         self.state_manager = post_compaction_inject.ContextStateManager(state_file=self.temp_state_file)
     
     def tearDown(self):
-        # Clean up temporary file
-        if os.path.exists(self.temp_state_file):
-            os.remove(self.temp_state_file)
+        # Clean up temporary state, journal and lock files
+        self.state_manager.store.close()
+        base_path = os.path.splitext(self.temp_state_file)[0]
+        for path in (self.temp_state_file, base_path + ".journal", base_path + ".lock"):
+            if os.path.exists(path):
+                os.remove(path)
     
     def test_register_message(self):
         """Test message registration"""
@@ -56,6 +66,54 @@ class TestContextStateManager(unittest.TestCase):
         result = self.state_manager.register_message(session_id, message_id, content, role)
         self.assertFalse(result)
     
+    def test_state_persistence(self):
+        """Test state is replayed from the journal and survives snapshots"""
+        session_id = "test-session"
+        for i in range(120):
+            self.state_manager.register_message(session_id, f"msg_{i}", f"Test message {i}", "user")
+        self.state_manager.register_injection(session_id, "Injected context")
+        
+        # A second manager sees the journaled messages and rejects duplicates
+        other = post_compaction_inject.ContextStateManager(state_file=self.temp_state_file)
+        session = other.state["sessions"][session_id]
+        self.assertEqual(session["message_count"], 120)
+        self.assertEqual(len(session["messages"]), 50)
+        self.assertEqual(session["last_message_id"], "msg_119")
+        self.assertEqual(len(other.state["injections"]), 1)
+        self.assertFalse(other.register_message(session_id, "dup", "Test message 119", "user"))
+        
+        # Only the last 100 hashes are kept for duplicate detection
+        self.assertTrue(other.register_message(session_id, "msg_0_again", "Test message 0", "user"))
+        self.assertFalse(self.state_manager.register_message(session_id, "dup", "Test message 0", "user"))
+        
+        # After a snapshot the journal starts afresh and the state loads from the file
+        other.save_state()
+        other.store.close()
+        with open(self.temp_state_file, 'r') as f:
+            self.assertEqual(json.load(f)["sessions"][session_id]["message_count"], 121)
+        reloaded = post_compaction_inject.ContextStateManager(state_file=self.temp_state_file)
+        self.assertEqual(reloaded.state["sessions"][session_id]["message_count"], 121)
+        self.assertFalse(reloaded.register_message(session_id, "dup", "Test message 50", "user"))
+        self.assertTrue(self.state_manager.register_message(session_id, "msg_121", "Test message 121", "user"))
+        self.assertEqual(self.state_manager.state["sessions"][session_id]["message_count"], 122)
+        reloaded.store.close()
+    
+    def test_torn_journal_line(self):
+        """Test an event appended after a torn journal line is read by other processes"""
+        session_id = "test-session"
+        self.state_manager.register_message(session_id, "msg_0", "Test message 0", "user")
+        journal_path = os.path.splitext(self.temp_state_file)[0] + ".journal"
+        with open(journal_path, 'a') as f:
+            f.write('{"op": "message", "session_id": "test-se')  # A writer died mid-line
+        
+        self.state_manager.register_message(session_id, "msg_1", "Test message 1", "user")
+        other = post_compaction_inject.ContextStateManager(state_file=self.temp_state_file)
+        try:
+            self.assertEqual(other.state["sessions"][session_id]["message_count"], 2)
+            self.assertEqual(other.state["sessions"][session_id]["last_message_id"], "msg_1")
+        finally:
+            other.store.close()
+    
     def test_detect_compaction(self):
         """Test compaction detection"""
         session_id = "test-session"
@@ -85,7 +143,7 @@ class TestContextStateManager(unittest.TestCase):
             content="Error: input length and max_tokens exceed context limit: 180000 > 16000",
             role="system"
         )
-        self.assertTrue(result)
+        self.assertEqual(result, "reset_marker_7")
         
         # Test non-compaction message
         result = self.state_manager.detect_compaction(
@@ -96,11 +154,57 @@ class TestContextStateManager(unittest.TestCase):
         )
         self.assertFalse(result)
 
+class TestCompactionMatcher(unittest.TestCase):
+    """Test the compiled compaction matcher"""
+    
+    def setUp(self):
+        self.matcher = compaction_detector.CompactionMatcher()
+    
+    def test_search(self):
+        """Test the matcher agrees with scanning each rule separately"""
+        messages = [
+            "I'LL START FRESH with the task",
+            "Sorry, it seems I've lost some context here",
+            "Error: token limit exceeded",
+            "The Context Window size was exceeded",
+            "Please retry with SMALLER input",
+            "context buffer is full",
+            "A normal message about the memory index",
+            "The context is fine and the file is full of notes\nnothing else"
+        ]
+        for message in messages:
+            expected = (any(marker.lower() in message.lower() for marker in compaction_detector.RESET_MARKERS) or
+                        any(re.search(pattern, message, re.IGNORECASE) for pattern in compaction_detector.ERROR_PATTERNS))
+            self.assertEqual(self.matcher.search(message) is not None, expected, message)
+    
+    def test_rule_reported(self):
+        """Test the rule that fired is reported, reset markers first"""
+        rule = self.matcher.search("The context window is full")
+        self.assertEqual(rule.kind, compaction_detector.RESET_MARKER)
+        self.assertEqual(rule.pattern, "context window is full")
+        
+        rule = self.matcher.search("Please retry with less context")
+        self.assertEqual(rule.kind, compaction_detector.ERROR_PATTERN)
+        self.assertEqual(rule.pattern, r"retry with (?:smaller|less) (?:context|input)")
+        
+        self.assertIsNone(self.matcher.search("Nothing to see here"))
+
 class TestMemoryRetriever(unittest.TestCase):
     """Test the MemoryRetriever class"""
     
     def setUp(self):
-        self.memory_retriever = post_compaction_inject.MemoryRetriever()
+        self.temp_dir = tempfile.mkdtemp()
+        # Outside the summaries directory, whose stamp the cache depends on
+        os.makedirs(os.path.join(self.temp_dir, "cache"))
+        self.cache_file = os.path.join(self.temp_dir, "cache", "injection-cache.json")
+        self.memory_retriever = post_compaction_inject.MemoryRetriever(
+            memory_dir=self.temp_dir,
+            summaries_dir=self.temp_dir,
+            cache_file=self.cache_file
+        )
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
     
     @mock.patch('post_compaction_inject.MemoryRetriever.get_task_context')
     @mock.patch('post_compaction_inject.MemoryRetriever.get_main_memory_content')
@@ -146,6 +250,70 @@ class TestMemoryRetriever(unittest.TestCase):
         self.assertIn("Test Task", injection)
         self.assertIn("Current Projects", injection)
         self.assertIn("Identity & Purpose", injection)
+    
+    @mock.patch('post_compaction_inject.MemoryRetriever.get_task_context')
+    def test_injection_cache(self, mock_task):
+        """Test the injection sections are reused until a source file changes"""
+        mock_task.return_value = {"title": "Cached Task", "progress": 10}
+        
+        first = self.memory_retriever.generate_context_injection("session-1", max_tokens=2000)
+        second = self.memory_retriever.generate_context_injection("session-2", max_tokens=2000)
+        self.assertIn("Cached Task", second)
+        self.assertEqual(mock_task.call_count, 1)
+        
+        # Only the injection timestamp may differ
+        strip_timestamp = lambda text: re.sub(r"\*Memory injection at [^*]*\*", "", text)
+        self.assertEqual(strip_timestamp(first), strip_timestamp(second))
+        
+        # A new retriever, as in another injector process, reads the cache file
+        other = post_compaction_inject.MemoryRetriever(
+            memory_dir=self.temp_dir,
+            summaries_dir=self.temp_dir,
+            cache_file=self.cache_file
+        )
+        self.assertIn("Cached Task", other.generate_context_injection("session-3"))
+        self.assertEqual(mock_task.call_count, 1)
+        
+        # Writing today's memory file invalidates the cached sections
+        today_file = os.path.join(self.temp_dir, datetime.now().strftime("%Y-%m-%d") + ".md")
+        with open(today_file, 'w') as f:
+            f.write("Worked on the injection cache.")
+        injection = self.memory_retriever.generate_context_injection("session-1", max_tokens=2000)
+        self.assertIn("Worked on the injection cache.", injection)
+        self.assertEqual(mock_task.call_count, 2)
+
+class TestMessagingManager(unittest.TestCase):
+    """Test the MessagingManager class"""
+    
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        self.messaging = post_compaction_inject.MessagingManager(GatewayClient(self.gateway.url, backoff=0))
+    
+    def tearDown(self):
+        self.messaging.gateway.close()
+        self.gateway.stop()
+    
+    @mock.patch('subprocess.run')
+    def test_inject_context(self, mock_run):
+        """Test context is injected through the gateway, and the CLI only without the tool route"""
+        self.gateway.respond("POST", "/api/v1/tools/invoke", {"ok": True})
+        self.assertTrue(self.messaging.inject_context("test-session", "Injected context"))
+        self.assertEqual(self.gateway.requests[-1][2], {
+            "tool": "sessions_send",
+            "args": {"sessionKey": "test-session", "message": "Injected context"}
+        })
+        
+        # A rejected injection is not retried through the CLI
+        self.gateway.fail("POST", "/api/v1/tools/invoke", 400)
+        self.assertFalse(self.messaging.inject_context("test-session", "Injected context"))
+        mock_run.assert_not_called()
+        
+        # A gateway without the tool route falls back to the CLI
+        mock_run.return_value = mock.Mock(returncode=0)
+        self.gateway.fail("POST", "/api/v1/tools/invoke", 404)
+        self.assertTrue(self.messaging.inject_context("test-session", "Injected context"))
+        mock_run.assert_called_once()
+        self.assertEqual(mock_run.call_args[0][0][:2], ["openclaw", "sessions_send"])
 
 class TestCompactionHandler(unittest.TestCase):
     """Test the CompactionHandler class"""
@@ -199,6 +367,127 @@ class TestCompactionHandler(unittest.TestCase):
         mock_generate.assert_not_called()
         mock_inject.assert_not_called()
 
+class TestLogMonitor(unittest.TestCase):
+    """Test CompactionHandler.monitor_logs"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_dir = os.path.join(self.temp_dir, "sessions")
+        self.state_path = os.path.join(self.temp_dir, "offsets.json")
+        os.makedirs(self.log_dir)
+        
+        self.handler = post_compaction_inject.CompactionHandler()
+        self.handler.state_manager = post_compaction_inject.ContextStateManager(
+            state_file=os.path.join(self.temp_dir, "context-state.json")
+        )
+        self.handler.memory_retriever.cache = None
+    
+    def tearDown(self):
+        self.handler.state_manager.store.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def _append(self, log_path, messages):
+        with open(log_path, 'a') as f:
+            for message in messages:
+                f.write(json.dumps(message) + "\n")
+    
+    def _wait_for(self, mock_inject, calls, timeout=5.0):
+        deadline = time.time() + timeout
+        while mock_inject.call_count < calls and time.time() < deadline:
+            time.sleep(0.01)
+        return mock_inject.call_count
+    
+    @mock.patch('post_compaction_inject.MemoryRetriever.generate_context_injection')
+    @mock.patch('post_compaction_inject.MessagingManager.inject_context')
+    def _check_monitor(self, use_inotify, mock_inject, mock_generate):
+        mock_generate.return_value = "Mocked injection content"
+        mock_inject.return_value = True
+        
+        # Messages logged before the monitor starts are not processed
+        log_path = os.path.join(self.log_dir, "session-1.jsonl")
+        self._append(log_path, [{"role": "assistant", "content": "I'll start fresh, old compaction"}])
+        
+        stop_event = threading.Event()
+        monitor = threading.Thread(target=self.handler.monitor_logs, kwargs={
+            "log_dir": self.log_dir,
+            "state_path": self.state_path,
+            "poll_interval": 0.05,
+            "use_inotify": use_inotify,
+            "stop_event": stop_event
+        })
+        monitor.start()
+        try:
+            time.sleep(0.2)
+            self._append(log_path, [{"role": "user", "content": "A normal message"}])
+            self._append(log_path, [{"role": "assistant", "content": "Sorry, I don't have that context"}])
+            self.assertEqual(self._wait_for(mock_inject, 1), 1)
+            mock_inject.assert_called_with("session-1", "Mocked injection content")
+            
+            # A new log is read from the start
+            self._append(os.path.join(self.log_dir, "session-2.jsonl"),
+                         [{"role": "system", "content": "Error: token limit exceeded"}])
+            self.assertEqual(self._wait_for(mock_inject, 2), 2)
+            mock_inject.assert_called_with("session-2", "Mocked injection content")
+        finally:
+            stop_event.set()
+            monitor.join(timeout=5)
+        
+        self.assertFalse(monitor.is_alive())
+        self.assertEqual(self.handler.state_manager.state["sessions"]["session-1"]["message_count"], 2)
+        with open(self.state_path, 'r') as f:
+            self.assertEqual(json.load(f)[log_path]["messages"], 3)
+    
+    def test_monitor_inotify(self):
+        """Test the monitor with inotify, where available"""
+        self._check_monitor(True)
+    
+    def test_monitor_polling(self):
+        """Test the monitor with the polling fallback"""
+        self._check_monitor(False)
+    
+    @mock.patch('post_compaction_inject.MemoryRetriever.generate_context_injection')
+    @mock.patch('post_compaction_inject.MessagingManager.inject_context')
+    def test_monitor_rewritten(self, mock_inject, mock_generate):
+        """Test a rewritten log does not inject for its old compactions again"""
+        mock_generate.return_value = "Mocked injection content"
+        mock_inject.return_value = True
+        
+        messages = [{"role": "user", "content": f"Message {i}"} for i in range(150)]
+        messages[5] = {"role": "assistant", "content": "Sorry, I don't have that context"}
+        
+        stop_event = threading.Event()
+        monitor = threading.Thread(target=self.handler.monitor_logs, kwargs={
+            "log_dir": self.log_dir,
+            "state_path": self.state_path,
+            "poll_interval": 0.05,
+            "use_inotify": False,
+            "stop_event": stop_event
+        })
+        monitor.start()
+        try:
+            time.sleep(0.2)
+            log_path = os.path.join(self.log_dir, "session-1.jsonl")
+            self._append(log_path, messages)
+            self.assertEqual(self._wait_for(mock_inject, 1), 1)
+            
+            # Re-serialized with different whitespace, plus one new compaction
+            messages.append({"role": "system", "content": "Error: token limit exceeded"})
+            temp_path = os.path.join(self.temp_dir, "session-1.jsonl")
+            with open(temp_path, 'w') as f:
+                for message in messages:
+                    f.write(json.dumps(message, separators=(",", ":")) + "\n")
+            os.replace(temp_path, log_path)
+            
+            self.assertEqual(self._wait_for(mock_inject, 2), 2)
+            time.sleep(0.3)
+            self.assertEqual(mock_inject.call_count, 2)
+        finally:
+            stop_event.set()
+            monitor.join(timeout=5)
+        
+        with open(self.state_path, 'r') as f:
+            self.assertEqual(json.load(f)[log_path]["messages"], 151)
+
 def run_integration_test():
     """Run an integration test that executes the actual script"""
     test_session = f"test-session-{int(datetime.now().timestamp())}"
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test Script for the Gateway Client
+
+Runs the shared gateway client against a fake local gateway.
+"""
+
+import os
+import sys
+import socket
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append('/Users/karst/.openclaw/workspace')
+from gateway_client import GatewayClient, GatewayError, GatewayUnavailable, TELEGRAM_TARGET
+from fake_gateway import FakeGateway
+import send_message
+
+class TestGatewayClient(unittest.TestCase):
+    """Test the GatewayClient class"""
+    
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        self.client = GatewayClient(self.gateway.url, timeout=2, backoff=0)
+    
+    def tearDown(self):
+        self.client.close()
+        self.gateway.stop()
+    
+    def test_send_message(self):
+        """Test messages are posted on one kept-alive connection"""
+        self.gateway.respond("POST", "/api/v1/agent/message", {"ok": True})
+        
+        self.assertEqual(self.client.send_message("First"), {"ok": True})
+        self.assertEqual(self.client.send_message("Second", channel=None), {"ok": True})
+        
+        self.assertEqual(self.gateway.requests, [
+            ("POST", "/api/v1/agent/message", {"message": "First", "channel": "telegram", "target": TELEGRAM_TARGET}),
+            ("POST", "/api/v1/agent/message", {"message": "Second", "target": TELEGRAM_TARGET})
+        ])
+        self.assertEqual(len(self.gateway.connections), 1)
+    
+    def test_retries(self):
+        """Test server errors are retried, client errors and possibly processed POSTs are not"""
+        self.gateway.respond("POST", "/api/v1/agent/message", {"ok": True})
+        self.gateway.fail("POST", "/api/v1/agent/message", 503, times=2)
+        self.assertEqual(self.client.send_message("Retried"), {"ok": True})
+        self.assertEqual(len(self.gateway.requests), 3)
+        
+        self.gateway.fail("POST", "/api/v1/agent/message", 503, times=3)
+        with self.assertRaises(GatewayUnavailable):
+            self.client.send_message("Gateway down")
+        
+        self.gateway.fail("POST", "/api/v1/agent/message", 400)
+        with self.assertRaises(GatewayError) as context:
+            self.client.send_message("Rejected")
+        self.assertEqual(context.exception.status, 400)
+        self.assertEqual(len(self.gateway.requests), 7)
+        
+        # A POST the gateway may have acted on is not resent
+        self.gateway.fail("POST", "/api/v1/agent/message", 500)
+        with self.assertRaises(GatewayError) as context:
+            self.client.send_message("Maybe delivered")
+        self.assertNotIsInstance(context.exception, GatewayUnavailable)
+        self.assertEqual(context.exception.status, 500)
+        self.assertEqual(len(self.gateway.requests), 8)
+        
+        # Idempotent requests are
+        self.gateway.respond("POST", "/api/v1/tools/invoke", {"ok": True, "result": {"messages": []}})
+        self.gateway.fail("POST", "/api/v1/tools/invoke", 500)
+        self.assertEqual(self.client.sessions_history("session-1"), [])
+        self.assertEqual(len(self.gateway.requests), 10)
+    
+    def test_post_not_resent(self):
+        """Test a timed out POST is not resent, while idempotent requests and stale connections are"""
+        client = GatewayClient(self.gateway.url, timeout=0.2, retries=2, backoff=0)
+        self.gateway.respond("POST", "/api/v1/tools/invoke", {"ok": True, "result": {"messages": []}})
+        self.gateway.delay("POST", "/api/v1/tools/invoke", 0.5)
+        try:
+            with self.assertRaises(GatewayError) as context:
+                client.sessions_send("session-1", "Injected once")
+            self.assertNotIsInstance(context.exception, GatewayUnavailable)
+            self.assertEqual(len(self.gateway.requests), 1)
+            
+            with self.assertRaises(GatewayUnavailable):
+                client.sessions_history("session-1")
+            self.assertEqual(len(self.gateway.requests), 3)
+            
+            # A pooled connection the gateway closed is resent on a new one
+            self.gateway.delay("POST", "/api/v1/tools/invoke", 0)
+            client.sessions_send("session-1", "Before idle close")
+            self.gateway.close_connections()
+            client.sessions_send("session-1", "After idle close")
+            self.assertEqual(self.gateway.requests[-1][2]["args"]["message"], "After idle close")
+            self.assertEqual(len(self.gateway.requests), 5)
+        finally:
+            client.close()
+    
+    def test_unreachable(self):
+        """Test a gateway that is not running raises GatewayUnavailable"""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        client = GatewayClient(f"http://127.0.0.1:{port}/api/v1", timeout=1, retries=2, backoff=0)
+        with self.assertRaises(GatewayUnavailable):
+            client.send_message("Nobody listening")
+    
+    def test_sessions_tools(self):
+        """Test session tools are invoked through the gateway"""
+        self.gateway.respond("POST", "/api/v1/tools/invoke", {"ok": True, "result": {"messages": [
+            {"role": "user", "content": "Hello"}
+        ]}})
+        
+        messages = self.client.sessions_history("session-1", limit=5)
+        self.assertEqual(messages, [{"role": "user", "content": "Hello"}])
+        self.assertEqual(self.gateway.requests[-1][2], {
+            "tool": "sessions_history",
+            "args": {"sessionKey": "session-1", "limit": 5}
+        })
+        
+        self.client.sessions_send("session-1", "Injected context")
+        self.assertEqual(self.gateway.requests[-1][2], {
+            "tool": "sessions_send",
+            "args": {"sessionKey": "session-1", "message": "Injected context"}
+        })
+
+class TestSendMessage(unittest.TestCase):
+    """Test send_message falls back to the CLI only when the gateway did not get the message"""
+    
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        self.client = GatewayClient(self.gateway.url, timeout=2, backoff=0)
+        self.home = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        self.client.close()
+        self.gateway.stop()
+        shutil.rmtree(self.home)
+    
+    def _send(self, mock_run):
+        with mock.patch.object(send_message, "get_client", return_value=self.client), \
+             mock.patch.dict(os.environ, {"HOME": self.home}):
+            self.assertTrue(send_message.send_message("Hello"))
+        return mock_run.call_count
+    
+    @mock.patch('subprocess.run')
+    def test_cli_fallback(self, mock_run):
+        """Test rejected messages are not resent, missing routes are"""
+        self.gateway.fail("POST", "/api/v1/agent/message", 400)
+        self.assertEqual(self._send(mock_run), 0)
+        
+        self.gateway.fail("POST", "/api/v1/agent/message", 404)
+        self.assertEqual(self._send(mock_run), 1)
+        self.assertEqual(mock_run.call_args[0][0][:3], ["openclaw", "message", "send"])
+
+if __name__ == "__main__":
+    unittest.main()
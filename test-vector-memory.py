@@ -10,9 +10,14 @@ import os
 import sys
 import json
 import time
+import glob
+import fcntl
+import shutil
 import tempfile
 import unittest
+import numpy as np
 from datetime import datetime
+from unittest.mock import patch
 
 # Create test directories if they don't exist
 TEST_DIR = "/Users/karst/.openclaw/workspace/memory/vectors/test"
@@ -28,13 +33,16 @@ spec = importlib.util.spec_from_file_location(
 vector_memory = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(vector_memory)
 
+from embedding_cache import EmbeddingCache
+from session_log_reader import SessionLogReader, APPENDED, REWRITTEN, UNCHANGED
+
 class TestVectorMemory(unittest.TestCase):
     """Test cases for the Vector Memory Pipeline"""
     
     def setUp(self):
         """Set up test environment"""
         self.test_index_path = os.path.join(TEST_DIR, "test_memory.index")
-        self.test_metadata_path = os.path.join(TEST_DIR, "test_metadata.json")
+        self.test_metadata_path = os.path.join(TEST_DIR, "test_metadata.db")
         
         # Create a test pipeline with separate index and metadata
         self.pipeline = vector_memory.VectorMemoryPipeline(
@@ -74,12 +82,16 @@ class TestVectorMemory(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test environment"""
-        # Remove test files
-        if os.path.exists(self.test_index_path):
-            os.remove(self.test_index_path)
+        # Remove test files, including every index generation
+        for path in glob.glob(self.test_index_path + "*"):
+            os.remove(path)
         
-        if os.path.exists(self.test_metadata_path):
-            os.remove(self.test_metadata_path)
+        self.pipeline.store.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.test_metadata_path + suffix):
+                os.remove(self.test_metadata_path + suffix)
+        if os.path.exists(self.pipeline.write_lock.path):
+            os.remove(self.pipeline.write_lock.path)
     
     def test_add_and_search(self):
         """Test adding texts and searching"""
@@ -92,7 +104,7 @@ class TestVectorMemory(unittest.TestCase):
             )
         
         # Check metadata
-        self.assertEqual(len(self.pipeline.metadata["chunks"]), len(self.test_data))
+        self.assertEqual(self.pipeline.store.count(), len(self.test_data))
         
         # Test exact search
         results = self.pipeline.search("Vector memory FAISS semantic search")
@@ -114,8 +126,280 @@ class TestVectorMemory(unittest.TestCase):
         )
         self.assertLessEqual(len(results_high_threshold), len(results_low_threshold))
     
+    def test_add_texts_single_commit(self):
+        """Test bulk ingestion writes the index once"""
+        items = [(item["text"], item["source"], item["timestamp"]) for item in self.test_data]
+        
+        save_calls = []
+        original_save = self.pipeline._save_index
+        def counting_save():
+            save_calls.append(1)
+            original_save()
+        self.pipeline._save_index = counting_save
+        
+        chunks_added = self.pipeline.add_texts(items, max_chunks=2)
+        
+        self.assertEqual(chunks_added, len(self.test_data))
+        self.assertEqual(len(save_calls), 1)
+        self.assertEqual(self.pipeline.index.ntotal, len(self.test_data))
+        
+        results = self.pipeline.search("Vector memory FAISS semantic search")
+        self.assertEqual(results[0]["source"], "test/vector-memory.md")
+    
+    def test_legacy_metadata_migration(self):
+        """Test metadata.json is migrated into the store"""
+        legacy_path = os.path.join(TEST_DIR, "legacy_metadata.json")
+        with open(legacy_path, 'w') as f:
+            json.dump({
+                "chunks": [
+                    {"id": 0, "text": "Legacy chunk", "source": "memory/2026-02-01.md",
+                     "timestamp": "2026-02-01T00:00:00", "start": 0, "end": 12}
+                ],
+                "last_update": "2026-02-01T00:00:00",
+                "total_chunks": 1,
+                "model_name": "all-MiniLM-L6-v2",
+                "embedding_dim": 384
+            }, f)
+        
+        pipeline = vector_memory.VectorMemoryPipeline(
+            index_path=self.test_index_path,
+            metadata_path=legacy_path
+        )
+        
+        self.assertEqual(pipeline.store.count(), 1)
+        self.assertEqual(pipeline.store.get(0)["text"], "Legacy chunk")
+        self.assertEqual(pipeline.store.get_meta("last_update"), "2026-02-01T00:00:00")
+        self.assertFalse(os.path.exists(legacy_path))
+        
+        pipeline.store.close()
+        legacy_db = os.path.join(TEST_DIR, "legacy_metadata.db")
+        for path in (legacy_path + ".migrated", legacy_db, legacy_db + "-wal", legacy_db + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def test_flush_sorts_by_length(self):
+        """Test buffered chunks are embedded in length order"""
+        encoded = []
+        original_encode = self.pipeline._encode
+        def recording_encode(texts):
+            encoded.extend(texts)
+            return original_encode(texts)
+        self.pipeline._encode = recording_encode
+        
+        with self.pipeline.write_session(max_chunks=100) as session:
+            for item in self.test_data:
+                session.add(item["text"], item["source"], item["timestamp"])
+        
+        self.assertEqual(encoded, sorted((item["text"] for item in self.test_data), key=len))
+        self.assertEqual(session.flushes, 1)
+    
+    def test_write_session_rollback(self):
+        """Test a failed write session leaves the index untouched"""
+        with self.assertRaises(ValueError):
+            with self.pipeline.write_session(max_chunks=1) as session:
+                session.add(self.test_data[0]["text"], self.test_data[0]["source"])
+                raise ValueError("simulated failure")
+        
+        self.assertEqual(self.pipeline.store.count(), 0)
+        self.assertFalse(os.path.exists(self.test_index_path))
+    
+    def test_crash_before_metadata_commit(self):
+        """Test a crash between the index and metadata writes keeps the last committed pair"""
+        with self.pipeline.write_session() as session:
+            session.add_many((item["text"], item["source"], item["timestamp"]) for item in self.test_data[:2])
+            
+            # Writers hold the lock for the whole session
+            with open(self.pipeline.write_lock.path) as f:
+                with self.assertRaises(BlockingIOError):
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        committed_count = self.pipeline.store.count()
+        
+        with patch.object(self.pipeline.store, "commit", side_effect=OSError("simulated crash")):
+            with self.assertRaises(OSError):
+                with self.pipeline.write_session() as session:
+                    session.add(self.test_data[2]["text"], self.test_data[2]["source"])
+        
+        reader = vector_memory.VectorMemoryPipeline(
+            index_path=self.test_index_path,
+            metadata_path=self.test_metadata_path
+        )
+        try:
+            index = reader._load_index(create_if_missing=False)
+            self.assertEqual(reader.store.count(), committed_count)
+            self.assertEqual(index.ntotal, committed_count)
+            self.assertEqual(reader.index_generation(), 1)
+        finally:
+            reader.store.close()
+    
+    def test_read_only_search(self):
+        """Test a search-only pipeline memory-maps the committed index and follows new commits"""
+        reader = vector_memory.VectorMemoryPipeline(
+            index_path=self.test_index_path,
+            metadata_path=self.test_metadata_path,
+            read_only=True
+        )
+        try:
+            # A missing index is never created by a reader
+            with self.assertRaises(FileNotFoundError):
+                reader._load_index()
+            
+            self.pipeline.add_texts((item["text"], item["source"], item["timestamp"]) for item in self.test_data[:3])
+            query = "Vector memory FAISS semantic search"
+            results = reader.search(query, mode="vector", half_life_days=0)
+            self.assertEqual([r["source"] for r in results],
+                             [r["source"] for r in self.pipeline.search(query, mode="vector", half_life_days=0)])
+            
+            with self.assertRaises(RuntimeError):
+                reader.add_text(self.test_data[3]["text"], self.test_data[3]["source"])
+            
+            self.pipeline.add_text(self.test_data[3]["text"], self.test_data[3]["source"])
+            self.assertTrue(reader.reload_if_changed())
+            self.assertEqual(reader._load_index().ntotal, 4)
+            
+            # An index that exists but cannot be mapped is not reported as missing
+            with open(reader._committed_index_path(), "wb") as f:
+                f.write(b"not a FAISS index")
+            self.assertTrue(reader.reload_if_changed())
+            with self.assertRaises(RuntimeError):
+                reader._load_index()
+        finally:
+            reader.store.close()
+    
+    def test_incremental_reindex(self):
+        """Test reindexing a changed file only embeds the changed chunks"""
+        file_path = os.path.join(TEST_DIR, "2026-02-10.md")
+        with open(file_path, 'w') as f:
+            f.write("Decision: keep the vector index in memory/vectors. " * 30)
+        
+        encoded = []
+        original_encode = self.pipeline._encode
+        def counting_encode(texts):
+            encoded.extend(texts)
+            return original_encode(texts)
+        self.pipeline._encode = counting_encode
+        
+        try:
+            first = self.pipeline.index_file(file_path, "memory/2026-02-10.md")
+            self.assertEqual(first, self.pipeline.store.count())
+            
+            # Unchanged file is skipped without embedding anything
+            encoded.clear()
+            self.assertEqual(self.pipeline.index_file(file_path, "memory/2026-02-10.md"), 0)
+            self.assertEqual(encoded, [])
+            
+            # Appending only re-embeds the tail and replaces the old last chunk
+            with open(file_path, 'a') as f:
+                f.write("Action item: benchmark HNSW against the flat index.")
+            second = self.pipeline.index_file(file_path, "memory/2026-02-10.md")
+            self.assertLess(second, first)
+            self.assertEqual(len(encoded), second)
+            
+            with open(file_path, 'r') as f:
+                expected = self.pipeline._create_chunks(f.read(), "memory/2026-02-10.md")
+            self.assertEqual(self.pipeline.store.count(), len(expected))
+            self.assertEqual(self.pipeline.index.ntotal, len(expected))
+        finally:
+            os.remove(file_path)
+    
+    def test_cosine_scores(self):
+        """Test similarities are cosine scores and the exact text scores ~1.0"""
+        self.pipeline.add_text(
+            text=self.test_data[1]["text"],
+            source=self.test_data[1]["source"],
+            timestamp=self.test_data[1]["timestamp"]
+        )
+        
+        results = self.pipeline.search(self.test_data[1]["text"], k=1, threshold=0.0)
+        self.assertAlmostEqual(results[0]["similarity"], 1.0, places=3)
+    
+    def test_index_types(self):
+        """Test every index type returns the same nearest neighbor"""
+        vectors = np.random.rand(200, 384).astype('float32')
+        query = vectors[17:18].copy()
+        vector_memory.faiss.normalize_L2(query)
+        
+        for index_type in ("flat", "hnsw"):
+            index = vector_memory.build_index(index_type, vectors)
+            scores, ids = index.search(query, 1)
+            self.assertEqual(ids[0][0], 17)
+            self.assertAlmostEqual(float(scores[0][0]), 1.0, places=4)
+    
+    def test_quantized_storage(self):
+        """Test int8 storage keeps float16 re-rank copies and switches back to float"""
+        self.pipeline.vector_storage = "sq8"
+        self.pipeline.add_texts([(item["text"], item["source"], item["timestamp"]) for item in self.test_data])
+        self.assertEqual(vector_memory.storage_of(self.pipeline.index), "sq8")
+        self.assertEqual(self.pipeline.store.vector_count(), self.pipeline.index.ntotal)
+        
+        # Re-ranked scores are exact cosine similarities
+        results = self.pipeline.search(self.test_data[1]["text"], k=1, threshold=0.0)
+        self.assertAlmostEqual(results[0]["similarity"], 1.0, places=2)
+        self.assertEqual(self.pipeline.measure_recall(queries=3, k=1)["recall"], 1.0)
+        
+        # Switching storage rebuilds the index even without new chunks
+        self.pipeline.vector_storage = "float"
+        with self.pipeline.write_session():
+            pass
+        self.assertEqual(vector_memory.storage_of(self.pipeline.index), "float")
+        self.assertEqual(self.pipeline.store.vector_count(), 0)
+    
+    def test_recency_scoring(self):
+        """Test scores decay with age and follow the source type priority"""
+        now = datetime(2026, 3, 1)
+        ages = vector_memory.timestamp_ages(["2026-03-01T00:00:00", "2026-01-30T00:00:00", None], now=now)
+        self.assertAlmostEqual(ages[0], 0.0)
+        self.assertAlmostEqual(ages[1], 30.0)
+        self.assertTrue(np.isnan(ages[2]))
+        
+        # One half-life halves the recency part, missing timestamps get none of it
+        scores = vector_memory.retrieval_scores([0.8, 0.8, 0.8], ages, [1.0, 1.0, 1.0],
+                                                half_life_days=30.0, recency_weight=0.5)
+        np.testing.assert_allclose(scores, [0.8, 0.6, 0.4])
+        
+        weights = vector_memory.SOURCE_TYPE_WEIGHTS
+        kinds = [vector_memory.source_type(source) for source in
+                 ("MEMORY.md", "memory/2026-03-01.md", "memory/hourly-summaries/2026-03-01-1400.md", "session/a.json")]
+        self.assertEqual(kinds, ["memory_md", "daily", "hourly_summary", "session"])
+        self.assertEqual([weights[kind] for kind in kinds], sorted((weights[kind] for kind in kinds), reverse=True))
+        
+        # Search results carry the combined score
+        self.pipeline.add_text(self.test_data[0]["text"], "MEMORY.md", datetime.now().isoformat())
+        result = self.pipeline.search(self.test_data[0]["text"], k=1, threshold=0.0)[0]
+        self.assertEqual(result["source_type"], "memory_md")
+        self.assertAlmostEqual(result["score"], result["similarity"], places=3)
+    
+    def test_hybrid_search(self):
+        """Test keyword and hybrid search, and the identifier fast path"""
+        for item in self.test_data:
+            self.pipeline.add_text(item["text"], item["source"], item["timestamp"])
+        self.pipeline.add_text("The retry loop lives in gateway_client.py, see send_with_backoff",
+                               "memory/notes.md", datetime.now().isoformat())
+        if not self.pipeline.store.keyword_index:
+            self.skipTest("SQLite without FTS5")
+    
+        self.assertTrue(vector_memory.is_identifier_query("gateway_client.py send_with_backoff"))
+        self.assertFalse(vector_memory.is_identifier_query("how do we retry requests"))
+    
+        # Identifier queries never reach the embedding model
+        with patch.object(self.pipeline, "_encode", side_effect=AssertionError("embedded")):
+            results = self.pipeline.search("send_with_backoff", k=2, mode="hybrid")
+            keyword = self.pipeline.search("gateway_client.py", k=2, mode="keyword")
+        self.assertEqual(results[0]["source"], "memory/notes.md")
+        self.assertEqual(results[0]["match"], "keyword")
+        self.assertIsNone(results[0]["similarity"])
+        self.assertEqual(keyword[0]["source"], "memory/notes.md")
+    
+        # Hybrid search keeps exact keyword hits below the similarity threshold
+        results = self.pipeline.search("where is send_with_backoff used by the retry loop", k=3,
+                                       threshold=0.99, mode="hybrid")
+        self.assertEqual(results[0]["source"], "memory/notes.md")
+        self.assertIn(results[0]["match"], ("keyword", "both"))
+        self.assertIsNotNone(results[0]["similarity"])
+    
     def test_chunking(self):
-        """Test text chunking functionality"""
+        """Test fixed-window text chunking"""
+        self.pipeline.chunker = "fixed"
+        
         # Create a long text that should be split into chunks
         long_text = "This is a test " * 100  # 1400 characters
         
@@ -134,6 +418,57 @@ class TestVectorMemory(unittest.TestCase):
         self.assertLess(second_chunk_start, first_chunk_end)
         self.assertEqual(first_chunk_end - second_chunk_start, vector_memory.CHUNK_OVERLAP)
     
+    def test_markdown_chunking(self):
+        """Test markdown chunks follow sections and list items and record their header path"""
+        decisions = [f"- Decision {i}: keep the {i}th vector memory setting because it measured best in the benchmark"
+                     for i in range(8)]
+        text = ("# Daily Summary: 2026-02-10\n\n"
+                "## 14:00 - 14:59\n\n"
+                "## Topics\n\nvector, memory\n\n"
+                "## Decisions\n\n" + "\n".join(decisions) + "\n\n"
+                "## 15:00 - 15:59\n\n"
+                "## Action Items\n\n- Benchmark HNSW\n")
+        
+        chunks = self.pipeline._create_chunks(text, "memory/2026-02-10.md", "2026-02-10T15:00:00")
+        
+        # Every decision lands whole in exactly one chunk, and chunks do not overlap
+        for decision in decisions:
+            self.assertEqual(sum(decision in chunk["text"] for chunk in chunks), 1)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertLessEqual(previous["end"], chunk["start"])
+            self.assertEqual(chunk["text"], text[chunk["start"]:chunk["end"]])
+        
+        # The Decisions section is split, and its header stays with the first item
+        decision_chunks = [chunk for chunk in chunks if "Decision 0" in chunk["text"] or "Decision 7" in chunk["text"]]
+        self.assertEqual(len(decision_chunks), 2)
+        self.assertTrue(decision_chunks[0]["text"].startswith("## Decisions"))
+        self.assertEqual(decision_chunks[0]["header_path"], "Daily Summary: 2026-02-10 > 14:00 - 14:59 > Decisions")
+        
+        # Small sections share a chunk, under the headers they have in common
+        self.assertIn("## Action Items", decision_chunks[1]["text"])
+        self.assertEqual(decision_chunks[1]["header_path"], "Daily Summary: 2026-02-10")
+        
+        # The header path is stored and returned with search results
+        self.pipeline.add_text(text, "memory/2026-02-10.md", "2026-02-10T15:00:00")
+        stored = list(self.pipeline.store.iter_chunks())
+        self.assertEqual(sorted((chunk["start"], chunk["header_path"]) for chunk in stored),
+                         [(chunk["start"], chunk["header_path"]) for chunk in chunks])
+    
+    def test_markdown_chunk_budget(self):
+        """Test a header and the long paragraph it is split with stay within the chunk budget"""
+        from markdown_chunker import CHUNK_TOKENS
+        from token_budget import get_token_counter
+        paragraph = " ".join(f"Sentence {i} explains why the vector memory keeps its current settings." for i in range(40))
+        text = "## A header long enough to need its own share of the chunk token budget\n\n" + paragraph + "\n"
+        
+        chunks = self.pipeline._create_chunks(text, "memory/2026-02-10.md", "2026-02-10T15:00:00")
+        
+        self.assertTrue(chunks[0]["text"].startswith("## A header"))
+        self.assertIn("Sentence 0", chunks[0]["text"])
+        counter = get_token_counter()
+        for chunk in chunks:
+            self.assertLessEqual(counter.count(chunk["text"]), CHUNK_TOKENS)
+    
     def test_stats(self):
         """Test statistics reporting"""
         # Add test data
@@ -169,15 +504,300 @@ class TestVectorMemory(unittest.TestCase):
             )
         
         # Verify data is added
-        self.assertGreater(len(self.pipeline.metadata["chunks"]), 0)
+        self.assertGreater(self.pipeline.store.count(), 0)
         
         # Clear index
         self.pipeline.clear_index(confirm=True)
         
         # Verify data is cleared
-        self.assertEqual(len(self.pipeline.metadata["chunks"]), 0)
+        self.assertEqual(self.pipeline.store.count(), 0)
         self.assertEqual(self.pipeline.index.ntotal, 0)
 
+class TestShardedVectorMemory(unittest.TestCase):
+    """Test cases for month-sharded vector memory"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pipeline = self.open_pipeline()
+        self.pipeline.add_texts([
+            ("Deployment notes for the January release of the gateway", "memory/2026-01-10.md",
+             "2026-01-10T09:00:00"),
+            ("Deployment notes for the February release of the gateway", "memory/2026-02-10.md",
+             "2026-02-10T09:00:00"),
+            ("Deployment notes for the March release of the gateway", "memory/2026-03-10.md",
+             "2026-03-10T09:00:00")
+        ])
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def open_pipeline(self):
+        return vector_memory.ShardedVectorMemoryPipeline(
+            shard_by="month",
+            shard_dir=os.path.join(self.temp_dir, "shards"),
+            archive_dir=os.path.join(self.temp_dir, "archive")
+        )
+    
+    def test_search_merges_shards(self):
+        """Test one month per shard and results merged across shards"""
+        self.assertEqual(self.pipeline.shard_keys(), ["2026-01", "2026-02", "2026-03"])
+        
+        results = self.pipeline.search("deployment notes February release", k=3, threshold=0.0,
+                                       mode="vector", recency_weight=0.0)
+        self.assertEqual(results[0]["shard"], "2026-02")
+        self.assertEqual(sorted(result["shard"] for result in results), ["2026-01", "2026-02", "2026-03"])
+        scores = [result["score"] for result in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+    
+    def test_time_window_skips_shards(self):
+        """Test a time window only opens the shards overlapping it"""
+        pipeline = self.open_pipeline()
+        results = pipeline.search("deployment notes release", k=3, threshold=0.0, since="2026-03-01")
+        
+        self.assertEqual([result["source"] for result in results], ["memory/2026-03-10.md"])
+        self.assertEqual(set(pipeline._shards), {"2026-03"})
+    
+    def test_moved_source_leaves_old_shard(self):
+        """Test reindexing a source into another month removes its chunks from the old shard"""
+        path = os.path.join(self.temp_dir, "notes.md")
+        with open(path, 'w') as f:
+            f.write("Notes first written in January")
+        self.pipeline.index_file(path, "memory/notes.md", "2026-01-20T09:00:00")
+        
+        with open(path, 'w') as f:
+            f.write("Notes rewritten in March")
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        self.pipeline.index_file(path, "memory/notes.md", "2026-03-20T09:00:00")
+        
+        sources = {key: self.pipeline._shard(key).store.source_counts() for key in self.pipeline.shard_keys()}
+        self.assertNotIn("memory/notes.md", sources["2026-01"])
+        self.assertEqual(sources["2026-03"]["memory/notes.md"], 1)
+    
+    def test_crash_before_manifest_commit(self):
+        """Test messages committed to a shard but not to the manifest offsets are not indexed twice"""
+        log_dir = os.path.join(self.temp_dir, "sessions")
+        os.makedirs(log_dir)
+        log_path = os.path.join(log_dir, "session-1.jsonl")
+        
+        def append(*texts):
+            with open(log_path, 'a') as f:
+                for text in texts:
+                    f.write(json.dumps({"role": "user", "content": text,
+                                        "timestamp": datetime.now().isoformat()}) + "\n")
+        
+        with patch.object(vector_memory, "SESSION_LOGS_DIR", log_dir):
+            append("Gateway retries use exponential backoff", "The injector reads session logs")
+            self.pipeline.index_session_logs()
+            
+            append("Shards are committed before the manifest", "The manifest keeps the log offsets")
+            with patch.object(self.pipeline, "_save_metadata", side_effect=OSError("simulated crash")):
+                with self.assertRaises(OSError):
+                    self.pipeline.index_session_logs()
+            
+            pipeline = self.open_pipeline()
+            pipeline.index_session_logs()
+        
+        key = datetime.now().strftime("%Y-%m")
+        counts = pipeline._shard(key).store.source_counts()
+        self.assertEqual(counts["session/session-1.jsonl"], 4)
+    
+    def test_archive_compact_and_restore(self):
+        """Test archived shards drop out of searches and stats until restored"""
+        generation = self.pipeline.index_generation()
+        self.assertEqual(self.pipeline.archive_shards_before("2026-02"), ["2026-01"])
+        self.assertGreater(self.pipeline.index_generation(), generation)
+        
+        results = self.pipeline.search("deployment notes January release", k=3, threshold=0.0)
+        self.assertNotIn("2026-01", [result["shard"] for result in results])
+        stats = self.pipeline.get_stats()
+        self.assertEqual(stats["total_vectors"], 2)
+        self.assertEqual(stats["archived_shards"], ["2026-01"])
+        
+        # Archived months are not written to by indexing
+        self.pipeline.add_text("A late January note", "memory/late.md", "2026-01-31T09:00:00")
+        self.assertEqual(self.pipeline.shard_keys(), ["2026-02", "2026-03"])
+        
+        self.assertTrue(self.pipeline.compact_shard("2026-02"))
+        self.assertTrue(self.pipeline.restore_shard("2026-01"))
+        self.assertEqual(self.pipeline.get_stats()["total_vectors"], 3)
+
+class TestEmbeddingCache(unittest.TestCase):
+    """Test cases for the shared embedding cache"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = EmbeddingCache(os.path.join(self.temp_dir, "embedding-cache"), capacity=3, dim=4)
+        self.encoded = []
+    
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def fake_encode(self, texts):
+        """Deterministic 4-dimensional embeddings that record what was embedded"""
+        self.encoded.extend(texts)
+        return np.array([[len(text), 1.0, 0.5, 0.25] for text in texts], dtype='float32')
+    
+    def test_repeated_texts_are_embedded_once(self):
+        """Test cached and duplicate texts never reach the model"""
+        first = self.cache.encode(["alpha", "beta", "alpha"], self.fake_encode, "test")
+        second = self.cache.encode(["beta", "alpha"], self.fake_encode, "test")
+        
+        self.assertEqual(self.encoded, ["alpha", "beta"])
+        np.testing.assert_array_equal(first[0], second[1])
+        np.testing.assert_array_equal(first[1], second[0])
+        
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 3)
+        self.assertEqual(stats["misses"], 2)
+    
+    def test_namespaces_are_separate(self):
+        """Test the same text is embedded once per namespace"""
+        self.cache.encode(["alpha"], self.fake_encode, "model-a")
+        self.cache.encode(["alpha"], self.fake_encode, "model-b")
+        self.assertEqual(self.encoded, ["alpha", "alpha"])
+    
+    def test_lru_eviction(self):
+        """Test the least recently used vector is evicted when full"""
+        self.cache.encode(["a", "bb", "ccc"], self.fake_encode, "test")
+        time.sleep(0.01)
+        self.cache.encode(["a", "ccc"], self.fake_encode, "test")  # "bb" is now least recently used
+        time.sleep(0.01)
+        self.cache.encode(["dddd"], self.fake_encode, "test")
+        
+        self.assertIsNone(self.cache.get("bb", "test"))
+        self.assertIsNotNone(self.cache.get("a", "test"))
+        self.assertEqual(self.cache.get("dddd", "test")[0], 4.0)
+        self.assertEqual(self.cache.stats()["entries"], 3)
+    
+    def test_concurrent_encode(self):
+        """Test a text another process cached during the embedding gets no second slot"""
+        other = EmbeddingCache(os.path.join(self.temp_dir, "embedding-cache"))
+        try:
+            def encode_racing(texts):
+                other.encode(texts, self.fake_encode, "test")
+                return self.fake_encode(texts)
+            
+            self.cache.encode(["alpha"], encode_racing, "test")
+            self.assertEqual(self.cache.stats()["entries"], 1)
+            self.cache.encode(["beta", "gamma"], self.fake_encode, "test")
+            np.testing.assert_array_equal(self.cache.get("alpha", "test"), other.get("alpha", "test"))
+            self.assertEqual(self.cache.stats()["entries"], 3)
+        finally:
+            other.close()
+    
+    def test_hit_evicted_during_encode(self):
+        """Test a cached text another process evicts during the embedding is embedded again"""
+        self.cache.encode(["alpha"], self.fake_encode, "test")
+        time.sleep(0.01)
+        other = EmbeddingCache(os.path.join(self.temp_dir, "embedding-cache"))
+        try:
+            def encode_evicting(texts):
+                if "alpha" not in texts:
+                    other.encode(["ccc", "dddd", "eeeee"], self.fake_encode, "test")  # Evicts "alpha"
+                    time.sleep(0.01)
+                return self.fake_encode(texts)
+            
+            vectors = self.cache.encode(["alpha", "b"], encode_evicting, "test")
+            self.assertEqual(vectors[0][0], 5.0)
+            self.assertEqual(self.encoded.count("alpha"), 2)
+            self.assertEqual(self.cache.get("alpha", "test")[0], 5.0)
+        finally:
+            other.close()
+    
+    def test_rollback_keeps_vectors(self):
+        """Test a failed encode leaves the vectors of the entries it would evict intact"""
+        self.cache.encode(["a", "bb", "ccc"], self.fake_encode, "test")
+        set_meta = self.cache._set_meta
+        def failing_set_meta(key, value):
+            if key == "hits":
+                raise RuntimeError("disk full")
+            set_meta(key, value)
+        
+        with patch.object(self.cache, "_set_meta", side_effect=failing_set_meta):
+            with self.assertRaises(RuntimeError):
+                self.cache.encode(["dddd"], self.fake_encode, "test")
+        
+        for text in ("a", "bb", "ccc"):
+            self.assertEqual(self.cache.get(text, "test")[0], len(text))
+    
+    def test_persists_across_instances(self):
+        """Test vectors are read back from disk by a new process"""
+        self.cache.encode(["alpha"], self.fake_encode, "test")
+        self.cache.close()
+        
+        reopened = EmbeddingCache(os.path.join(self.temp_dir, "embedding-cache"))
+        try:
+            reopened.encode(["alpha"], self.fake_encode, "test")
+            self.assertEqual(self.encoded, ["alpha"])
+            self.assertEqual(reopened.capacity, 3)
+            self.assertEqual(reopened.stats()["total_hits"], 1)
+        finally:
+            reopened.close()
+
+class TestSessionLogReader(unittest.TestCase):
+    """Test cases for the incremental session log reader"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.temp_dir, "session.json")
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+    
+    def write_log(self, contents):
+        with open(self.log_path, 'w') as f:
+            json.dump({"session_id": "test", "messages": [{"content": c} for c in contents]}, f)
+    
+    def read(self, reader):
+        return [msg["content"] for _, msg in reader.iter_new_messages(self.temp_dir)]
+    
+    def test_only_new_messages_are_read(self):
+        reader = SessionLogReader()
+        self.write_log(["one", "two"])
+        self.assertEqual(self.read(reader), ["one", "two"])
+        self.assertEqual(reader.check(self.log_path), UNCHANGED)
+        
+        # A JSON log rewritten with more messages keeps its prefix
+        self.write_log(["one", "two", "three"])
+        resumed = SessionLogReader(json.loads(json.dumps(reader.state)))
+        self.assertEqual(resumed.check(self.log_path), APPENDED)
+        self.assertEqual(self.read(resumed), ["three"])
+        self.assertEqual(resumed.message_count(self.log_path), 3)
+    
+    def test_rewritten_log_is_read_again(self):
+        reader = SessionLogReader()
+        self.write_log(["one", "two"])
+        self.read(reader)
+        
+        self.write_log(["uno", "two", "three"])
+        self.assertEqual(reader.check(self.log_path), REWRITTEN)
+        self.assertEqual(self.read(reader), ["uno", "two", "three"])
+    
+    def test_incomplete_jsonl_line_waits(self):
+        reader = SessionLogReader()
+        jsonl_path = os.path.join(self.temp_dir, "session.jsonl")
+        with open(jsonl_path, 'w') as f:
+            f.write('{"content": "one"}\n{"content": "tw')
+        self.assertEqual(self.read(reader), ["one"])
+        
+        with open(jsonl_path, 'a') as f:
+            f.write('o"}\n')
+        self.assertEqual(self.read(reader), ["two"])
+    
+    def test_malformed_jsonl_line_is_skipped(self):
+        reader = SessionLogReader()
+        jsonl_path = os.path.join(self.temp_dir, "session.jsonl")
+        with open(jsonl_path, 'w') as f:
+            f.write('{"content": "one"}\n{"content": oops}\n')
+        self.assertEqual(self.read(reader), ["one"])
+        self.assertEqual(reader.state[jsonl_path]["offset"], os.path.getsize(jsonl_path))
+        
+        with open(jsonl_path, 'a') as f:
+            f.write('{"content": "two"}\n')
+        self.assertEqual(self.read(reader), ["two"])
+        self.assertEqual(reader.message_count(jsonl_path), 2)
+
 def run_basic_test():
     """Run a basic functionality test"""
     print("=== Vector Memory Pipeline Basic Test ===\n")
@@ -185,7 +805,7 @@ def run_basic_test():
     # Create a test pipeline
     test_dir = tempfile.mkdtemp()
     test_index_path = os.path.join(test_dir, "test_memory.index")
-    test_metadata_path = os.path.join(test_dir, "test_metadata.json")
+    test_metadata_path = os.path.join(test_dir, "test_metadata.db")
     
     pipeline = vector_memory.VectorMemoryPipeline(
         model_name="all-MiniLM-L6-v2",
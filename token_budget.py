@@ -0,0 +1,196 @@
+"""
+Token Budget - Context Retention System Component 4
+
+Token counting and budget packing for text injected into the context window,
+shared by the Semantic Recall Hook and the TokenAwareFormatter.
+
+Counts come from a real BPE tokenizer (tiktoken, loaded once per process)
+when it is installed, and from a characters-per-token ratio otherwise.
+Counts of recently seen texts are cached, so the chunks recalled again and
+again by similar prompts are only tokenized once.
+
+pack_results fills a token budget with formatted search results: whole
+results are taken greedily by relevance per token, and the remaining budget
+is filled with the most relevant result that did not fit, cut at a sentence
+boundary. The output is assembled in one pass and checked against the budget
+with a final count, so the injected text lands within a few tokens of the
+budget without going over it.
+"""
+
+import re
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger('token-budget')
+
+# Constants
+TOKENIZER_ENCODING = "cl100k_base"  # tiktoken encoding, None counts by characters
+CHARS_PER_TOKEN = 4.0  # Fallback when tiktoken is not installed
+COUNT_CACHE_SIZE = 4096  # Texts whose token counts are cached
+MIN_FILL_TOKENS = 24  # Smallest truncated result worth injecting
+SENTENCE_SLACK_TOKENS = 16  # Tokens given up to end a truncated result on a sentence boundary
+TRUNCATION_MARKER = "..."
+
+# End of a sentence (with closing quotes or brackets) or of a paragraph
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s)|\n\s*\n")
+WORD_END = re.compile(r"\S(?=\s)")
+
+class TokenCounter:
+    """Counts tokens with a cached tokenizer, or by characters when none is available"""
+
+    def __init__(self, encoding=TOKENIZER_ENCODING, chars_per_token=CHARS_PER_TOKEN):
+        """
+        Args:
+            encoding: tiktoken encoding name, None to always count by characters
+            chars_per_token: Characters per token of the fallback count
+        """
+        self.chars_per_token = chars_per_token
+        self.encoding = None
+        if encoding:
+            try:
+                import tiktoken
+                self.encoding = tiktoken.get_encoding(encoding)
+            except ImportError:
+                logger.debug("tiktoken not installed, estimating tokens by characters")
+            except Exception as e:
+                logger.warning(f"Could not load tokenizer {encoding}, estimating tokens by characters: {e}")
+        self.count = lru_cache(maxsize=COUNT_CACHE_SIZE)(self._count)
+
+    @property
+    def exact(self):
+        """True if counts come from a tokenizer"""
+        return self.encoding is not None
+
+    def _count(self, text):
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return int(len(text) / self.chars_per_token)
+
+    def _longest_prefix(self, text, cuts, max_tokens, marker=""):
+        """Longest text[:cut] + marker of at most max_tokens, cuts in increasing order"""
+        low, high, best = 0, len(cuts) - 1, None
+        while low <= high:
+            middle = (low + high) // 2
+            candidate = text[:cuts[middle]].rstrip() + marker
+            if self.count(candidate) <= max_tokens:
+                best, low = candidate, middle + 1
+            else:
+                high = middle - 1
+        return best
+
+    def truncate(self, text, max_tokens):
+        """
+        Cut text to at most max_tokens, preferring a sentence boundary
+
+        The cut ends on a sentence unless that leaves more than
+        SENTENCE_SLACK_TOKENS of the budget unused, in which case it ends on
+        a word followed by TRUNCATION_MARKER.
+
+        Returns:
+            The truncated text, or "" if not even one word fits
+        """
+        text = text.strip()
+        if self.count(text) <= max_tokens:
+            return text
+
+        sentence = self._longest_prefix(text, [m.end() for m in SENTENCE_END.finditer(text)], max_tokens)
+        if sentence and self.count(sentence) >= max_tokens - SENTENCE_SLACK_TOKENS:
+            return sentence
+
+        word = self._longest_prefix(text, [m.end() for m in WORD_END.finditer(text)], max_tokens,
+                                    TRUNCATION_MARKER)
+        return word or sentence or ""
+
+_counters = {}
+
+def get_token_counter(encoding=TOKENIZER_ENCODING, chars_per_token=CHARS_PER_TOKEN):
+    """Process-wide counter for an encoding, so the tokenizer is loaded once"""
+    key = (encoding, chars_per_token)
+    if key not in _counters:
+        _counters[key] = TokenCounter(encoding, chars_per_token)
+    return _counters[key]
+
+def result_relevance(result):
+    """Relevance of a search result: its ranking score, or its similarity"""
+    score = result.get("score")
+    if score is None:
+        score = result.get("similarity")
+    return score or 0.0
+
+def pack_results(results, render, max_tokens, prefix="", suffix="", counter=None,
+                 relevance=result_relevance, min_fill_tokens=MIN_FILL_TOKENS):
+    """
+    Format as much of the results as fits in a token budget
+
+    Args:
+        results: Search results with a "text", most relevant first
+        render: Function (position, result, text, truncated) returning the
+            block of a result showing text at a 0-based position
+        max_tokens: Token budget of the whole output, prefix and suffix included
+        prefix: Text before the first block
+        suffix: Text after the last block
+        counter: TokenCounter, defaults to the shared counter
+        relevance: Function giving the relevance of a result
+        min_fill_tokens: Smallest text budget for a truncated result
+
+    Returns:
+        Tuple of (text, packed results, token count); text is "" if nothing fits.
+        Packed results keep their relative order.
+    """
+    counter = counter or get_token_counter()
+    budget = max_tokens - counter.count(prefix) - counter.count(suffix)
+    if not results or budget <= 0:
+        return "", [], 0
+
+    texts = [(result.get("text") or "").strip() for result in results]
+    sizes = [counter.count(render(i, result, texts[i], False)) for i, result in enumerate(results)]
+
+    # Whole results, densest first
+    chosen = {}  # Index -> (text, truncated)
+    used = 0
+    for i in sorted(range(len(results)), key=lambda i: relevance(results[i]) / max(sizes[i], 1), reverse=True):
+        if used + sizes[i] <= budget:
+            chosen[i] = (texts[i], False)
+            used += sizes[i]
+
+    def fill(room):
+        """Truncate the most relevant result that did not fit into room tokens"""
+        remaining = [i for i in range(len(results)) if i not in chosen]
+        if not remaining:
+            return
+        i = max(remaining, key=lambda i: relevance(results[i]))
+        text_room = room - counter.count(render(i, results[i], "", True))
+        if text_room >= min_fill_tokens:
+            text = counter.truncate(texts[i], text_room)
+            if text:
+                chosen[i] = (text, True)
+
+    fill(budget - used)
+
+    def assemble():
+        order = sorted(chosen)
+        parts = [prefix]
+        parts.extend(render(position, results[i], *chosen[i]) for position, i in enumerate(order))
+        parts.append(suffix)
+        text = "".join(parts)
+        return text, [results[i] for i in order], counter.count(text)
+
+    text, packed, tokens = assemble()
+
+    # Token merges across block boundaries and renumbering can shift the count slightly
+    while tokens > max_tokens and chosen:
+        truncated = [i for i in chosen if chosen[i][1]]
+        if truncated:
+            i = truncated[0]
+            room = counter.count(render(0, results[i], *chosen[i])) - (tokens - max_tokens)
+            del chosen[i]
+            fill(room)
+        else:
+            del chosen[min(chosen, key=lambda i: relevance(results[i]) / max(sizes[i], 1))]
+        text, packed, tokens = assemble()
+
+    if not chosen:
+        return "", [], 0
+    return text, packed, tokens
@@ -45,17 +45,13 @@ def generate_heartbeat_message():
     return message
 
 def send_message(message):
-    """Send message using OpenClaw's native messaging system"""
+    """Send message through the local OpenClaw gateway"""
     try:
-        import subprocess
-        result = subprocess.run([
-            'openclaw', 'message', 'send', 
-            '--target', '535786496', 
-            '--message', message
-        ], capture_output=True, text=True)
+        from gateway_client import get_client, TELEGRAM_TARGET
+        result = get_client().send_message(message, channel=None, target=TELEGRAM_TARGET)
         
-        logging.info(f"Message send result: {result.stdout}")
-        return result.returncode == 0
+        logging.info(f"Message send result: {result}")
+        return True
     except Exception as e:
         logging.error(f"Message send error: {e}")
         return False
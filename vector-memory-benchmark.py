@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark for Vector Memory index structures
+
+Compares the flat, HNSW and IVF-PQ cosine indexes, with float, int8 scalar
+quantized and product quantized vector storage, on the vectors of the memory
+index (or on freshly embedded memory files) and reports recall@k against
+exact flat search, query latency and index size. Recall is measured without
+the float re-ranking that search applies to quantized indexes.
+
+Usage:
+    python vector-memory-benchmark.py
+    python vector-memory-benchmark.py --from-files --memory-days 90 --queries 500 --k 10
+"""
+
+import os
+import sys
+import time
+import glob
+import argparse
+
+import numpy as np
+
+WORKSPACE_DIR = "/Users/karst/.openclaw/workspace"
+sys.path.append(WORKSPACE_DIR)
+
+import vector_memory_impl as vm
+
+def load_index_vectors(pipeline):
+    """Read the vectors of the existing memory index"""
+    index = pipeline._load_index(create_if_missing=False)
+    vectors, _ = vm.index_contents(index)
+    return vectors
+
+def embed_memory_files(pipeline, days_back):
+    """Chunk and embed daily memory files and hourly summaries"""
+    patterns = [
+        os.path.join(vm.MEMORY_DIR, "*.md"),
+        os.path.join(vm.HOURLY_SUMMARIES_DIR, "*.md"),
+    ]
+    cutoff = time.time() - days_back * 86400
+
+    texts = []
+    for pattern in patterns:
+        for file_path in glob.glob(pattern):
+            if os.path.getmtime(file_path) < cutoff:
+                continue
+            with open(file_path, 'r') as f:
+                content = f.read()
+            if content.strip():
+                texts.extend(chunk["text"] for chunk in pipeline._create_chunks(content, file_path))
+
+    print(f"Embedding {len(texts)} chunks from {vm.MEMORY_DIR}...")
+    return pipeline._encode(texts)
+
+def percentile_ms(samples, pct):
+    return float(np.percentile(samples, pct)) * 1000
+
+def benchmark_index(name, storage, vectors, queries, k, exact_ids):
+    """Build one index type and measure recall, latency and size"""
+    start_time = time.time()
+    index = vm.build_index(name, vectors, storage=storage)
+    build_time = time.time() - start_time
+
+    latencies = []
+    found_ids = []
+    for query in queries:
+        query_start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - query_start)
+        found_ids.append(ids[0])
+
+    hits = 0
+    for exact, found in zip(exact_ids, found_ids):
+        hits += len(set(exact[exact != -1]) & set(found[found != -1]))
+    recall = hits / max(1, sum(int((exact != -1).sum()) for exact in exact_ids))
+
+    size_bytes = len(vm.faiss.serialize_index(index))
+
+    return {
+        "type": f"{name}/{storage}",
+        "build_s": build_time,
+        "recall": recall,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "bytes_per_vector": size_bytes / max(1, len(vectors)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector Memory index benchmark")
+    parser.add_argument("--from-files", action="store_true", help="Embed memory files instead of reading the index")
+    parser.add_argument("--memory-days", type=int, default=365, help="Days of memory files to embed")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled query vectors")
+    parser.add_argument("--k", type=int, default=10, help="Neighbors per query")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for query sampling")
+    args = parser.parse_args()
+
+    pipeline = vm.VectorMemoryPipeline()
+    if args.from_files:
+        vectors = embed_memory_files(pipeline, args.memory_days)
+    else:
+        vectors = load_index_vectors(pipeline)
+
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    vm.faiss.normalize_L2(vectors)
+    if len(vectors) == 0:
+        print("No vectors to benchmark")
+        return
+
+    rng = np.random.default_rng(args.seed)
+    query_ids = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[query_ids]
+
+    # Exact results from a flat inner-product scan are the ground truth
+    exact_index = vm.build_index("flat", vectors)
+    _, exact_ids = exact_index.search(queries, args.k)
+
+    print(f"\nCorpus: {len(vectors)} vectors, {len(queries)} queries, k={args.k}\n")
+    print(f"{'index':<12} {'build s':>8} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8} {'bytes/vec':>10}")
+
+    configurations = [
+        ("flat", "float"), ("flat", "sq8"), ("flat", "pq"),
+        ("hnsw", "float"), ("hnsw", "sq8"), ("hnsw", "pq"),
+        ("ivfpq", "pq"), ("ivfpq", "sq8"),
+    ]
+    for name, storage in configurations:
+        label = f"{name}/{storage}"
+        if name == "ivfpq" and len(vectors) < vm.IVFPQ_MIN_TRAIN:
+            print(f"{label:<12} skipped: needs at least {vm.IVFPQ_MIN_TRAIN} vectors to train")
+            continue
+        if storage == "pq" and len(vectors) < vm.PQ_MIN_TRAIN:
+            print(f"{label:<12} skipped: needs at least {vm.PQ_MIN_TRAIN} vectors to train")
+            continue
+        result = benchmark_index(name, storage, vectors, queries, args.k, exact_ids)
+        print(f"{result['type']:<12} {result['build_s']:>8.2f} {result['recall']:>8.3f} "
+              f"{result['p50_ms']:>8.3f} {result['p95_ms']:>8.3f} {result['bytes_per_vector']:>10.0f}")
+
+if __name__ == "__main__":
+    main()
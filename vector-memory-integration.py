@@ -9,6 +9,10 @@ Usage:
     - memory_search: Search the vector memory for relevant content
     - memory_index: Update the vector memory index with new content
     - memory_stats: View statistics about the vector memory index
+
+memory_search and memory_stats open the index read-only and memory-mapped, so
+concurrent searches from OpenClaw, the recall hook and heartbeat tools share
+one copy of the index in the page cache.
 """
 
 import os
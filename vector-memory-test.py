@@ -21,6 +21,7 @@ sys.path.append(WORKSPACE_DIR)
 # Import the module we're testing
 import vector_memory
 from vector_memory import VectorMemoryPipeline
+from embedding_cache import EmbeddingCache
 
 class TestVectorMemoryPipeline(unittest.TestCase):
     """Test class for Vector Memory Pipeline"""
@@ -44,7 +45,8 @@ class TestVectorMemoryPipeline(unittest.TestCase):
         
         # Set up test paths
         self.index_path = os.path.join(self.vector_dir, "test.index")
-        self.metadata_path = os.path.join(self.vector_dir, "test-metadata.json")
+        self.metadata_path = os.path.join(self.vector_dir, "test-metadata.db")
+        self.embedding_cache = EmbeddingCache(os.path.join(self.vector_dir, "embedding-cache"))
         
         # Set up a mock model for testing
         self.mock_model = MagicMock()
@@ -56,8 +58,16 @@ class TestVectorMemoryPipeline(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test environment"""
+        self.embedding_cache.close()
         self.temp_dir.cleanup()
     
+    def configure_faiss_mock(self, mock_faiss, mock_index):
+        """Make a mocked faiss module return mock_index for new indexes"""
+        # isinstance checks need real classes
+        for name in ("IndexIDMap", "IndexHNSW", "IndexIVF"):
+            setattr(mock_faiss, name, type(name, (), {}))
+        mock_faiss.IndexIDMap2.return_value = mock_index
+    
     def create_test_files(self):
         """Create test memory files and session logs"""
         # Create a daily memory file
@@ -106,20 +116,21 @@ class TestVectorMemoryPipeline(unittest.TestCase):
         # Set up mocks
         mock_st.return_value = self.mock_model
         mock_index = MagicMock()
-        mock_faiss.IndexFlatL2.return_value = mock_index
+        self.configure_faiss_mock(mock_faiss, mock_index)
         mock_faiss.read_index.side_effect = FileNotFoundError
         
         # Initialize pipeline
         pipeline = VectorMemoryPipeline(
             model_name="test-model",
             index_path=self.index_path,
-            metadata_path=self.metadata_path
+            metadata_path=self.metadata_path,
+            embedding_cache=self.embedding_cache
         )
         
         # Verify metadata was created
-        self.assertIsInstance(pipeline.metadata, dict)
-        self.assertEqual(pipeline.metadata["model_name"], "test-model")
-        self.assertEqual(pipeline.metadata["embedding_dim"], 384)
+        self.assertEqual(pipeline.store.count(), 0)
+        self.assertEqual(pipeline.store.get_meta("model_name"), "test-model")
+        self.assertEqual(pipeline.store.get_meta("embedding_dim"), 384)
         
         # Load model and verify it's created correctly
         model = pipeline._load_model()
@@ -128,7 +139,8 @@ class TestVectorMemoryPipeline(unittest.TestCase):
         
         # Load index and verify it's created
         index = pipeline._load_index()
-        mock_faiss.IndexFlatL2.assert_called_once_with(384)
+        mock_faiss.IndexFlatIP.assert_called_once_with(384)
+        mock_faiss.IndexIDMap2.assert_called_once_with(mock_faiss.IndexFlatIP.return_value)
         self.assertEqual(index, mock_index)
     
     @patch('vector_memory.SentenceTransformer')
@@ -139,14 +151,15 @@ class TestVectorMemoryPipeline(unittest.TestCase):
         mock_st.return_value = self.mock_model
         mock_index = MagicMock()
         mock_index.ntotal = 0
-        mock_faiss.IndexFlatL2.return_value = mock_index
+        self.configure_faiss_mock(mock_faiss, mock_index)
         mock_faiss.read_index.side_effect = FileNotFoundError
         
         # Initialize pipeline
         pipeline = VectorMemoryPipeline(
             model_name="test-model",
             index_path=self.index_path,
-            metadata_path=self.metadata_path
+            metadata_path=self.metadata_path,
+            embedding_cache=self.embedding_cache
         )
         
         # Add text
@@ -159,13 +172,13 @@ class TestVectorMemoryPipeline(unittest.TestCase):
         # Verify text was chunked and added
         self.assertEqual(result, 1)  # One chunk added
         self.mock_model.encode.assert_called_once()
-        mock_index.add.assert_called_once()
-        mock_faiss.write_index.assert_called_once_with(mock_index, self.index_path)
+        mock_index.add_with_ids.assert_called_once()
+        mock_faiss.write_index.assert_called_once_with(mock_index, self.index_path + ".1.tmp")
         
         # Verify metadata was updated
-        self.assertEqual(len(pipeline.metadata["chunks"]), 1)
-        self.assertEqual(pipeline.metadata["chunks"][0]["source"], "test-source")
-        self.assertEqual(pipeline.metadata["chunks"][0]["text"], "This is a test document for vector search")
+        self.assertEqual(pipeline.store.count(), 1)
+        self.assertEqual(pipeline.store.get(0)["source"], "test-source")
+        self.assertEqual(pipeline.store.get(0)["text"], "This is a test document for vector search")
     
     @patch('vector_memory.SentenceTransformer')
     @patch('vector_memory.faiss')
@@ -178,25 +191,26 @@ class TestVectorMemoryPipeline(unittest.TestCase):
         
         # Mock search results
         mock_index.search.return_value = (
-            np.array([[0.1, 0.3, 0.8]]),  # Distances
-            np.array([[0, 1, 2]])          # Indices
+            np.array([[0.95, 0.85, 0.3]]),  # Cosine similarities
+            np.array([[0, 1, 2]])            # Indices
         )
         
-        mock_faiss.IndexFlatL2.return_value = mock_index
+        self.configure_faiss_mock(mock_faiss, mock_index)
         
         # Initialize pipeline
         pipeline = VectorMemoryPipeline(
             model_name="test-model",
             index_path=self.index_path,
-            metadata_path=self.metadata_path
+            metadata_path=self.metadata_path,
+            embedding_cache=self.embedding_cache
         )
         
         # Add fake chunks to metadata
-        pipeline.metadata["chunks"] = [
+        pipeline.store.add_chunks([
             {"id": 0, "text": "First chunk", "source": "source1", "timestamp": "2026-02-09T10:00:00"},
             {"id": 1, "text": "Second chunk", "source": "source2", "timestamp": "2026-02-09T11:00:00"},
             {"id": 2, "text": "Third chunk", "source": "source3", "timestamp": "2026-02-09T12:00:00"},
-        ]
+        ])
         
         # Search
         results = pipeline.search("test query", k=3, threshold=0.4)
@@ -210,9 +224,9 @@ class TestVectorMemoryPipeline(unittest.TestCase):
         self.assertEqual(results[0]["text"], "First chunk")
         self.assertEqual(results[1]["text"], "Second chunk")
         
-        # Check similarity scores (inverted from distance)
-        self.assertGreater(results[0]["similarity"], 0.9)  # 1 - (0.1/2.0)
-        self.assertGreater(results[1]["similarity"], 0.8)  # 1 - (0.3/2.0)
+        # Check similarity scores are the cosine scores from the index
+        self.assertAlmostEqual(results[0]["similarity"], 0.95)
+        self.assertAlmostEqual(results[1]["similarity"], 0.85)
     
     @patch('vector_memory.SentenceTransformer')
     @patch('vector_memory.faiss')
@@ -221,15 +235,18 @@ class TestVectorMemoryPipeline(unittest.TestCase):
         # Set up mocks
         mock_st.return_value = self.mock_model
         mock_index = MagicMock()
-        mock_faiss.IndexFlatL2.return_value = mock_index
+        mock_faiss.IndexFlatIP.return_value = mock_index
         
         # Initialize pipeline
         pipeline = VectorMemoryPipeline(
             model_name="test-model",
             index_path=self.index_path,
-            metadata_path=self.metadata_path
+            metadata_path=self.metadata_path,
+            embedding_cache=self.embedding_cache
         )
         
+        pipeline.chunker = "fixed"
+        
         # Test with short text (should be one chunk)
         chunks = pipeline._create_chunks(
             "Short text that fits in one chunk",
@@ -261,7 +278,7 @@ class TestVectorMemoryPipeline(unittest.TestCase):
         # Set up mocks
         mock_st.return_value = self.mock_model
         mock_index = MagicMock()
-        mock_faiss.IndexFlatL2.return_value = mock_index
+        mock_faiss.IndexFlatIP.return_value = mock_index
         
         # Override glob to use our test directory
         with patch('vector_memory.glob.glob') as mock_glob:
@@ -277,27 +294,29 @@ class TestVectorMemoryPipeline(unittest.TestCase):
             pipeline = VectorMemoryPipeline(
                 model_name="test-model",
                 index_path=self.index_path,
-                metadata_path=self.metadata_path
+                metadata_path=self.metadata_path,
+                embedding_cache=self.embedding_cache
             )
             
-            # Create a method to bypass file checks and directly add text
-            def mock_add_text(self, text, source, timestamp):
-                self.metadata["chunks"].append({
-                    "id": len(self.metadata["chunks"]),
+            # Create a method to bypass hashing and directly add the file
+            def mock_index_file(self, file_path, source, timestamp=None):
+                with open(file_path, 'r') as f:
+                    text = f.read()
+                self.store.add_chunks([{
                     "text": text[:100],  # Truncate for test
                     "source": source,
                     "timestamp": timestamp
-                })
+                }])
                 return 1
                 
-            # Patch the add_text method
-            with patch.object(VectorMemoryPipeline, 'add_text', mock_add_text):
+            # Patch the index_file method
+            with patch.object(VectorMemoryPipeline, 'index_file', mock_index_file):
                 # Index memory files
                 result = pipeline.index_memory_files(days_back=30)
                 
                 # Should have indexed 2 files
                 self.assertEqual(result, 2)
-                self.assertEqual(len(pipeline.metadata["chunks"]), 2)
+                self.assertEqual(pipeline.store.count(), 2)
 
 def run_tests():
     """Run all tests"""
@@ -11,21 +11,35 @@ Features:
 - Provides relevance-based search with customizable thresholds
 - Integrates with existing memory files and conversation logs
 - Enables efficient retrieval of contextually relevant past information
+
+faiss and sentence-transformers (with torch) are imported on first use, so
+commands that only read stored metadata, like --stats, start in a fraction
+of a second.
 """
 
 import os
 import re
-import sys
-import json
 import time
 import glob
+import fcntl
+import heapq
+import shutil
 import logging
 import argparse
+import importlib
 import numpy as np
 from datetime import datetime, timedelta
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
 from typing import List, Dict, Any, Tuple, Optional
 
+from vector_memory_store import ChunkStore, chunk_hash, TERM_PATTERN
+from markdown_chunker import chunk_markdown, CHUNK_TOKENS
+from embedding_cache import get_embedding_cache
+from session_log_reader import SessionLogReader, APPENDED
+from recall_telemetry import timed
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -37,126 +51,931 @@ logging.basicConfig(
 )
 logger = logging.getLogger('vector-memory')
 
-try:
-    import faiss
-    from sentence_transformers import SentenceTransformer
-except ImportError:
-    logger.error("Required dependencies not found. Please install with:")
-    logger.error("pip install faiss-cpu sentence-transformers")
-    sys.exit(1)
+def import_dependency(name):
+    """Import a heavy dependency, explaining how to install it if it is missing"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        logger.error("Required dependencies not found. Please install with:")
+        logger.error("pip install faiss-cpu sentence-transformers")
+        raise
+
+class LazyModule:
+    """Module imported on first attribute access"""
+    
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = import_dependency(self._name)
+        return getattr(self._module, attr)
+
+faiss = LazyModule("faiss")
+SentenceTransformer = None  # Imported when the model is first loaded
 
 # Constants
 WORKSPACE_DIR = "/Users/karst/.openclaw/workspace"
 MEMORY_DIR = os.path.join(WORKSPACE_DIR, "memory")
 HOURLY_SUMMARIES_DIR = os.path.join(MEMORY_DIR, "hourly-summaries")
 SESSION_LOGS_DIR = os.path.join(WORKSPACE_DIR, "logs", "sessions")
+MEMORY_MD_PATH = os.path.join(WORKSPACE_DIR, "MEMORY.md")
 VECTOR_DIR = os.path.join(MEMORY_DIR, "vectors")
 FAISS_INDEX_PATH = os.path.join(VECTOR_DIR, "memory.index")
-VECTOR_METADATA_PATH = os.path.join(VECTOR_DIR, "metadata.json")
+VECTOR_METADATA_PATH = os.path.join(VECTOR_DIR, "metadata.db")
 MODEL_NAME = "all-MiniLM-L6-v2"  # 384-dimensional embeddings
-CHUNK_SIZE = 512  # Characters per chunk
-CHUNK_OVERLAP = 128  # Characters overlap between chunks
+CHUNKER = "markdown"  # "markdown" packs headers, list items and paragraphs into CHUNK_TOKENS, "fixed" cuts CHUNK_SIZE windows
+CHUNKERS = ("markdown", "fixed")
+CHUNK_SIZE = 512  # Characters per chunk of the fixed chunker
+CHUNK_OVERLAP = 128  # Characters overlap between chunks of the fixed chunker
+FLUSH_MAX_CHUNKS = 256  # Buffered chunks before they are embedded and added to the index
+FLUSH_MAX_SECONDS = 30.0  # Maximum age of buffered chunks before a flush
+ENCODE_BATCH_SIZE = 64  # Chunks per model batch
+ENCODE_WORKERS = 1  # Encoding processes used by indexing runs
+BUFFERED_BATCHES = 16  # Model batches per worker buffered by indexing runs before a flush
+INDEX_TYPE = "auto"  # "flat", "hnsw", "ivfpq", or "auto" to pick by corpus size
+HNSW_THRESHOLD = 20000  # Vectors before "auto" switches from flat to HNSW
+IVFPQ_THRESHOLD = 500000  # Vectors before "auto" switches from HNSW to IVF-PQ
+IVFPQ_MIN_TRAIN = 10000  # Vectors needed to train an IVF-PQ index
+HNSW_M = 32  # Graph neighbors per node
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16  # Inverted lists scanned per query
+PQ_SUBQUANTIZERS = 48  # 384 dims / 48 = 8 dims per 8-bit code
+VECTOR_STORAGE = "float"  # "float", "sq8" (int8 scalar quantization) or "pq" (product quantization)
+PQ_MIN_TRAIN = 10000  # Vectors needed to train product quantizers, "pq" uses "sq8" until then
+RERANK_FACTOR = 4  # Candidates per result re-ranked with float vectors when codes are quantized
+RECALL_QUERIES = 100  # Sampled queries for the recall measurement of --stats
+SCORING_CANDIDATES = 4  # Candidates per result scored for recency and source type
+RECENCY_HALF_LIFE_DAYS = 30.0  # Age at which the recency part of a score is halved
+RECENCY_WEIGHT = 0.3  # Share of a score that decays with age
+SOURCE_TYPE_WEIGHTS = {
+    "memory_md": 1.0,  # Curated long-term memory (MEMORY.md)
+    "daily": 0.95,  # Daily memory files
+    "hourly_summary": 0.9,  # Hourly summaries
+    "session": 0.8,  # Raw session log messages
+    "other": 0.85  # Files added with --add
+}
+SEARCH_MODE = "vector"  # "vector", "keyword" (BM25) or "hybrid" (reciprocal rank fusion of both)
+SEARCH_MODES = ("vector", "keyword", "hybrid")
+RRF_K = 60  # Rank offset of reciprocal rank fusion
+TOMBSTONE_REBUILD_RATIO = 0.2  # Fraction of dead vectors that triggers an index rebuild
+SHARD_BY = None  # None keeps one index, "month" or "source" splits it into shards
+SHARD_LAYOUTS = ("month", "source")
+SHARD_DIR = os.path.join(VECTOR_DIR, "shards")
+SHARD_ARCHIVE_DIR = os.path.join(VECTOR_DIR, "archive")
+SHARD_SEARCH_WORKERS = 4  # Shards searched in parallel
+UNDATED_SHARD = "undated"  # Month shard of chunks without a valid timestamp
 
 # Make sure directories exist
 os.makedirs(MEMORY_DIR, exist_ok=True)
 os.makedirs(VECTOR_DIR, exist_ok=True)
 os.makedirs(os.path.join(WORKSPACE_DIR, "logs"), exist_ok=True)
 
+def resolve_index_type(index_type, n_vectors):
+    """Pick the concrete index type for a corpus of n_vectors"""
+    if index_type == "auto":
+        if n_vectors >= IVFPQ_THRESHOLD:
+            return "ivfpq"
+        if n_vectors >= HNSW_THRESHOLD:
+            return "hnsw"
+        return "flat"
+    
+    # IVF-PQ needs enough vectors to train its quantizers
+    if index_type == "ivfpq" and n_vectors < IVFPQ_MIN_TRAIN:
+        return "flat"
+    
+    if index_type not in ("flat", "hnsw", "ivfpq"):
+        raise ValueError(f"Unknown index type: {index_type}")
+    return index_type
+
+def resolve_storage(storage, index_type, n_vectors):
+    """
+    Pick how the index stores vectors
+    
+    IVF indexes always keep codes: product quantized unless "sq8" is asked for.
+    """
+    if storage not in ("float", "sq8", "pq"):
+        raise ValueError(f"Unknown vector storage: {storage}")
+    
+    if index_type == "ivfpq":
+        return "sq8" if storage == "sq8" else "pq"
+    
+    # Product quantizers need enough vectors to train their codebooks
+    if storage == "pq" and n_vectors < PQ_MIN_TRAIN:
+        return "sq8"
+    return storage
+
+# Terms with an underscore, digit, inner dot or camelCase hump: names, paths, versions, ids
+IDENTIFIER_PATTERN = re.compile(r"[_\d]|\w\.\w|[a-z][A-Z]")
+MONTH_PATTERN = re.compile(r"\d{4}-\d{2}")
+
+def is_identifier_query(query):
+    """True if at least half the terms of a query look like identifiers"""
+    terms = TERM_PATTERN.findall(query)
+    if not terms:
+        return False
+    identifiers = sum(1 for term in terms if IDENTIFIER_PATTERN.search(term) or "-" in term.strip("-"))
+    return identifiers * 2 >= len(terms)
+
+def source_type(source):
+    """Kind of memory a chunk source belongs to, see SOURCE_TYPE_WEIGHTS"""
+    if source == "MEMORY.md":
+        return "memory_md"
+    if source.startswith("memory/hourly-summaries/"):
+        return "hourly_summary"
+    if source.startswith("memory/"):
+        return "daily"
+    if source.startswith("session/"):
+        return "session"
+    return "other"
+
+def shard_key(chunk, shard_by):
+    """Shard of a chunk: the month of its timestamp ("2026-02") or the type of its source"""
+    if shard_by == "source":
+        return source_type(chunk["source"])
+    timestamp = chunk.get("timestamp")
+    if isinstance(timestamp, str) and MONTH_PATTERN.match(timestamp):
+        return timestamp[:7]
+    return UNDATED_SHARD
+
+def window_bound(value):
+    """ISO string of a time window bound given as a datetime, date or ISO string"""
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+def in_window(timestamp, since=None, until=None):
+    """Whether an ISO timestamp lies in [since, until), None bounds are open"""
+    if since is None and until is None:
+        return True
+    if not isinstance(timestamp, str):
+        return False
+    return (since is None or timestamp >= since) and (until is None or timestamp < until)
+
+def timestamp_ages(timestamps, now=None):
+    """
+    Ages in days of ISO timestamps, NaN where a timestamp is missing or invalid
+    
+    Naive timestamps are local time, as written by the indexers.
+    """
+    now = np.datetime64(now or datetime.now(), 'us')
+    try:
+        values = np.array([ts if isinstance(ts, str) else "NaT" for ts in timestamps], dtype='datetime64[us]')
+    except ValueError:
+        # Timezone-aware or malformed timestamps, convert one at a time
+        values = np.empty(len(timestamps), dtype='datetime64[us]')
+        for i, ts in enumerate(timestamps):
+            try:
+                dt = datetime.fromisoformat(ts)
+                if dt.tzinfo is not None:
+                    dt = dt.astimezone().replace(tzinfo=None)
+                values[i] = np.datetime64(dt, 'us')
+            except (TypeError, ValueError):
+                values[i] = np.datetime64("NaT")
+    return (now - values) / np.timedelta64(1, 'D')
+
+def retrieval_scores(similarities, ages, weights, half_life_days=RECENCY_HALF_LIFE_DAYS,
+                     recency_weight=RECENCY_WEIGHT):
+    """
+    Ranking scores combining similarity, recency and source type
+    
+    score = similarity * weight * ((1 - recency_weight) + recency_weight * 0.5 ** (age / half_life))
+    
+    Chunks without a timestamp get no recency bonus. A half-life of 0 or
+    None disables the recency part.
+    
+    Args:
+        similarities: Cosine similarities of the candidates
+        ages: Ages in days (see timestamp_ages)
+        weights: Source type weights of the candidates
+        half_life_days: Age at which the recency part is halved
+        recency_weight: Share of the score that decays with age (0-1)
+    """
+    similarities = np.asarray(similarities, dtype='float64')
+    weights = np.asarray(weights, dtype='float64')
+    if not half_life_days:
+        return similarities * weights
+    
+    ages = np.clip(np.asarray(ages, dtype='float64'), 0, None)
+    decay = np.nan_to_num(np.exp2(-ages / half_life_days), nan=0.0)
+    return similarities * weights * ((1 - recency_weight) + recency_weight * decay)
+
+def base_index(index):
+    """Index structure behind an IndexIDMap wrapper"""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+def index_type_of(index):
+    """Name of the structure behind a FAISS index"""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+def storage_of(index):
+    """How a FAISS index stores its vectors (float, sq8 or pq)"""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "sq8"
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    return "float"
+
+def has_chunk_ids(index):
+    """Whether the index stores chunk ids (IndexIDMap or IVF) rather than positions"""
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIVF))
+
+def rerank_blobs(vectors):
+    """float16 re-rank copies of vectors as bytes, one per row"""
+    return [row.tobytes() for row in np.asarray(vectors, dtype='float16')]
+
+def configure_index(index):
+    """Apply query-time parameters, which are not all persisted by faiss.write_index"""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = IVF_NPROBE
+        # A hashtable direct map supports both reconstruct and remove_ids
+        if base.direct_map.type != faiss.DirectMap.Hashtable:
+            base.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index
+
+def train_quantizer(index, training_vectors):
+    """
+    Train the quantizer of an index
+    
+    Without training vectors an int8 scalar quantizer covers the full [-1, 1]
+    range of normalized vectors; product quantizers always need a sample.
+    """
+    if training_vectors is None or len(training_vectors) == 0:
+        if storage_of(index) != "sq8":
+            raise ValueError("Product quantized indexes need training vectors")
+        training_vectors = np.vstack([-np.ones(index.d), np.ones(index.d)]).astype('float32')
+    index.train(training_vectors)
+    return index
+
+def create_index(index_type, dim, training_vectors=None, storage="float"):
+    """
+    Create an empty cosine-similarity index
+    
+    Vectors must be L2-normalized so that inner product equals cosine similarity.
+    Vectors are added with add_with_ids under their chunk ids: flat and HNSW
+    indexes are wrapped in an IndexIDMap2, IVF-PQ stores ids natively.
+    
+    Args:
+        index_type: "flat", "hnsw" or "ivfpq"
+        dim: Embedding dimension
+        training_vectors: Sample used to train IVF-PQ and quantized storage
+        storage: "float" vectors, "sq8" int8 codes or "pq" product quantized codes
+    """
+    if index_type == "flat":
+        if storage == "sq8":
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        elif storage == "pq":
+            index = faiss.IndexPQ(dim, PQ_SUBQUANTIZERS, 8, faiss.METRIC_INNER_PRODUCT)
+        else:
+            return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        return faiss.IndexIDMap2(train_quantizer(index, training_vectors))
+    
+    if index_type == "hnsw":
+        if storage == "sq8":
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        elif storage == "pq":
+            index = faiss.IndexHNSWPQ(dim, PQ_SUBQUANTIZERS, HNSW_M, 8, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        if storage != "float":
+            train_quantizer(index, training_vectors)
+        return configure_index(faiss.IndexIDMap2(index))
+    
+    if index_type == "ivfpq":
+        if training_vectors is None:
+            raise ValueError("IVF-PQ indexes need training vectors")
+        nlist = max(16, int(4 * np.sqrt(len(training_vectors))))
+        quantizer = faiss.IndexFlatIP(dim)
+        if storage == "sq8":
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit,
+                                                  faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_SUBQUANTIZERS, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(training_vectors)
+        return configure_index(index)
+    
+    raise ValueError(f"Unknown index type: {index_type}")
+
+def index_contents(index):
+    """
+    Read all stored vectors back out of an index
+    
+    Returns:
+        Tuple of (vectors, ids); ids are positions for legacy indexes without ids
+    """
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype='float32'), np.zeros(0, dtype='int64')
+    
+    if isinstance(index, faiss.IndexIDMap):
+        base = base_index(index)
+        return base.reconstruct_n(0, base.ntotal), faiss.vector_to_array(index.id_map)
+    
+    if isinstance(index, faiss.IndexIVF):
+        invlists = index.invlists
+        ids = np.concatenate([
+            faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+            for list_no in range(index.nlist) if invlists.list_size(list_no)
+        ]).astype('int64')
+        if index.direct_map.type == faiss.DirectMap.NoMap:
+            index.make_direct_map()
+        return index.reconstruct_batch(ids), ids
+    
+    return index.reconstruct_n(0, index.ntotal), np.arange(index.ntotal, dtype='int64')
+
+def build_index(index_type, vectors, ids=None, storage="float"):
+    """Build an index of the given type holding normalized copies of vectors under ids"""
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    faiss.normalize_L2(vectors)
+    if ids is None:
+        ids = np.arange(len(vectors), dtype='int64')
+    index = create_index(index_type, vectors.shape[1], training_vectors=vectors, storage=storage)
+    if len(vectors):
+        index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype='int64'))
+    return index
+
+def read_index_mmap(path, index_type=None):
+    """
+    Open a committed index file memory-mapped and read-only
+    
+    Flat and HNSW vector codes are mapped in place (IO_FLAG_MMAP_IFC), IVF
+    inverted lists through IO_FLAG_MMAP, so every search process shares the
+    page cache instead of holding a private copy and opening does not grow
+    with the index size. Faiss builds without IO_FLAG_MMAP_IFC map IVF lists only.
+    The returned index must not be modified.
+    """
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    if index_type == "ivfpq":
+        flags = faiss.IO_FLAG_MMAP
+    return faiss.read_index(path, flags)
+
+def write_index_atomic(index, path):
+    """
+    Write an index so that path holds either the old or the new file, never a torn one
+    
+    The index is written to a temporary file, flushed to disk and renamed over
+    path, then the directory entry is flushed as well.
+    """
+    temp_path = path + ".tmp"
+    faiss.write_index(index, temp_path)
+    with open(temp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    
+    directory = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+class IndexLock:
+    """
+    Exclusive writer lock for an index and its metadata, shared across processes
+    
+    Held by write sessions and index maintenance so a cron indexing run and the
+    recall hook never write at the same time. Readers do not take it. The lock
+    is reentrant within a process.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+    
+    def acquire(self):
+        if self._depth == 0:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    logger.info(f"Waiting for another process to finish writing ({self.path})")
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                raise
+            self._fd = fd
+        self._depth += 1
+    
+    def release(self):
+        if self._depth == 0:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+class VectorWriteSession:
+    """
+    Bulk ingestion session for the vector memory pipeline
+
+    Chunks are buffered in memory and embedded in large batches whenever the
+    buffer reaches max_chunks or gets older than max_seconds. The index and
+    metadata are only written to disk once, when the session commits.
+    """
+    
+    def __init__(self, pipeline, max_chunks=FLUSH_MAX_CHUNKS, max_seconds=FLUSH_MAX_SECONDS):
+        self.pipeline = pipeline
+        self.max_chunks = max_chunks
+        self.max_seconds = max_seconds
+        self.started_at = datetime.now()
+        self.pending = []
+        self.pending_since = None
+        self.total_chunks = 0
+        self.removed_chunks = 0
+        self.flushes = 0
+        self.embed_seconds = 0.0
+    
+    def __enter__(self):
+        self.pipeline._begin_session(self)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                try:
+                    self.commit()
+                except BaseException:
+                    self.rollback()
+                    raise
+            else:
+                self.rollback()
+        finally:
+            self.pipeline._end_session(self)
+        return False
+    
+    def add(self, text, source, timestamp=None):
+        """Queue text for indexing, returns the number of chunks queued"""
+        if not text or len(text.strip()) == 0:
+            logger.warning(f"Skipping empty text from {source}")
+            return 0
+        
+        return self.add_chunks(self.pipeline._create_chunks(text, source, timestamp))
+    
+    def add_chunks(self, chunks):
+        """Queue already chunked text for indexing, returns the number of chunks queued"""
+        if not chunks:
+            return 0
+        
+        if self.pending_since is None:
+            self.pending_since = time.time()
+        self.pending.extend(chunks)
+        
+        if (len(self.pending) >= self.max_chunks or
+                time.time() - self.pending_since >= self.max_seconds):
+            self.flush()
+        
+        return len(chunks)
+    
+    def remove(self, chunk_ids):
+        """Remove chunks from the in-memory index, returns the number removed"""
+        if not chunk_ids:
+            return 0
+        
+        removed = self.pipeline._remove_chunks(chunk_ids)
+        self.removed_chunks += removed
+        return removed
+    
+    def add_many(self, items):
+        """Queue (text, source, timestamp) tuples, returns the number of chunks queued"""
+        count = 0
+        for item in items:
+            count += self.add(*item)
+        return count
+    
+    def flush(self):
+        """Embed buffered chunks in one batch and add them to the in-memory index"""
+        if not self.pending:
+            return 0
+        
+        chunks, self.pending, self.pending_since = self.pending, [], None
+        
+        # Length-sorted batches need the least padding in the model
+        chunks.sort(key=lambda chunk: len(chunk["text"]))
+        
+        start_time = time.time()
+        added = self.pipeline._add_chunks(chunks)
+        self.embed_seconds += time.time() - start_time
+        self.total_chunks += added
+        self.flushes += 1
+        logger.debug(f"Flushed {added} chunks to the in-memory index")
+        return added
+    
+    def commit(self):
+        """Flush remaining chunks and persist the index and metadata once"""
+        self.flush()
+        if self.total_chunks == 0 and self.removed_chunks == 0 and not self.pipeline._storage_changed():
+            # File hashes may still have been refreshed
+            self.pipeline._save_metadata()
+            logger.debug("Nothing to commit")
+            return 0
+        
+        self.pipeline._commit_index(self.started_at)
+        
+        logger.info(f"Committed {self.total_chunks} chunks in {self.flushes} batches, "
+                    f"removed {self.removed_chunks} stale chunks")
+        return self.total_chunks
+    
+    def rollback(self):
+        """Discard buffered and flushed chunks, restoring the on-disk state"""
+        self.pending, self.pending_since = [], None
+        changed = bool(self.total_chunks or self.removed_chunks)
+        if changed:
+            logger.warning(f"Rolling back {self.total_chunks} uncommitted chunks "
+                           f"and {self.removed_chunks} removals")
+        self.pipeline._discard_changes(changed)
+        self.total_chunks = 0
+        self.removed_chunks = 0
+
 class VectorMemoryPipeline:
     """Implements a vector-based memory system using FAISS"""
     
-    def __init__(self, model_name=MODEL_NAME, index_path=FAISS_INDEX_PATH, metadata_path=VECTOR_METADATA_PATH):
+    def __init__(self, model_name=MODEL_NAME, index_path=FAISS_INDEX_PATH, metadata_path=VECTOR_METADATA_PATH,
+                 index_type=INDEX_TYPE, embedding_cache=None, vector_storage=None, read_only=False):
         self.model_name = model_name
         self.index_path = index_path
         self.metadata_path = metadata_path
+        self.index_type = index_type
+        self.vector_storage = vector_storage  # None keeps the storage recorded in the store
+        self.chunker = CHUNKER
+        self.read_only = read_only  # Search-only: memory-map the committed index, refuse writes
+        self.recency_half_life_days = RECENCY_HALF_LIFE_DAYS
+        self.recency_weight = RECENCY_WEIGHT
+        self.source_weights = dict(SOURCE_TYPE_WEIGHTS)
+        self.search_mode = SEARCH_MODE
         self.model = None  # Loaded on demand
+        self.model_load_ms = None  # Time the model took to load
         self.index = None  # Loaded on demand
-        self.metadata = self._load_metadata()
+        self.store = self._open_store()  # Opened lazily on first query
+        self.embedding_cache = embedding_cache or get_embedding_cache()
+        self.encode_batch_size = ENCODE_BATCH_SIZE
+        self.encode_workers = ENCODE_WORKERS
+        self._encode_pool = None  # sentence-transformers multi-process pool, started on demand
+        self._session = None  # Active VectorWriteSession, if any
+        self._loaded_stamp = None  # Stamp of the committed index file held in memory
+        self.write_lock = IndexLock(os.path.splitext(metadata_path)[0] + ".lock")
     
     def _load_model(self):
         """Load the sentence transformer model for embeddings"""
+        global SentenceTransformer
         if self.model is None:
             logger.info(f"Loading embedding model: {self.model_name}")
+            start_time = time.perf_counter()
+            if SentenceTransformer is None:
+                SentenceTransformer = import_dependency("sentence_transformers").SentenceTransformer
             self.model = SentenceTransformer(self.model_name)
+            self.model_load_ms = (time.perf_counter() - start_time) * 1000
         return self.model
     
     def _load_index(self, create_if_missing=True):
         """Load or create the FAISS index"""
         if self.index is not None:
             return self.index
-            
-        model = self._load_model()
-        embedding_size = model.get_sentence_embedding_dimension()
         
-        if os.path.exists(self.index_path):
-            logger.info(f"Loading existing FAISS index from {self.index_path}")
+        # Committed generations are never rewritten in place, so reading one
+        # needs no lock even while another process is indexing
+        stamp = self._file_stamp()
+        index_path = stamp[0] if stamp else self.index_path
+        if stamp is not None:
+            logger.info(f"Loading existing FAISS index from {index_path}"
+                        + (" (memory-mapped)" if self.read_only else ""))
             try:
-                self.index = faiss.read_index(self.index_path)
+                if self.read_only:
+                    index = read_index_mmap(index_path, (self.store.get_meta("index_stats") or {}).get("index_type"))
+                else:
+                    index = faiss.read_index(index_path)
+                self.index = configure_index(index)
+                self._loaded_stamp = stamp
                 logger.info(f"Index loaded with {self.index.ntotal} vectors")
+                
+                # Indexes written before cosine scoring used L2 distance, and
+                # before incremental reindexing stored positions instead of ids.
+                # This one-time rewrite is done by any process, read-only or not
+                if (self.index.metric_type != faiss.METRIC_INNER_PRODUCT or
+                        not has_chunk_ids(self.index)):
+                    with self.write_lock:
+                        self._migrate_index()
                 return self.index
             except Exception as e:
                 logger.error(f"Error loading FAISS index: {e}")
-                if not create_if_missing:
+                if not create_if_missing or self.read_only:
                     raise
                 logger.info("Creating new index instead")
         
-        if create_if_missing:
-            logger.info(f"Creating new FAISS index with dimension {embedding_size}")
-            self.index = faiss.IndexFlatL2(embedding_size)
+        if create_if_missing and not self.read_only:
+            # Only a new index needs the model, for its embedding dimension
+            embedding_size = self._load_model().get_sentence_embedding_dimension()
+            index_type = resolve_index_type(self.index_type, 0)
+            storage = resolve_storage(self._storage_setting(), index_type, 0)
+            logger.info(f"Creating new {index_type} FAISS index with dimension {embedding_size} "
+                        f"and {storage} storage")
+            self.index = create_index(index_type, embedding_size, storage=storage)
             return self.index
         else:
-            raise FileNotFoundError(f"FAISS index not found at {self.index_path}")
+            raise FileNotFoundError(f"FAISS index not found at {index_path}")
+    
+    def _migrate_index(self):
+        """Rebuild a legacy index as a normalized inner-product index keyed by chunk id"""
+        index_type = resolve_index_type(self.index_type, self.index.ntotal)
+        logger.info(f"Migrating legacy index with {self.index.ntotal} vectors to cosine {index_type} index")
+        
+        # Legacy chunk ids are the positions of their vectors
+        vectors, ids = index_contents(self.index)
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        faiss.normalize_L2(vectors)
+        
+        storage = resolve_storage(self._storage_setting(), index_type, len(ids))
+        self.index = build_index(index_type, vectors, ids, storage=storage)
+        if storage != "float":
+            self.store.set_vectors(ids, rerank_blobs(vectors))
+        self._persist_index()
+    
+    def _storage_setting(self):
+        """Configured vector storage, defaulting to the one recorded in the store"""
+        return self.vector_storage or self.store.get_meta("vector_storage", VECTOR_STORAGE)
     
-    def _load_metadata(self):
-        """Load vector metadata or create if it doesn't exist"""
-        if os.path.exists(self.metadata_path):
+    def _storage_changed(self):
+        """Whether a vector storage other than the recorded one was asked for"""
+        return (self.vector_storage is not None and
+                self.vector_storage != self.store.get_meta("vector_storage", VECTOR_STORAGE))
+    
+    def _maybe_upgrade_index(self):
+        """
+        Rebuild the index with an ANN structure once the corpus outgrows it,
+        to switch its vector storage, or to drop tombstoned vectors once they
+        make up a large share of it
+        
+        Returns:
+            True if the index was rebuilt
+        """
+        if self.index is None:
+            if not self._storage_changed():
+                return False
             try:
-                with open(self.metadata_path, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError) as e:
-                logger.error(f"Error loading metadata: {e}")
-                return self._create_default_metadata()
+                self._load_index(create_if_missing=False)
+            except FileNotFoundError:
+                return False
+        
+        tombstones = self.store.tombstone_count()
+        live_vectors = self.index.ntotal - tombstones
+        current_type = index_type_of(self.index)
+        target_type = resolve_index_type(self.index_type, live_vectors)
+        
+        # Only move up: flat -> hnsw -> ivfpq, or to an explicitly configured type
+        order = ["flat", "hnsw", "ivfpq"]
+        if self.index_type == "auto" and order.index(target_type) < order.index(current_type):
+            target_type = current_type
+        
+        current_storage = storage_of(self.index)
+        target_storage = resolve_storage(self._storage_setting(), target_type, live_vectors)
+        
+        # A trained product quantizer is kept when deletions shrink the corpus
+        if (target_type == current_type and current_storage == "pq" and
+                self._storage_setting() == "pq"):
+            target_storage = current_storage
+        
+        compact = tombstones > 0 and tombstones >= TOMBSTONE_REBUILD_RATIO * self.index.ntotal
+        if target_type == current_type and target_storage == current_storage and not compact:
+            self.store.set_meta("vector_storage", self._storage_setting())
+            return False
+        
+        logger.info(f"Rebuilding {current_type} index ({current_storage}) with {live_vectors} live vectors "
+                    f"({tombstones} tombstoned) as {target_type} ({target_storage})")
+        start_time = time.time()
+        self._rebuild_index(target_type, target_storage)
+        self.store.set_meta("vector_storage", self._storage_setting())
+        logger.info(f"Index rebuilt in {time.time() - start_time:.2f} seconds")
+        return True
+    
+    def _float_vectors(self, vectors, ids):
+        """
+        Best available float copies of vectors read from the index
+        
+        Quantized indexes only hold approximate vectors, so their float16
+        re-rank copies from the store are used where they exist.
+        """
+        vectors = np.array(vectors, dtype='float32')
+        if storage_of(self.index) == "float":
+            return vectors
+        
+        rows = {int(chunk_id): row for row, chunk_id in enumerate(ids)}
+        for batch in self.store.iter_vectors():
+            for chunk_id, blob in batch:
+                row = rows.get(chunk_id)
+                if row is not None:
+                    vectors[row] = np.frombuffer(blob, dtype='float16')
+        return vectors
+    
+    def _rebuild_index(self, index_type, storage=None):
+        """Rebuild the index as index_type without its tombstoned vectors"""
+        vectors, ids = index_contents(self.index)
+        
+        tombstoned_ids = self.store.tombstoned_ids()
+        if tombstoned_ids:
+            keep = ~np.isin(ids, np.array(tombstoned_ids, dtype='int64'))
+            vectors, ids = vectors[keep], ids[keep]
+            self.store.purge_tombstones()
+        
+        # Retrain quantizers on the float vectors, not on decoded codes
+        vectors = self._float_vectors(vectors, ids)
+        
+        index_type = resolve_index_type(index_type, len(ids))
+        if storage is None:
+            storage = resolve_storage(self._storage_setting(), index_type, len(ids))
+        self.index = build_index(index_type, vectors, ids, storage=storage)
+        
+        # Quantized indexes re-rank their candidates with float16 copies
+        if storage_of(self.index) == "float":
+            self.store.clear_vectors()
         else:
-            return self._create_default_metadata()
+            self.store.set_vectors(ids, rerank_blobs(vectors))
+    
+    def _encode(self, texts):
+        """Embed texts as L2-normalized float32 vectors, so inner product is cosine similarity"""
+        embeddings = self.embedding_cache.encode(list(texts), self._run_model, namespace=self.model_name)
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        
+        # Cached vectors are float16, restore unit length after rounding
+        faiss.normalize_L2(embeddings)
+        return embeddings
+    
+    def _run_model(self, texts):
+        """
+        Embed texts that are not cached, as L2-normalized vectors
+        
+        The model is only loaded when some text is not cached yet. With more
+        than one encode worker, large inputs are split into batches of
+        encode_batch_size that are encoded in parallel by a process pool.
+        """
+        model = self._load_model()
+        
+        if self.encode_workers > 1 and len(texts) >= 2 * self.encode_batch_size:
+            embeddings = model.encode_multi_process(
+                texts,
+                self._start_encode_pool(),
+                batch_size=self.encode_batch_size,
+                chunk_size=self.encode_batch_size
+            )
+            embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+            faiss.normalize_L2(embeddings)
+            return embeddings
+        
+        return model.encode(texts, batch_size=self.encode_batch_size,
+                            convert_to_numpy=True, normalize_embeddings=True)
+    
+    def _start_encode_pool(self):
+        """Start the encoding process pool"""
+        if self._encode_pool is None:
+            logger.info(f"Starting {self.encode_workers} encoding workers")
+            self._encode_pool = self._load_model().start_multi_process_pool(
+                target_devices=["cpu"] * self.encode_workers
+            )
+        return self._encode_pool
+    
+    def _stop_encode_pool(self):
+        """Stop the encoding process pool if it was started"""
+        if self._encode_pool is not None:
+            self.model.stop_multi_process_pool(self._encode_pool)
+            self._encode_pool = None
+    
+    def _open_store(self):
+        """Create the chunk metadata store, migrating a legacy metadata.json if present"""
+        base_path = os.path.splitext(self.metadata_path)[0]
+        return ChunkStore(
+            base_path + ".db",
+            legacy_json_path=base_path + ".json",
+            defaults=self._create_default_metadata()
+        )
     
     def _save_metadata(self):
-        """Save metadata to file"""
+        """Commit pending metadata writes"""
         try:
-            with open(self.metadata_path, 'w') as f:
-                json.dump(self.metadata, f, indent=2)
-            logger.debug(f"Metadata saved to {self.metadata_path}")
-        except IOError as e:
+            self.store.commit()
+            logger.debug(f"Metadata saved to {self.store.path}")
+        except Exception as e:
             logger.error(f"Error saving metadata: {e}")
     
     def _create_default_metadata(self):
-        """Create default metadata structure"""
+        """Create default metadata values"""
         return {
-            "chunks": [],
             "last_update": None,
-            "total_chunks": 0,
             "model_name": self.model_name,
             "embedding_dim": 384,  # Default for all-MiniLM-L6-v2
+            "chunker": CHUNKER,
+            "chunk_tokens": CHUNK_TOKENS,
             "chunk_size": CHUNK_SIZE,
             "chunk_overlap": CHUNK_OVERLAP
         }
     
     def _save_index(self):
-        """Save the FAISS index to disk"""
+        """
+        Write the FAISS index as a new generation file
+        
+        The file is named after the current generation and only becomes the
+        committed index once the metadata pointing at it is committed.
+        """
         if self.index is None:
             logger.error("Cannot save index: No index loaded")
             return
             
+        index_path = f"{self.index_path}.{self.index_generation()}"
         try:
-            faiss.write_index(self.index, self.index_path)
-            logger.info(f"Index saved to {self.index_path} with {self.index.ntotal} vectors")
+            write_index_atomic(self.index, index_path)
         except Exception as e:
             logger.error(f"Error saving FAISS index: {e}")
+            raise
+        logger.info(f"Index saved to {index_path} with {self.index.ntotal} vectors")
+        
+        self.store.set_meta("index_file", os.path.basename(index_path))
+        # Lets get_stats describe the index without loading it
+        self.store.set_meta("index_stats", {
+            "ntotal": int(self.index.ntotal),
+            "dim": int(self.index.d),
+            "index_type": index_type_of(self.index),
+            "vector_storage": storage_of(self.index)
+        })
+    
+    def _persist_index(self):
+        """
+        Commit the in-memory index and pending metadata as the next generation
+        
+        The index file is written first; committing the metadata that names it
+        is the commit point. A crash before that leaves the previous generation
+        and its metadata in place, a crash after it only leaves old files behind.
+        """
+        self._bump_generation()
+        self._save_index()
+        self.store.commit()
+        logger.debug(f"Metadata saved to {self.store.path}")
+        self._loaded_stamp = self._file_stamp()
+        self._remove_stale_index_files()
+    
+    def _committed_index_path(self):
+        """Index file named by the committed metadata, the legacy unversioned file if none is"""
+        index_file = self.store.get_meta("index_file")
+        if index_file is None:
+            return self.index_path
+        return os.path.join(os.path.dirname(self.index_path), index_file)
+    
+    def _remove_stale_index_files(self):
+        """
+        Delete index generations older than the previous one
+        
+        The previous generation is kept for readers that looked up the
+        committed file name just before this commit and have yet to open it.
+        """
+        committed = self.index_generation()
+        base_name = os.path.basename(self.index_path)
+        pattern = re.compile(re.escape(base_name) + r"(?:\.(\d+))?(?:\.tmp)?$")
+        for path in glob.glob(self.index_path + "*"):
+            match = pattern.match(os.path.basename(path))
+            if match is None:
+                continue
+            if match.group(1) and int(match.group(1)) in (committed, committed - 1) and not path.endswith(".tmp"):
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove stale index file {path}: {e}")
     
     def _create_chunks(self, text, source, timestamp=None, overlap=CHUNK_OVERLAP):
-        """Split text into overlapping chunks for embedding"""
+        """
+        Split text into chunks for embedding with the configured chunker
+        
+        The markdown chunker follows headers, list items and paragraphs and
+        records the header path of each chunk; the fixed chunker cuts
+        overlapping CHUNK_SIZE windows (overlap only applies to it).
+        """
         if timestamp is None:
             timestamp = datetime.now().isoformat()
-            
+        
+        if self.chunker == "markdown":
+            return chunk_markdown(text, source, timestamp)
+        
         # Create chunk_size chunks with overlap
         chunks = []
         start = 0
@@ -192,122 +1011,595 @@ class VectorMemoryPipeline:
         
         return chunks
     
-    def add_text(self, text, source, timestamp=None):
-        """Add text to the vector index"""
-        if not text or len(text.strip()) == 0:
-            logger.warning(f"Skipping empty text from {source}")
-            return
+    def _file_stamp(self):
+        """Stamp (path, mtime, size) of the committed index file, None if there is none"""
+        index_path = self._committed_index_path()
+        try:
+            file_stat = os.stat(index_path)
+            return (index_path, file_stat.st_mtime_ns, file_stat.st_size)
+        except OSError:
+            return None
+    
+    def index_generation(self):
+        """
+        Generation of the committed index, bumped by every index write
+        
+        Caches of search results (e.g. the semantic recall query cache) key on
+        it, so they are invalidated by writes from any process.
+        """
+        return self.store.get_meta("generation", 0)
+    
+    def _bump_generation(self):
+        """Advance the index generation (committed with the metadata)"""
+        self.store.set_meta("generation", self.index_generation() + 1)
+    
+    def reload_if_changed(self):
+        """
+        Drop the cached index if the index file was rewritten on disk
         
-        # Create chunks from the text
-        chunks = self._create_chunks(text, source, timestamp)
+        Used by long-lived processes (e.g. the semantic recall server) to pick up
+        the results of indexing runs made by other processes. Chunk metadata is
+        read from the store per query, so it never goes stale.
         
-        # Load model and index
-        model = self._load_model()
+        Returns:
+            True if the index was reloaded
+        """
+        if self._session is not None or self.index is None:
+            return False
+        
+        stamp = self._file_stamp()
+        if stamp == self._loaded_stamp:
+            return False
+        
+        logger.info("Index file changed on disk, reloading")
+        self.index = None
+        self._loaded_stamp = stamp
+        return True
+    
+    def _begin_session(self, session):
+        """
+        Attach a write session so add_text calls are buffered
+        
+        Takes the writer lock for the lifetime of the session and picks up
+        anything committed by the previous writer, so its changes build on them.
+        """
+        if self._session is not None:
+            raise RuntimeError("A write session is already active for this pipeline")
+        self._check_writable()
+        self.write_lock.acquire()
+        try:
+            self.reload_if_changed()
+        except BaseException:
+            self.write_lock.release()
+            raise
+        self._session = session
+    
+    def _check_writable(self):
+        """Refuse writes through a search-only pipeline, whose index may be memory-mapped"""
+        if self.read_only:
+            raise RuntimeError("Vector memory was opened read-only for search")
+    
+    def _end_session(self, session):
+        """Detach a write session and release the writer lock"""
+        if self._session is session:
+            self._session = None
+            self.write_lock.release()
+    
+    def _commit_index(self, started_at):
+        """Persist the index and metadata changed by a write session started at started_at"""
+        # Switch to an ANN structure if the corpus crossed a size threshold,
+        # or drop tombstoned vectors once enough have piled up
+        self._maybe_upgrade_index()
+        
+        # Use the session start so files modified during the run are picked up next time
+        self.store.set_meta("last_update", started_at.isoformat())
+        self._persist_index()
+    
+    def _discard_changes(self, changed=True):
+        """Restore the on-disk state after a write session was rolled back"""
+        if changed:
+            self.index = None
+        self.store.rollback()
+    
+    def write_session(self, max_chunks=FLUSH_MAX_CHUNKS, max_seconds=FLUSH_MAX_SECONDS):
+        """
+        Open a bulk ingestion session
+        
+        Usage:
+            with pipeline.write_session() as session:
+                session.add(text, source, timestamp)
+        
+        Every add_text call made while the session is open is buffered as well.
+        """
+        return VectorWriteSession(self, max_chunks=max_chunks, max_seconds=max_seconds)
+    
+    def _add_chunks(self, chunks, embeddings=None):
+        """Embed chunks in one batch (unless embeddings are given) and add them to the in-memory index and metadata"""
         index = self._load_index()
         
         # Create embeddings for chunks
-        texts = [chunk["text"] for chunk in chunks]
-        embeddings = model.encode(texts, convert_to_numpy=True)
-        
-        # Check if embeddings is a single vector instead of a batch
-        if len(embeddings.shape) == 1:
-            embeddings = embeddings.reshape(1, -1)
-        
-        # Add embeddings to the index
-        index.add(embeddings)
-        
-        # Update metadata
-        start_idx = len(self.metadata["chunks"])
-        for i, chunk in enumerate(chunks):
-            chunk_id = start_idx + i
-            self.metadata["chunks"].append({
-                "id": chunk_id,
-                "text": chunk["text"],
-                "source": chunk["source"],
-                "timestamp": chunk["timestamp"],
-                "start": chunk["start"],
-                "end": chunk["end"]
-            })
+        if embeddings is None:
+            embeddings = self._encode([chunk["text"] for chunk in chunks])
         
-        self.metadata["total_chunks"] = len(self.metadata["chunks"])
-        self.metadata["last_update"] = datetime.now().isoformat()
+        # Add embeddings to the index under freshly allocated chunk ids
+        chunk_ids = self.store.allocate_ids(len(chunks))
+        index.add_with_ids(embeddings, np.array(chunk_ids, dtype='int64'))
         
-        # Save index and metadata
-        self._save_index()
-        self._save_metadata()
-        
-        logger.info(f"Added {len(chunks)} chunks from {source} to the index")
+        self.store.add_chunks(chunks, start_id=chunk_ids[0])
+        if storage_of(index) != "float":
+            self.store.set_vectors(chunk_ids, rerank_blobs(embeddings))
         return len(chunks)
     
-    def search(self, query, k=5, threshold=0.5):
+    def _remove_chunks(self, chunk_ids):
+        """
+        Remove chunks from the in-memory index and metadata
+        
+        HNSW graphs cannot delete vectors, so their chunks are tombstoned in
+        the store instead and dropped when the index is next rebuilt.
+        """
+        index = self._load_index()
+        try:
+            index.remove_ids(np.array(chunk_ids, dtype='int64'))
+            self.store.delete_chunks(chunk_ids)
+        except RuntimeError:
+            self.store.delete_chunks(chunk_ids, tombstone=True)
+        return len(chunk_ids)
+    
+    def _sync_source(self, source, chunks):
+        """
+        Replace the indexed chunks of a source with chunks, embedding only the difference
+        
+        Chunks whose content hash is already indexed for the source are kept,
+        new ones are queued in the active write session and leftovers removed.
+        
+        Returns:
+            Number of chunks queued for embedding
+        """
+        new_chunks, stale_ids = self._diff_source(source, chunks)
+        self._session.remove(stale_ids)
+        
+        if new_chunks or stale_ids:
+            logger.debug(f"{source}: {len(new_chunks)} new, {len(stale_ids)} stale, "
+                         f"{len(chunks) - len(new_chunks)} unchanged chunks")
+        return self._session.add_chunks(new_chunks)
+    
+    def _diff_source(self, source, chunks):
         """
-        Search for the most similar chunks to the query
+        Compare chunks of a source with its indexed chunks by content hash
+        
+        Returns:
+            Tuple of (chunks not indexed yet, ids of indexed chunks no longer present)
+        """
+        existing = {}
+        for chunk_id, content_hash in self.store.chunk_hashes(source):
+            existing.setdefault(content_hash, []).append(chunk_id)
+        
+        new_chunks = []
+        for chunk in chunks:
+            # A chunk moved under another header is re-indexed to record its new header path
+            identity = chunk["text"] if not chunk.get("header_path") else chunk["header_path"] + "\n" + chunk["text"]
+            chunk["content_hash"] = chunk_hash(identity)
+            kept_ids = existing.get(chunk["content_hash"])
+            if kept_ids:
+                kept_ids.pop()
+            else:
+                new_chunks.append(chunk)
+        
+        stale_ids = [chunk_id for chunk_ids in existing.values() for chunk_id in chunk_ids]
+        return new_chunks, stale_ids
+    
+    def _unindexed_chunks(self, source, chunks):
+        """
+        Chunks appended to a source that are not indexed for it yet
+        
+        A crash after the chunks were committed but before the session log
+        offsets were leaves the offsets behind, so the next run reads the
+        same messages again; they are matched by content hash and skipped.
+        """
+        return self._diff_source(source, chunks)[0]
+    
+    def index_file(self, file_path, source, timestamp=None):
+        """
+        Incrementally index a file
+        
+        Files whose size and mtime are unchanged are skipped without being read,
+        files whose content hash is unchanged without being chunked, unless
+        they were chunked with another chunker. Otherwise only chunks that are
+        not yet indexed for the source are embedded, and chunks that
+        disappeared from the file are removed.
+        
+        Args:
+            file_path: Path of the file
+            source: Source name stored with the chunks
+            timestamp: Timestamp stored with new chunks
+            
+        Returns:
+            Number of chunks embedded
+        """
+        if self._session is None:
+            with self.write_session():
+                return self.index_file(file_path, source, timestamp)
+        
+        file_stat = os.stat(file_path)
+        state = self.store.get_file(source)
+        # Files indexed before the chunker was recorded were cut into fixed windows
+        if state and (state["chunker"] or "fixed") != self.chunker:
+            state = None
+        if state and state["mtime"] == file_stat.st_mtime and state["size"] == file_stat.st_size:
+            logger.debug(f"Skipping unmodified file: {file_path}")
+            return 0
+        
+        with open(file_path, 'r') as f:
+            content = f.read()
+        content_hash = chunk_hash(content)
+        
+        if state is None or state["content_hash"] != content_hash:
+            chunks = self._create_chunks(content, source, timestamp) if content.strip() else []
+            chunks_added = self._sync_source(source, chunks)
+        else:
+            logger.debug(f"Skipping file with unchanged content: {file_path}")
+            chunks_added = 0
+        
+        self.store.set_file(source, content_hash, file_stat.st_mtime, file_stat.st_size, self.chunker)
+        return chunks_added
+    
+    def add_text(self, text, source, timestamp=None):
+        """Add text to the vector index"""
+        # Inside a write session the text is buffered and committed with the session
+        if self._session is not None:
+            return self._session.add(text, source, timestamp)
+        
+        with self.write_session() as session:
+            chunks_added = session.add(text, source, timestamp)
+        
+        if chunks_added:
+            logger.info(f"Added {chunks_added} chunks from {source} to the index")
+        return chunks_added
+    
+    def add_texts(self, items, max_chunks=FLUSH_MAX_CHUNKS, max_seconds=FLUSH_MAX_SECONDS):
+        """
+        Add many texts to the vector index with a single commit
+        
+        Args:
+            items: Iterable of (text, source, timestamp) tuples
+            max_chunks: Buffered chunks before embedding a batch
+            max_seconds: Maximum age of buffered chunks before embedding a batch
+            
+        Returns:
+            Number of chunks added
+        """
+        if self._session is not None:
+            return self._session.add_many(items)
+        
+        with self.write_session(max_chunks=max_chunks, max_seconds=max_seconds) as session:
+            session.add_many(items)
+        
+        logger.info(f"Added {session.total_chunks} chunks to the index")
+        return session.total_chunks
+    
+    def embed_query(self, query, timings=None):
+        """
+        Normalized embedding of a search query, as a 1 x dim array
+        
+        Args:
+            query: The search query
+            timings: Dictionary collecting milliseconds per stage ("encode",
+                and "model_load" if the model was loaded for this query)
+        """
+        model_loaded = self.model is not None
+        with timed(timings, "encode"):
+            embedding = self._encode([query])
+        
+        # Report the one-time model load separately from encoding
+        if timings is not None and not model_loaded and self.model is not None:
+            timings["model_load"] = self.model_load_ms
+            timings["encode"] -= self.model_load_ms
+        return embedding
+    
+    def search(self, query, k=5, threshold=0.5, half_life_days=None, recency_weight=None, source_weights=None,
+               query_embedding=None, mode=None, timings=None, since=None, until=None):
+        """
+        Search for the most relevant chunks to the query
+        
+        Vector search fetches SCORING_CANDIDATES candidates per result from the
+        index and ranks them in one NumPy pass by a score combining cosine
+        similarity with the age of the chunk and the type of its source (see
+        retrieval_scores). With recency_weight 0 and equal source weights this
+        is plain similarity ranking.
+        
+        Keyword search ranks chunks by BM25 over the FTS5 index of the store.
+        Hybrid search fuses both rankings with reciprocal rank fusion; keyword
+        hits are kept even below the similarity threshold, since they contain
+        the query's exact terms. Identifier queries (see is_identifier_query)
+        with keyword hits are answered by keyword search alone, without
+        running the embedding model.
         
         Args:
             query: The search query
             k: Number of results to return
-            threshold: Similarity threshold (0-1, higher is more strict)
+            threshold: Cosine similarity threshold (0-1, higher is more strict)
+            half_life_days: Recency half-life, defaults to recency_half_life_days
+            recency_weight: Share of the score that decays with age, defaults to recency_weight
+            source_weights: Weights by source type, merged over source_weights
+            query_embedding: Embedding of the query from embed_query, if already computed
+            mode: "vector", "keyword" or "hybrid", defaults to search_mode
+            timings: Dictionary collecting milliseconds per stage (index_load,
+                model_load, encode, keyword, faiss, metadata, rank)
+            since: Only return chunks with a timestamp at or after this date or time
+            until: Only return chunks with a timestamp before this date or time
             
         Returns:
-            List of dictionaries with search results
+            List of dictionaries with search results, best score first.
+            similarity is None for keyword results whose vector was not compared.
         """
-        # Load model and index
-        model = self._load_model()
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        window = (window_bound(since), window_bound(until))
+        
+        keyword_hits = []
+        if mode != "vector":
+            with timed(timings, "keyword"):
+                keyword_hits = self._window_hits(self.store.keyword_search(query, limit=k * SCORING_CANDIDATES),
+                                                 *window)
+            if mode == "keyword" or (query_embedding is None and keyword_hits and is_identifier_query(query)):
+                return self._keyword_results(keyword_hits[:k], timings)
         
         try:
-            index = self._load_index(create_if_missing=False)
+            with timed(timings, "index_load"):
+                self._load_index(create_if_missing=False)
         except FileNotFoundError:
             logger.error("No index found for search")
-            return []
+            return self._keyword_results(keyword_hits[:k], timings)
         
         # Create query embedding
-        query_embedding = model.encode(query, convert_to_numpy=True)
+        if query_embedding is None:
+            query_embedding = self.embed_query(query, timings)
+        
+        results = self._vector_results(query_embedding, k * SCORING_CANDIDATES, threshold,
+                                       half_life_days, recency_weight, source_weights, timings, window)
+        if mode == "vector":
+            return results[:k]
         
-        # Reshape to a 2D array if needed
-        if len(query_embedding.shape) == 1:
-            query_embedding = query_embedding.reshape(1, -1)
+        return self._fuse_results(results, keyword_hits, k, query_embedding, timings)
+    
+    def _window_hits(self, keyword_hits, since=None, until=None):
+        """Keyword hits whose chunks lie in the time window [since, until)"""
+        if since is None and until is None:
+            return keyword_hits
+        chunk_map = self.store.get_chunks([chunk_id for chunk_id, _ in keyword_hits])
+        return [(chunk_id, score) for chunk_id, score in keyword_hits
+                if chunk_id in chunk_map and in_window(chunk_map[chunk_id]["timestamp"], since, until)]
+    
+    def _vector_results(self, query_embedding, limit, threshold, half_life_days=None,
+                        recency_weight=None, source_weights=None, timings=None, window=(None, None)):
+        """Vector search candidates above threshold and in the time window, ranked by similarity, recency and source type"""
+        with timed(timings, "faiss"):
+            scores, indices = self._search_vectors(query_embedding, limit)
         
-        # Search the index
-        distances, indices = index.search(query_embedding, k)
+        # Only materialize metadata for the returned hits
+        with timed(timings, "metadata"):
+            chunk_map = self.store.get_chunks([idx for idx in indices if idx != -1])
         
-        # Filter results by threshold and gather metadata
-        results = []
-        max_dist = 2.0  # Approximate max L2 distance for normalization
+        # Filter candidates by threshold and gather metadata
+        candidates = []
+        similarities = []
         
-        for i, (dist, idx) in enumerate(zip(distances[0], indices[0])):
-            # Skip invalid indices
-            if idx == -1 or idx >= len(self.metadata["chunks"]):
+        for score, idx in zip(scores, indices):
+            # Skip invalid indices and tombstoned chunks
+            if idx == -1 or idx not in chunk_map:
                 continue
             
-            # Normalize distance to a similarity score (0-1)
-            # FAISS uses L2 distance, so smaller is better
-            # We invert and normalize to get a similarity score
-            similarity = 1 - (dist / max_dist)
-            
             # Apply threshold
-            if similarity < threshold:
+            if score < threshold:
+                continue
+            if not in_window(chunk_map[idx]["timestamp"], *window):
                 continue
             
-            # Get metadata for this chunk
-            chunk_meta = self.metadata["chunks"][idx]
+            candidates.append(chunk_map[idx])
+            similarities.append(score)
+        
+        if not candidates:
+            return []
+        
+        # Rank all candidates at once by similarity, recency and source type
+        with timed(timings, "rank"):
+            weights = dict(self.source_weights, **(source_weights or {}))
+            types = [source_type(chunk["source"]) for chunk in candidates]
+            ranking = retrieval_scores(
+                similarities,
+                timestamp_ages([chunk["timestamp"] for chunk in candidates]),
+                [weights.get(kind, weights["other"]) for kind in types],
+                half_life_days=self.recency_half_life_days if half_life_days is None else half_life_days,
+                recency_weight=self.recency_weight if recency_weight is None else recency_weight
+            )
             
-            # Add to results
-            results.append({
-                "text": chunk_meta["text"],
-                "source": chunk_meta["source"],
-                "timestamp": chunk_meta["timestamp"],
-                "similarity": similarity,
-                "chunk_id": idx
-            })
+            return [
+                self._result(candidates[i], float(similarities[i]), float(ranking[i]), types[i])
+                for i in np.argsort(-ranking, kind='stable')
+            ]
+    
+    @staticmethod
+    def _result(chunk_meta, similarity, score, kind=None):
+        """Search result dictionary of a chunk"""
+        return {
+            "text": chunk_meta["text"],
+            "source": chunk_meta["source"],
+            "source_type": kind or source_type(chunk_meta["source"]),
+            "timestamp": chunk_meta["timestamp"],
+            "header_path": chunk_meta.get("header_path"),
+            "similarity": similarity,
+            "score": score,
+            "chunk_id": int(chunk_meta["id"])
+        }
+    
+    def _keyword_results(self, keyword_hits, timings=None):
+        """Search results of BM25 hits, scored by BM25"""
+        with timed(timings, "metadata"):
+            chunk_map = self.store.get_chunks([chunk_id for chunk_id, _ in keyword_hits])
+        return [
+            dict(self._result(chunk_map[chunk_id], None, bm25), match="keyword")
+            for chunk_id, bm25 in keyword_hits if chunk_id in chunk_map
+        ]
+    
+    def _fuse_results(self, vector_results, keyword_hits, k, query_embedding, timings=None):
+        """
+        Fuse vector and keyword rankings with reciprocal rank fusion
+        
+        Each result scores sum(1 / (RRF_K + rank)) over the rankings it
+        appears in. Keyword-only results get their cosine similarity from the
+        stored vectors.
+        """
+        fused = {}
+        matches = {}
+        for rank, result in enumerate(vector_results, start=1):
+            key = self._result_key(result)
+            fused[key] = 1.0 / (RRF_K + rank)
+            matches[key] = "vector"
+        for rank, (key, _) in enumerate(keyword_hits, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank)
+            matches[key] = "both" if key in matches else "keyword"
+        
+        top_keys = sorted(fused, key=lambda key: -fused[key])[:k]
+        
+        by_key = {self._result_key(result): result for result in vector_results}
+        keyword_only = [key for key in top_keys if key not in by_key]
+        by_key.update(self._keyword_only_results(keyword_only, query_embedding, timings))
         
+        return [
+            dict(by_key[key], score=fused[key], match=matches[key])
+            for key in top_keys if key in by_key
+        ]
+    
+    @staticmethod
+    def _result_key(result):
+        """Key of a search result in keyword hits"""
+        return result["chunk_id"]
+    
+    def _keyword_only_results(self, chunk_ids, query_embedding, timings=None):
+        """Results of keyword hits missing from the vector results, with their cosine similarity"""
+        with timed(timings, "metadata"):
+            similarities = self._chunk_similarities(chunk_ids, query_embedding)
+        results = {}
+        for result in self._keyword_results([(chunk_id, 0.0) for chunk_id in chunk_ids], timings):
+            result["similarity"] = similarities.get(result["chunk_id"])
+            results[result["chunk_id"]] = result
         return results
     
+    def _chunk_similarities(self, chunk_ids, query_embedding):
+        """Cosine similarities of indexed chunks to a query embedding, for the chunks with a readable vector"""
+        if not chunk_ids or self.index is None:
+            return {}
+        
+        vectors = {}
+        if storage_of(self.index) != "float":
+            for chunk_id, blob in self.store.get_vectors(chunk_ids).items():
+                vectors[chunk_id] = np.frombuffer(blob, dtype='float16').astype('float32')
+        else:
+            for chunk_id in chunk_ids:
+                try:
+                    vectors[chunk_id] = self.index.reconstruct(int(chunk_id))
+                except RuntimeError:
+                    continue
+        
+        query = query_embedding[0]
+        return {chunk_id: float(vector @ query) for chunk_id, vector in vectors.items()}
+    
+    def _search_vectors(self, query_embedding, k):
+        """
+        Nearest chunk ids of one normalized query vector
+        
+        Quantized indexes fetch RERANK_FACTOR candidates per result and
+        re-rank them by exact cosine similarity with their float16 copies.
+        
+        Returns:
+            Tuple of (scores, ids) arrays, best first
+        """
+        lossy = storage_of(self.index) != "float"
+        fetch_k = k * RERANK_FACTOR if lossy else k
+        
+        # Over-fetch while tombstoned vectors can still be returned by the index
+        if self.store.tombstone_count():
+            fetch_k *= 2
+        
+        # Search the index (scores are cosine similarities)
+        scores, indices = self.index.search(query_embedding, fetch_k)
+        scores, indices = scores[0], indices[0]
+        if not lossy:
+            return scores, indices
+        
+        stored = self.store.get_vectors([idx for idx in indices if idx != -1])
+        rows = [row for row, idx in enumerate(indices) if int(idx) in stored]
+        if rows:
+            candidates = np.frombuffer(b"".join(stored[int(indices[row])] for row in rows), dtype='float16')
+            candidates = candidates.reshape(len(rows), -1).astype('float32')
+            scores = scores.copy()
+            scores[rows] = candidates @ query_embedding[0]
+        
+        order = np.argsort(-scores, kind='stable')
+        return scores[order], indices[order]
+    
+    def measure_recall(self, queries=RECALL_QUERIES, k=10, seed=42):
+        """
+        Measure recall@k of search against exact search over float vectors
+        
+        Queries are sampled from the indexed vectors. For quantized storage the
+        float baseline uses the float16 re-rank copies, and recall is reported
+        with and without re-ranking.
+        
+        Returns:
+            Dictionary with recall figures, or None if there is nothing to measure
+        """
+        index = self._load_index(create_if_missing=False)
+        vectors, ids = index_contents(index)
+        tombstoned_ids = self.store.tombstoned_ids()
+        if tombstoned_ids:
+            keep = ~np.isin(ids, np.array(tombstoned_ids, dtype='int64'))
+            vectors, ids = vectors[keep], ids[keep]
+        if len(ids) == 0:
+            return None
+        
+        vectors = self._float_vectors(vectors, ids)
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(len(ids), size=min(queries, len(ids)), replace=False)
+        query_vectors = np.ascontiguousarray(vectors[sample])
+        
+        # Exact float inner-product search is the ground truth
+        k = min(k, len(ids))
+        _, exact = build_index("flat", vectors, ids).search(query_vectors, k)
+        
+        def recall(found):
+            hits = sum(len(set(e) & set(f[:k])) for e, f in zip(exact, found))
+            return hits / (len(exact) * k)
+        
+        _, raw = index.search(query_vectors, k)
+        reranked = [self._search_vectors(query_vectors[i:i + 1], k)[1] for i in range(len(query_vectors))]
+        
+        return {
+            "queries": len(query_vectors),
+            "k": k,
+            "recall": recall(reranked),
+            "recall_without_rerank": recall(raw),
+            "vector_storage": storage_of(index)
+        }
+    
     def index_memory_files(self, days_back=30):
         """Index all memory files from the last N days"""
         indexed_count = 0
         now = datetime.now()
         cutoff_date = now - timedelta(days=days_back)
         
+        # Index curated long-term memory, which is never too old
+        if os.path.exists(MEMORY_MD_PATH):
+            try:
+                indexed_count += self.index_file(
+                    MEMORY_MD_PATH,
+                    "MEMORY.md",
+                    datetime.fromtimestamp(os.path.getmtime(MEMORY_MD_PATH)).isoformat()
+                )
+            except Exception as e:
+                logger.error(f"Error indexing {MEMORY_MD_PATH}: {e}")
+        
         # Index daily memory files
         daily_files = glob.glob(os.path.join(MEMORY_DIR, "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9].md"))
         for file_path in daily_files:
@@ -320,22 +1612,9 @@ class VectorMemoryPipeline:
                 if file_date < cutoff_date:
                     continue
                 
-                # Check if file was modified since last update
-                mod_time = os.path.getmtime(file_path)
-                last_update = self.metadata.get("last_update")
-                
-                if last_update:
-                    last_update_time = datetime.fromisoformat(last_update).timestamp()
-                    if mod_time <= last_update_time:
-                        logger.debug(f"Skipping unmodified file: {file_path}")
-                        continue
-                
-                # Read file and add to index
-                with open(file_path, 'r') as f:
-                    content = f.read()
-                
-                chunks_added = self.add_text(
-                    content,
+                # Only changed chunks of modified files are embedded
+                chunks_added = self.index_file(
+                    file_path,
                     f"memory/{os.path.basename(file_path)}",
                     file_date.isoformat()
                 )
@@ -358,22 +1637,9 @@ class VectorMemoryPipeline:
                 if file_date < cutoff_date:
                     continue
                 
-                # Check if file was modified since last update
-                mod_time = os.path.getmtime(file_path)
-                last_update = self.metadata.get("last_update")
-                
-                if last_update:
-                    last_update_time = datetime.fromisoformat(last_update).timestamp()
-                    if mod_time <= last_update_time:
-                        logger.debug(f"Skipping unmodified file: {file_path}")
-                        continue
-                
-                # Read file and add to index
-                with open(file_path, 'r') as f:
-                    content = f.read()
-                
-                chunks_added = self.add_text(
-                    content,
+                # Only changed chunks of modified files are embedded
+                chunks_added = self.index_file(
+                    file_path,
                     f"memory/hourly-summaries/{filename}",
                     file_date.isoformat()
                 )
@@ -386,145 +1652,181 @@ class VectorMemoryPipeline:
         return indexed_count
     
     def index_session_logs(self, days_back=7):
-        """Index session logs from the last N days"""
-        indexed_count = 0
-        now = datetime.now()
-        cutoff_time = now - timedelta(days=days_back)
+        """
+        Index new session log messages from the last N days
+        
+        Logs are streamed with a SessionLogReader whose per-file offsets are
+        committed with the index, so a log that only grew is read from where
+        the last run stopped and only its new messages are embedded.
+        """
+        if self._session is None:
+            with self.write_session():
+                return self.index_session_logs(days_back)
         
-        # Get session log files
-        log_files = glob.glob(os.path.join(SESSION_LOGS_DIR, "*.json"))
+        indexed_count = 0
+        cutoff_time = (datetime.now() - timedelta(days=days_back)).timestamp()
+        reader = SessionLogReader(self.store.get_meta("session_log_offsets", {}))
         
-        for file_path in log_files:
+        for file_path, status in reader.iter_logs(SESSION_LOGS_DIR, since=cutoff_time):
+            previous_state = reader.state.get(file_path)
             try:
-                # Check file modification time
                 mod_time = os.path.getmtime(file_path)
-                file_time = datetime.fromtimestamp(mod_time)
-                
-                # Skip if older than cutoff
-                if file_time < cutoff_time:
-                    continue
-                
-                # Check if file was modified since last update
-                last_update = self.metadata.get("last_update")
-                if last_update:
-                    last_update_time = datetime.fromisoformat(last_update).timestamp()
-                    if mod_time <= last_update_time:
-                        logger.debug(f"Skipping unmodified log: {file_path}")
-                        continue
+                source = f"session/{os.path.basename(file_path)}"
                 
-                # Read and process session log
-                with open(file_path, 'r') as f:
-                    log_data = json.load(f)
-                
-                if not isinstance(log_data, dict) or 'messages' not in log_data:
-                    logger.warning(f"Skipping invalid log format: {file_path}")
-                    continue
+                chunks = []
+                for msg in reader.iter_messages(file_path, status):
+                    chunks.extend(self._message_chunks(msg, source, mod_time))
                 
-                # Process messages
-                messages = log_data.get('messages', [])
-                for msg in messages:
-                    if 'role' in msg and 'content' in msg:
-                        # Format: "[Role] Content"
-                        formatted_text = f"[{msg['role']}] {msg['content']}"
-                        
-                        # Get timestamp
-                        timestamp = msg.get('timestamp', mod_time)
-                        if isinstance(timestamp, (int, float)):
-                            timestamp = datetime.fromtimestamp(timestamp).isoformat()
-                        
-                        # Add to index
-                        chunks_added = self.add_text(
-                            formatted_text,
-                            f"session/{os.path.basename(file_path)}",
-                            timestamp
-                        )
-                        indexed_count += chunks_added
+                if status == APPENDED:
+                    # Earlier messages are unchanged and already indexed
+                    indexed_count += self._session.add_chunks(self._unindexed_chunks(source, chunks))
+                else:
+                    # New or rewritten logs: keep unchanged messages, replace the rest
+                    indexed_count += self._sync_source(source, chunks)
             
             except Exception as e:
                 logger.error(f"Error indexing session log {file_path}: {e}")
+                # Read the file again next time
+                if previous_state is None:
+                    reader.state.pop(file_path, None)
+                else:
+                    reader.state[file_path] = previous_state
         
+        self.store.set_meta("session_log_offsets", reader.state)
         logger.info(f"Indexed {indexed_count} chunks from session logs")
         return indexed_count
     
-    def run_indexing(self, memory_days=30, session_days=7):
-        """Run a full indexing job for all sources"""
-        start_time = time.time()
+    def _message_chunks(self, msg, source, mod_time):
+        """Chunk one session log message"""
+        if not isinstance(msg, dict) or 'role' not in msg or 'content' not in msg:
+            return []
         
-        # Start by loading the model and index to avoid repetitive loading
-        model = self._load_model()
-        index = self._load_index()
+        # Format: "[Role] Content"
+        formatted_text = f"[{msg['role']}] {msg['content']}"
         
-        # Use batch processing for better performance
-        batch_size = 0
-        max_batch_size = 100  # Maximum chunks to process before saving
+        # Get timestamp
+        timestamp = msg.get('timestamp', mod_time)
+        if isinstance(timestamp, (int, float)):
+            timestamp = datetime.fromtimestamp(timestamp).isoformat()
         
-        # Index memory files with progress tracking
-        logger.info(f"Starting memory file indexing (last {memory_days} days)")
-        memory_chunks = self.index_memory_files(days_back=memory_days)
-        batch_size += memory_chunks
+        return self._create_chunks(formatted_text, source, timestamp)
+    
+    def run_indexing(self, memory_days=30, session_days=7, workers=ENCODE_WORKERS, batch_size=ENCODE_BATCH_SIZE):
+        """
+        Run a full indexing job for all sources
         
-        # Save intermediate results if batch size is reached
-        if batch_size >= max_batch_size:
-            self._save_index()
-            self._save_metadata()
-            batch_size = 0
-            logger.info(f"Saved intermediate indexing results after memory files")
+        Memory files and session logs are read one at a time and their new
+        chunks streamed into a write session. The session buffers enough chunks
+        to keep every worker busy, sorts them by length and encodes them in
+        fixed-size batches on a pool of `workers` processes.
         
-        # Index session logs with progress tracking
-        logger.info(f"Starting session log indexing (last {session_days} days)")
-        session_chunks = self.index_session_logs(days_back=session_days)
-        batch_size += session_chunks
+        Args:
+            memory_days: Days of memory files to index
+            session_days: Days of session logs to index
+            workers: Encoding processes
+            batch_size: Chunks per model batch
+        """
+        start_time = time.time()
+        self.encode_workers = workers
+        self.encode_batch_size = batch_size
+        buffer_chunks = batch_size * max(1, workers) * BUFFERED_BATCHES
         
-        # Final save of index and metadata
-        self._save_index()
-        self._save_metadata()
+        try:
+            # All sources are buffered into one session and committed once at the end
+            with self.write_session(max_chunks=buffer_chunks) as session:
+                # Index memory files with progress tracking
+                logger.info(f"Starting memory file indexing (last {memory_days} days)")
+                memory_chunks = self.index_memory_files(days_back=memory_days)
+                
+                # Index session logs with progress tracking
+                logger.info(f"Starting session log indexing (last {session_days} days)")
+                session_chunks = self.index_session_logs(days_back=session_days)
+        finally:
+            self._stop_encode_pool()
         
         # Log results
         total_chunks = memory_chunks + session_chunks
         elapsed_time = time.time() - start_time
+        chunks_per_second = total_chunks / elapsed_time if elapsed_time > 0 else 0.0
+        embed_chunks_per_second = (session.total_chunks / session.embed_seconds
+                                   if session.embed_seconds > 0 else 0.0)
         
         logger.info(f"Indexing completed: {total_chunks} chunks indexed in {elapsed_time:.2f} seconds")
         logger.info(f"  Memory files: {memory_chunks} chunks")
         logger.info(f"  Session logs: {session_chunks} chunks")
+        logger.info(f"  Embedding batches: {session.flushes} flushes of up to {buffer_chunks} chunks, "
+                    f"{workers} workers x {batch_size} chunks per batch")
+        logger.info(f"  Throughput: {chunks_per_second:.1f} chunks/sec overall, "
+                    f"{embed_chunks_per_second:.1f} chunks/sec embedding")
         
         return {
             "memory_chunks": memory_chunks,
             "session_chunks": session_chunks,
             "total_chunks": total_chunks,
-            "elapsed_time": elapsed_time
+            "elapsed_time": elapsed_time,
+            "chunks_per_second": chunks_per_second,
+            "embed_chunks_per_second": embed_chunks_per_second
         }
     
+    def _index_stats(self):
+        """
+        Size, dimension, type and storage of the index
+        
+        Read from the store, as recorded by the last index save, so stats do
+        not need faiss or the index file. The index is only loaded for stores
+        written before the description was recorded.
+        """
+        index = self.index
+        if index is None:
+            stats = self.store.get_meta("index_stats")
+            if stats is not None:
+                return stats
+            index = self._load_index(create_if_missing=False)
+        return {
+            "ntotal": int(index.ntotal),
+            "dim": int(index.d),
+            "index_type": index_type_of(index),
+            "vector_storage": storage_of(index)
+        }
+    
+    def _last_update(self):
+        """Time of the last committed write, formatted for display"""
+        stored_update = self.store.get_meta("last_update")
+        if not stored_update:
+            return "Never"
+        try:
+            return datetime.fromisoformat(stored_update).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return stored_update
+    
     def get_stats(self):
-        """Get statistics about the vector memory index"""
+        """Get statistics about the vector memory index, without loading the model or index"""
         try:
-            index = self._load_index(create_if_missing=False)
-            index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+            index_stats = self._index_stats()
+            ntotal = index_stats["ntotal"]
+            stamp = self._file_stamp()
+            index_size = stamp[2] if stamp else 0
+            rerank_vectors = self.store.vector_count()
             
             # Group chunks by source
-            sources = {}
-            for chunk in self.metadata["chunks"]:
-                source = chunk["source"]
-                if source not in sources:
-                    sources[source] = 0
-                sources[source] += 1
-            
-            # Format last update time
-            last_update = "Never"
-            if self.metadata.get("last_update"):
-                try:
-                    update_time = datetime.fromisoformat(self.metadata["last_update"])
-                    last_update = update_time.strftime("%Y-%m-%d %H:%M:%S")
-                except:
-                    last_update = self.metadata["last_update"]
+            sources = self.store.source_counts()
             
             return {
-                "total_vectors": index.ntotal if index else 0,
+                "total_vectors": ntotal,
                 "index_size_mb": index_size / (1024 * 1024),
+                "metadata_size_mb": self.store.size_bytes() / (1024 * 1024),
                 "sources": sources,
-                "total_chunks": self.metadata["total_chunks"],
-                "model_name": self.metadata["model_name"],
-                "embedding_dim": self.metadata["embedding_dim"],
-                "last_update": last_update
+                "total_chunks": self.store.count(),
+                "tombstoned_chunks": self.store.tombstone_count(),
+                "model_name": self.store.get_meta("model_name"),
+                "embedding_dim": self.store.get_meta("embedding_dim"),
+                "index_type": index_stats["index_type"],
+                "vector_storage": index_stats["vector_storage"],
+                "bytes_per_vector": index_size / ntotal if ntotal else 0,
+                "rerank_bytes_per_vector": (rerank_vectors * 2 * index_stats["dim"] / ntotal
+                                            if ntotal else 0),
+                "embedding_cache": self.embedding_cache.stats(),
+                "last_update": self._last_update()
             }
         except Exception as e:
             logger.error(f"Error getting stats: {e}")
@@ -533,8 +1835,8 @@ class VectorMemoryPipeline:
                 "total_vectors": 0,
                 "index_size_mb": 0,
                 "sources": {},
-                "total_chunks": self.metadata["total_chunks"],
-                "model_name": self.metadata["model_name"],
+                "total_chunks": self.store.count(),
+                "model_name": self.store.get_meta("model_name"),
                 "last_update": "Error"
             }
     
@@ -544,22 +1846,539 @@ class VectorMemoryPipeline:
             logger.warning("Clear index requires confirmation. Set confirm=True to proceed.")
             return False
         
-        # Reset index
-        model = self._load_model()
-        embedding_size = model.get_sentence_embedding_dimension()
-        self.index = faiss.IndexFlatL2(embedding_size)
+        self._check_writable()
+        with self.write_lock:
+            # Reset index
+            model = self._load_model()
+            embedding_size = model.get_sentence_embedding_dimension()
+            index_type = resolve_index_type(self.index_type, 0)
+            storage = resolve_storage(self._storage_setting(), index_type, 0)
+            self.index = create_index(index_type, embedding_size, storage=storage)
+            
+            # Reset metadata
+            self.store.clear()
+            for key, value in self._create_default_metadata().items():
+                self.store.set_meta(key, value)
+            self.store.set_meta("embedding_dim", embedding_size)
+            self.store.set_meta("vector_storage", self._storage_setting())
+            
+            # Save changes
+            self._persist_index()
         
-        # Reset metadata
-        self.metadata = self._create_default_metadata()
-        self.metadata["embedding_dim"] = embedding_size
+        logger.info("Index and metadata cleared successfully")
+        return True
+
+def group_by_shard(items):
+    """Group ((shard key, chunk id), value) pairs into {shard key: [(chunk id, value)]}"""
+    groups = {}
+    for (key, chunk_id), value in items:
+        groups.setdefault(key, []).append((chunk_id, value))
+    return groups
+
+class ShardedVectorMemoryPipeline(VectorMemoryPipeline):
+    """
+    Vector memory split into shards by month or by source type
+    
+    Every shard is a complete single-index pipeline (FAISS index and chunk
+    store) in its own directory under memory/vectors/shards/<layout>/, so a
+    shard can be compacted, archived or dropped without touching the others.
+    A manifest store next to the shards keeps the indexed file states, the
+    session log offsets, the index generation and the shards holding each
+    source.
+    
+    Chunks are embedded here, in the batches of the write session, and
+    routed to their shards. Searches embed the query once, search the
+    selected shards in parallel and merge their ranked candidates with a
+    heap. A time window skips the month shards outside it without opening
+    them.
+    """
+    
+    def __init__(self, shard_by="month", model_name=MODEL_NAME, shard_dir=SHARD_DIR,
+                 archive_dir=SHARD_ARCHIVE_DIR, index_type=INDEX_TYPE, embedding_cache=None,
+                 vector_storage=None, search_workers=SHARD_SEARCH_WORKERS, read_only=False):
+        if shard_by not in SHARD_LAYOUTS:
+            raise ValueError(f"Unknown shard layout: {shard_by}")
+        self.shard_by = shard_by
+        self.shard_dir = os.path.join(shard_dir, shard_by)
+        self.archive_dir = os.path.join(archive_dir, shard_by)
+        os.makedirs(self.shard_dir, exist_ok=True)
+        super().__init__(model_name=model_name, index_path=None,
+                         metadata_path=os.path.join(self.shard_dir, "manifest.db"),
+                         index_type=index_type, embedding_cache=embedding_cache,
+                         vector_storage=vector_storage, read_only=read_only)
+        self.search_workers = search_workers
+        self._shards = {}  # Open shard pipelines by key
+        self._dirty_shards = set()  # Shards written by the active write session
+        self._source_shard_map = None  # Source -> shard keys, loaded on demand
+        self._executor = None  # Shard search threads, started on demand
+        self._loaded_generation = self.index_generation()
+    
+    def _file_stamp(self):
+        """Shards have their own index files, changes show in the generation"""
+        return None
+    
+    def shard_keys(self):
+        """Keys of the active shards, in order"""
+        return sorted(name for name in os.listdir(self.shard_dir)
+                      if os.path.isdir(os.path.join(self.shard_dir, name)))
+    
+    def archived_shard_keys(self):
+        """Keys of the archived shards, in order"""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        return sorted(name for name in os.listdir(self.archive_dir)
+                      if os.path.isdir(os.path.join(self.archive_dir, name)))
+    
+    def _shard(self, key, create=False):
+        """Pipeline of an active shard, None if it does not exist and create is False"""
+        shard = self._shards.get(key)
+        if shard is None:
+            path = os.path.join(self.shard_dir, key)
+            if not os.path.isdir(path):
+                if not create:
+                    return None
+                os.makedirs(path)
+            shard = VectorMemoryPipeline(
+                model_name=self.model_name,
+                index_path=os.path.join(path, "memory.index"),
+                metadata_path=os.path.join(path, "metadata.db"),
+                index_type=self.index_type,
+                embedding_cache=self.embedding_cache,
+                vector_storage=self.vector_storage,
+                read_only=self.read_only
+            )
+            # New shard indexes get their dimension from the shared model
+            shard._load_model = self._load_model
+            self._shards[key] = shard
+        return shard
+    
+    def _close_shard(self, key):
+        """Forget an open shard and close its store"""
+        shard = self._shards.pop(key, None)
+        if shard is not None:
+            shard.store.close()
+    
+    @staticmethod
+    def _load_shard(shard):
+        """Load the index of a shard, False if it has none yet"""
+        try:
+            shard._load_index(create_if_missing=False)
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def _load_index(self, create_if_missing=True):
+        """
+        Load the indexes of all active shards
         
-        # Save changes
-        self._save_index()
+        Shard indexes are created when chunks are first added to them.
+        
+        Returns:
+            Keys of the loaded shards
+        """
+        loaded = [key for key in self.shard_keys() if self._load_shard(self._shard(key))]
+        if not loaded:
+            raise FileNotFoundError(f"No shard indexes found in {self.shard_dir}")
+        return loaded
+    
+    def _source_shards(self):
+        """Source -> keys of the shards holding its chunks"""
+        if self._source_shard_map is None:
+            self._source_shard_map = self.store.get_meta("source_shards", {})
+        return self._source_shard_map
+    
+    def _add_chunks(self, chunks, embeddings=None):
+        """Embed chunks in one batch and add them to their shards; archived shards are left untouched"""
+        if embeddings is None:
+            embeddings = self._encode([chunk["text"] for chunk in chunks])
+        
+        rows_by_key = {}
+        for row, chunk in enumerate(chunks):
+            rows_by_key.setdefault(shard_key(chunk, self.shard_by), []).append(row)
+        
+        source_shards = self._source_shards()
+        added = 0
+        for key, rows in rows_by_key.items():
+            if os.path.isdir(os.path.join(self.archive_dir, key)):
+                logger.debug(f"Skipping {len(rows)} chunks of archived shard {key}")
+                continue
+            
+            shard_chunks = [chunks[row] for row in rows]
+            added += self._shard(key, create=True)._add_chunks(shard_chunks, embeddings[rows])
+            self._dirty_shards.add(key)
+            for chunk in shard_chunks:
+                keys = source_shards.setdefault(chunk["source"], [])
+                if key not in keys:
+                    keys.append(key)
+        return added
+    
+    def _sync_source(self, source, chunks):
+        """
+        Replace the indexed chunks of a source with chunks, embedding only the difference
+        
+        New chunks are compared with the indexed chunks of their own shard,
+        and leftovers are removed from every shard holding the source.
+        
+        Returns:
+            Number of chunks queued for embedding
+        """
+        chunks_by_key = {}
+        for chunk in chunks:
+            chunks_by_key.setdefault(shard_key(chunk, self.shard_by), []).append(chunk)
+        
+        new_chunks = []
+        stale_count = 0
+        for key in set(chunks_by_key) | set(self._source_shards().get(source, [])):
+            shard_chunks = chunks_by_key.get(key, [])
+            shard = self._shard(key)
+            if shard is None:
+                new_chunks.extend(shard_chunks)
+                continue
+            
+            new, stale_ids = shard._diff_source(source, shard_chunks)
+            if stale_ids:
+                shard._remove_chunks(stale_ids)
+                self._dirty_shards.add(key)
+                stale_count += len(stale_ids)
+            new_chunks.extend(new)
+        
+        self._session.removed_chunks += stale_count
+        if new_chunks or stale_count:
+            logger.debug(f"{source}: {len(new_chunks)} new, {stale_count} stale, "
+                         f"{len(chunks) - len(new_chunks)} unchanged chunks")
+        return self._session.add_chunks(new_chunks)
+    
+    def _unindexed_chunks(self, source, chunks):
+        """Chunks appended to a source that are not indexed for it in their own shard yet"""
+        chunks_by_key = {}
+        for chunk in chunks:
+            chunks_by_key.setdefault(shard_key(chunk, self.shard_by), []).append(chunk)
+        
+        new_chunks = []
+        for key, shard_chunks in chunks_by_key.items():
+            shard = self._shard(key)
+            new_chunks.extend(shard._diff_source(source, shard_chunks)[0] if shard else shard_chunks)
+        return new_chunks
+    
+    def _commit_index(self, started_at):
+        """
+        Commit the shards written by a write session, then the manifest
+        
+        A crash in between leaves the manifest's file states and session log
+        offsets behind the shards; the next run diffs what it reads again by
+        content hash, so nothing is indexed twice.
+        """
+        for key in sorted(self._dirty_shards):
+            self._shards[key]._commit_index(started_at)
+        self._dirty_shards.clear()
+        
+        self.store.set_meta("source_shards", self._source_shards())
+        self.store.set_meta("vector_storage", self._storage_setting())
+        self.store.set_meta("last_update", started_at.isoformat())
+        self._bump_generation()
         self._save_metadata()
+        self._loaded_generation = self.index_generation()
+    
+    def _discard_changes(self, changed=True):
+        """Restore the on-disk state of the shards and manifest after a rollback"""
+        for key in self._dirty_shards:
+            self._shards[key]._discard_changes()
+        self._dirty_shards.clear()
+        self._source_shard_map = None
+        self.store.rollback()
+    
+    def reload_if_changed(self):
+        """
+        Pick up shards written, compacted or archived by other processes
         
-        logger.info("Index and metadata cleared successfully")
+        Returns:
+            True if the shards changed
+        """
+        if self._session is not None:
+            return False
+        
+        generation = self.index_generation()
+        if generation == self._loaded_generation:
+            return False
+        
+        logger.info("Shards changed on disk, reloading")
+        self._loaded_generation = generation
+        self._source_shard_map = None
+        for key, shard in list(self._shards.items()):
+            if os.path.isdir(os.path.join(self.shard_dir, key)):
+                shard.reload_if_changed()
+            else:
+                self._close_shard(key)
+        return True
+    
+    def _search_shards(self, since=None, until=None):
+        """(key, shard) of the active shards that can hold chunks of the time window"""
+        keys = self.shard_keys()
+        if self.shard_by == "month" and (since is not None or until is not None):
+            keys = [key for key in keys if key != UNDATED_SHARD and
+                    (since is None or key >= since[:7]) and (until is None or key <= until[:7])]
+        return [(key, self._shard(key)) for key in keys]
+    
+    def _map_shards(self, fn, shards):
+        """fn(key, shard) for every (key, shard), run on the search threads when there are several"""
+        if len(shards) < 2 or self.search_workers < 2:
+            return [fn(key, shard) for key, shard in shards]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.search_workers,
+                                                thread_name_prefix="vector-shard")
+        return list(self._executor.map(lambda item: fn(*item), shards))
+    
+    def search(self, query, k=5, threshold=0.5, half_life_days=None, recency_weight=None, source_weights=None,
+               query_embedding=None, mode=None, timings=None, since=None, until=None):
+        """
+        Search the shards for the most relevant chunks to the query
+        
+        Takes the arguments of VectorMemoryPipeline.search. Every selected
+        shard returns its best keyword and vector candidates, which are merged
+        by score with a heap before ranks are fused, so results rank as in a
+        single index. Results carry the key of their shard in "shard"; stage
+        timings are wall times of the parallel shard searches.
+        """
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        window = (window_bound(since), window_bound(until))
+        shards = self._search_shards(*window)
+        limit = k * SCORING_CANDIDATES
+        
+        keyword_hits = []
+        if mode != "vector":
+            def shard_hits(key, shard):
+                hits = shard._window_hits(shard.store.keyword_search(query, limit=limit), *window)
+                return [((key, chunk_id), score) for chunk_id, score in hits]
+            
+            with timed(timings, "keyword"):
+                keyword_hits = list(islice(heapq.merge(*self._map_shards(shard_hits, shards),
+                                                       key=lambda hit: -hit[1]), limit))
+            if mode == "keyword" or (query_embedding is None and keyword_hits and is_identifier_query(query)):
+                return self._keyword_results(keyword_hits[:k], timings)
+        
+        with timed(timings, "index_load"):
+            loaded = self._map_shards(lambda key, shard: self._load_shard(shard), shards)
+            shards = [item for item, has_index in zip(shards, loaded) if has_index]
+        if not shards:
+            logger.error("No index found for search")
+            return self._keyword_results(keyword_hits[:k], timings)
+        
+        if query_embedding is None:
+            query_embedding = self.embed_query(query, timings)
+        
+        # Shards rank with the settings of this pipeline
+        half_life_days = self.recency_half_life_days if half_life_days is None else half_life_days
+        recency_weight = self.recency_weight if recency_weight is None else recency_weight
+        source_weights = dict(self.source_weights, **(source_weights or {}))
+        
+        def shard_results(key, shard):
+            results = shard._vector_results(query_embedding, limit, threshold, half_life_days,
+                                            recency_weight, source_weights, window=window)
+            for result in results:
+                result["shard"] = key
+            return results
+        
+        with timed(timings, "faiss"):
+            ranked = self._map_shards(shard_results, shards)
+        with timed(timings, "rank"):
+            results = list(islice(heapq.merge(*ranked, key=lambda result: -result["score"]), limit))
+        if mode == "vector":
+            return results[:k]
+        
+        return self._fuse_results(results, keyword_hits, k, query_embedding, timings)
+    
+    @staticmethod
+    def _result_key(result):
+        """Key of a search result in keyword hits"""
+        return (result["shard"], result["chunk_id"])
+    
+    def _keyword_results(self, keyword_hits, timings=None):
+        """Search results of BM25 hits keyed by (shard, chunk id), in hit order"""
+        by_key = {}
+        for key, hits in group_by_shard(keyword_hits).items():
+            for result in self._shard(key)._keyword_results(hits, timings):
+                by_key[(key, result["chunk_id"])] = dict(result, shard=key)
+        return [by_key[hit_key] for hit_key, _ in keyword_hits if hit_key in by_key]
+    
+    def _keyword_only_results(self, keys, query_embedding, timings=None):
+        """Results of keyword hits missing from the vector results, with their cosine similarity"""
+        results = {}
+        for key, hits in group_by_shard((hit_key, None) for hit_key in keys).items():
+            shard_results = self._shard(key)._keyword_only_results(
+                [chunk_id for chunk_id, _ in hits], query_embedding, timings)
+            for chunk_id, result in shard_results.items():
+                results[(key, chunk_id)] = dict(result, shard=key)
+        return results
+    
+    def measure_recall(self, queries=RECALL_QUERIES, k=10, seed=42):
+        """Recall@k of search within every shard against exact search within it, over all sampled queries"""
+        figures = []
+        for key in self.shard_keys():
+            shard = self._shard(key)
+            if self._load_shard(shard):
+                recall = shard.measure_recall(queries=queries, k=k, seed=seed)
+                if recall:
+                    figures.append(recall)
+        if not figures:
+            return None
+        
+        total = sum(recall["queries"] for recall in figures)
+        return {
+            "queries": total,
+            "k": k,
+            "recall": sum(recall["recall"] * recall["queries"] for recall in figures) / total,
+            "recall_without_rerank": sum(recall["recall_without_rerank"] * recall["queries"]
+                                         for recall in figures) / total,
+            "vector_storage": ", ".join(sorted({recall["vector_storage"] for recall in figures}))
+        }
+    
+    def get_stats(self):
+        """Combined statistics of all shards, with the figures of each shard in the shards entry"""
+        shards = {}
+        for key in self.shard_keys():
+            stats = self._shard(key).get_stats()
+            if "error" not in stats:
+                shards[key] = stats
+        
+        total_vectors = sum(stats["total_vectors"] for stats in shards.values())
+        index_size_mb = sum(stats["index_size_mb"] for stats in shards.values())
+        sources = {}
+        for stats in shards.values():
+            for source, count in stats["sources"].items():
+                sources[source] = sources.get(source, 0) + count
+        
+        return {
+            "total_vectors": total_vectors,
+            "index_size_mb": index_size_mb,
+            "metadata_size_mb": (sum(stats["metadata_size_mb"] for stats in shards.values()) +
+                                 self.store.size_bytes() / (1024 * 1024)),
+            "sources": sources,
+            "total_chunks": sum(stats["total_chunks"] for stats in shards.values()),
+            "tombstoned_chunks": sum(stats["tombstoned_chunks"] for stats in shards.values()),
+            "model_name": self.store.get_meta("model_name"),
+            "embedding_dim": self.store.get_meta("embedding_dim"),
+            "index_type": ", ".join(sorted({stats["index_type"] for stats in shards.values()})) or "none",
+            "vector_storage": ", ".join(sorted({stats["vector_storage"] for stats in shards.values()})) or "none",
+            "bytes_per_vector": index_size_mb * 1024 * 1024 / total_vectors if total_vectors else 0,
+            "rerank_bytes_per_vector": (sum(stats["rerank_bytes_per_vector"] * stats["total_vectors"]
+                                            for stats in shards.values()) / total_vectors
+                                        if total_vectors else 0),
+            "embedding_cache": self.embedding_cache.stats(),
+            "last_update": self._last_update(),
+            "shard_by": self.shard_by,
+            "shards": {
+                key: {
+                    "total_vectors": stats["total_vectors"],
+                    "total_chunks": stats["total_chunks"],
+                    "index_size_mb": stats["index_size_mb"],
+                    "index_type": stats["index_type"],
+                    "vector_storage": stats["vector_storage"],
+                    "last_update": stats["last_update"]
+                }
+                for key, stats in shards.items()
+            },
+            "archived_shards": self.archived_shard_keys()
+        }
+    
+    def compact_shard(self, key):
+        """
+        Rebuild a shard without its tombstoned vectors, as the index type
+        suited to its live vectors, so a shard that shrank can drop back to
+        a flat index
+        
+        Returns:
+            True if the shard was rebuilt
+        """
+        self._check_writable()
+        with self.write_lock:
+            # Rebuild from what the previous writer committed
+            shard = self._shard(key)
+            if shard is not None:
+                shard.reload_if_changed()
+            if shard is None or not self._load_shard(shard):
+                logger.warning(f"No index for shard {key}")
+                return False
+            
+            start_time = time.time()
+            live_vectors = shard.index.ntotal - shard.store.tombstone_count()
+            shard._rebuild_index(resolve_index_type(shard.index_type, live_vectors))
+            shard.store.set_meta("vector_storage", shard._storage_setting())
+            shard._persist_index()
+            
+            self._bump_generation()
+            self._save_metadata()
+        logger.info(f"Compacted shard {key} to {live_vectors} vectors in {time.time() - start_time:.2f} seconds")
+        return True
+    
+    def _move_shard(self, key, from_dir, to_dir):
+        """Move a shard directory, returns True if it was moved"""
+        source_path = os.path.join(from_dir, key)
+        target_path = os.path.join(to_dir, key)
+        self._check_writable()
+        with self.write_lock:
+            if not os.path.isdir(source_path) or os.path.exists(target_path):
+                logger.warning(f"Cannot move shard {key} from {from_dir} to {to_dir}")
+                return False
+            
+            self._close_shard(key)
+            os.makedirs(to_dir, exist_ok=True)
+            os.replace(source_path, target_path)
+            self._bump_generation()
+            self._save_metadata()
+        logger.info(f"Moved shard {key} to {to_dir}")
+        return True
+    
+    def archive_shard(self, key):
+        """Move a shard to the archive, out of searches; indexing leaves archived shards untouched"""
+        return self._move_shard(key, self.shard_dir, self.archive_dir)
+    
+    def restore_shard(self, key):
+        """Move an archived shard back into searches"""
+        return self._move_shard(key, self.archive_dir, self.shard_dir)
+    
+    def archive_shards_before(self, month):
+        """
+        Archive the month shards older than month ("YYYY-MM")
+        
+        Returns:
+            Keys of the archived shards
+        """
+        if self.shard_by != "month":
+            raise ValueError("Only month shards can be archived by age")
+        return [key for key in self.shard_keys()
+                if key != UNDATED_SHARD and key < month and self.archive_shard(key)]
+    
+    def clear_index(self, confirm=False):
+        """Drop every active shard and reset the manifest, archived shards are kept"""
+        if not confirm:
+            logger.warning("Clear index requires confirmation. Set confirm=True to proceed.")
+            return False
+        
+        self._check_writable()
+        with self.write_lock:
+            for key in self.shard_keys():
+                self._close_shard(key)
+                shutil.rmtree(os.path.join(self.shard_dir, key))
+            
+            self.store.clear()
+            for key, value in self._create_default_metadata().items():
+                self.store.set_meta(key, value)
+            self.store.set_meta("source_shards", {})
+            self._source_shard_map = None
+            self._bump_generation()
+            self._save_metadata()
+        
+        logger.info("Shards and manifest cleared successfully")
         return True
 
+def create_pipeline(shard_by=SHARD_BY, **kwargs):
+    """Vector memory pipeline with a single index, or one sharded by month or source type"""
+    if shard_by:
+        return ShardedVectorMemoryPipeline(shard_by=shard_by, **kwargs)
+    return VectorMemoryPipeline(**kwargs)
+
 def setup_cron_job():
     """Set up daily cron job for the vector memory indexer"""
     import subprocess
@@ -593,39 +2412,90 @@ def main():
     group.add_argument("--add", type=str, help="Add text from file to index")
     group.add_argument("--setup-cron", action="store_true", help="Set up daily cron job")
     group.add_argument("--clear", action="store_true", help="Clear the entire index")
+    group.add_argument("--compact-shard", metavar="KEY", help="Rebuild a shard without its deleted vectors")
+    group.add_argument("--archive-shard", metavar="KEY", help="Move a shard out of searches and indexing")
+    group.add_argument("--archive-before", metavar="YYYY-MM", help="Archive the month shards older than a month")
+    group.add_argument("--restore-shard", metavar="KEY", help="Move an archived shard back into searches")
     
     parser.add_argument("--memory-days", type=int, default=30, help="Days of memory files to index")
     parser.add_argument("--session-days", type=int, default=7, help="Days of session logs to index")
     parser.add_argument("--results", type=int, default=5, help="Number of search results")
-    parser.add_argument("--threshold", type=float, default=0.5, help="Search similarity threshold (0-1)")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Search cosine similarity threshold (0-1)")
+    parser.add_argument("--index-type", choices=["auto", "flat", "hnsw", "ivfpq"], default=INDEX_TYPE,
+                        help="Index structure (auto picks by corpus size)")
+    parser.add_argument("--half-life", type=float, default=RECENCY_HALF_LIFE_DAYS,
+                        help="Search recency half-life in days (0 ranks by similarity and source type only)")
+    parser.add_argument("--recency-weight", type=float, default=RECENCY_WEIGHT,
+                        help="Share of the search score that decays with age (0-1)")
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="hybrid",
+                        help="Search by embedding, BM25 keywords or a fusion of both")
+    parser.add_argument("--since", help="Only search chunks from this date on (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Only search chunks before this date (YYYY-MM-DD)")
+    parser.add_argument("--shard-by", choices=SHARD_LAYOUTS, default=SHARD_BY,
+                        help="Keep one index per month or per source type (default: a single index)")
+    parser.add_argument("--storage", choices=["float", "sq8", "pq"], default=None,
+                        help="Vector storage: float, int8 scalar or product quantized codes "
+                             "(default: keep the current storage)")
+    parser.add_argument("--recall-queries", type=int, nargs="?", const=RECALL_QUERIES, default=0,
+                        help=f"Also measure recall with --stats on this many sampled queries "
+                             f"(default {RECALL_QUERIES}, loads faiss and the index)")
+    parser.add_argument("--workers", type=int, default=ENCODE_WORKERS, help="Encoding processes for indexing")
+    parser.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE, help="Chunks per embedding batch")
+    parser.add_argument("--chunker", choices=CHUNKERS, default=CHUNKER,
+                        help="Chunk by markdown structure or into fixed overlapping windows "
+                             "(switching re-chunks files on the next --index)")
     parser.add_argument("--confirm", action="store_true", help="Confirm destructive operations")
     
     args = parser.parse_args()
     
-    pipeline = VectorMemoryPipeline()
+    shard_commands = (args.compact_shard, args.archive_shard, args.archive_before, args.restore_shard)
+    if any(shard_commands) and not args.shard_by:
+        print("Error: Shard commands need --shard-by")
+        return
+    
+    # Searches and stats only read, so they memory-map the committed index
+    pipeline = create_pipeline(args.shard_by, index_type=args.index_type, vector_storage=args.storage,
+                               read_only=bool(args.search or args.stats))
+    pipeline.chunker = args.chunker
     
     if args.index:
         results = pipeline.run_indexing(
             memory_days=args.memory_days,
-            session_days=args.session_days
+            session_days=args.session_days,
+            workers=args.workers,
+            batch_size=args.batch_size
         )
         print(f"Indexed {results['total_chunks']} chunks in {results['elapsed_time']:.2f} seconds")
         print(f"  Memory files: {results['memory_chunks']} chunks")
         print(f"  Session logs: {results['session_chunks']} chunks")
+        print(f"  Throughput: {results['chunks_per_second']:.1f} chunks/sec "
+              f"({results['embed_chunks_per_second']:.1f} chunks/sec embedding)")
     
     elif args.search:
+        timings = {}
         results = pipeline.search(
             args.search,
             k=args.results,
-            threshold=args.threshold
+            threshold=args.threshold,
+            half_life_days=args.half_life,
+            recency_weight=args.recency_weight,
+            mode=args.mode,
+            timings=timings,
+            since=args.since,
+            until=args.until
         )
         
-        print(f"\nSearch results for: '{args.search}'\n")
+        print(f"\nSearch results for: '{args.search}'")
+        print("(" + ", ".join(f"{stage} {ms:.1f}ms" for stage, ms in timings.items()) + ")\n")
         if not results:
             print("No results found")
         else:
             for i, result in enumerate(results):
-                print(f"{i+1}. [{result['similarity']:.2f}] {result['source']}")
+                similarity = result['similarity']
+                similarity = "n/a" if similarity is None else f"{similarity:.2f}"
+                print(f"{i+1}. [{result['score']:.3f}, similarity {similarity}, "
+                      f"{result.get('match', 'vector')}] {result['source']}"
+                      + (f" (shard {result['shard']})" if 'shard' in result else ""))
                 print(f"   {result['text'][:100]}...")
                 print()
     
@@ -634,11 +2504,37 @@ def main():
         print("\nVector Memory Index Statistics:\n")
         print(f"Total vectors: {stats['total_vectors']}")
         print(f"Index size: {stats['index_size_mb']:.2f} MB")
+        print(f"Metadata size: {stats['metadata_size_mb']:.2f} MB")
         print(f"Model: {stats['model_name']} ({stats['embedding_dim']} dimensions)")
+        print(f"Index type: {stats['index_type']} ({stats['vector_storage']} vectors)")
+        print(f"Bytes per vector: {stats['bytes_per_vector']:.0f} in the index"
+              + (f", {stats['rerank_bytes_per_vector']:.0f} float16 re-rank bytes in the store"
+                 if stats['rerank_bytes_per_vector'] else ""))
+        print(f"Tombstoned chunks: {stats['tombstoned_chunks']}")
+        cache_stats = stats['embedding_cache']
+        print(f"Embedding cache: {cache_stats['entries']}/{cache_stats['capacity']} vectors, "
+              f"{cache_stats['total_hit_rate']:.1%} hit rate "
+              f"({cache_stats['total_hits']} hits, {cache_stats['total_misses']} misses)")
         print(f"Last update: {stats['last_update']}")
         print("\nSources:")
         for source, count in sorted(stats['sources'].items(), key=lambda x: x[1], reverse=True):
             print(f"  {source}: {count} chunks")
+        
+        if 'shards' in stats:
+            print(f"\nShards by {stats['shard_by']}:")
+            for key, shard in stats['shards'].items():
+                print(f"  {key}: {shard['total_vectors']} vectors, {shard['index_size_mb']:.2f} MB, "
+                      f"{shard['index_type']} ({shard['vector_storage']}), updated {shard['last_update']}")
+            if stats['archived_shards']:
+                print(f"Archived: {', '.join(stats['archived_shards'])}")
+        
+        if args.recall_queries > 0 and stats['total_vectors']:
+            recall = pipeline.measure_recall(queries=args.recall_queries, k=args.results)
+            if recall:
+                print(f"\nRecall@{recall['k']} vs exact float search ({recall['queries']} queries): "
+                      f"{recall['recall']:.3f}"
+                      + (f" ({recall['recall_without_rerank']:.3f} without re-ranking)"
+                         if recall['vector_storage'] != "float" else ""))
     
     elif args.add:
         if not os.path.exists(args.add):
@@ -669,6 +2565,28 @@ def main():
             print("Index cleared successfully")
         else:
             print("Failed to clear index")
+    
+    elif args.compact_shard:
+        if pipeline.compact_shard(args.compact_shard):
+            print(f"Compacted shard {args.compact_shard}")
+        else:
+            print(f"No index for shard {args.compact_shard}")
+    
+    elif args.archive_shard:
+        if pipeline.archive_shard(args.archive_shard):
+            print(f"Archived shard {args.archive_shard}")
+        else:
+            print(f"Could not archive shard {args.archive_shard}")
+    
+    elif args.archive_before:
+        archived = pipeline.archive_shards_before(args.archive_before)
+        print(f"Archived {len(archived)} shards" + (f": {', '.join(archived)}" if archived else ""))
+    
+    elif args.restore_shard:
+        if pipeline.restore_shard(args.restore_shard):
+            print(f"Restored shard {args.restore_shard}")
+        else:
+            print(f"Could not restore shard {args.restore_shard}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
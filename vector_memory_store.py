@@ -0,0 +1,527 @@
+"""
+Vector Memory Store - Context Retention System Component 3
+
+SQLite-backed chunk metadata store for the Vector Memory Pipeline.
+
+Chunks are stored one row per FAISS id, with source paths interned in a
+separate table, so lookups for search hits only materialize the text of the
+returned rows. The database is opened lazily on first use and runs in WAL
+mode, so search processes can read while an indexing run is writing.
+
+Per-file and per-chunk content hashes are tracked so that reindexing only
+embeds chunks that changed. Files also record the chunker they were chunked
+with, and chunks the markdown header path they sit under. Chunks whose
+vectors cannot be removed from the index (HNSW) are tombstoned and skipped
+by lookups until the index is rebuilt.
+
+Indexes that keep quantized codes (int8 scalar or product quantization) keep
+a float16 copy of every vector in a separate table, read back only for the
+candidates of a search to re-rank them with exact similarities.
+
+Chunk text is also indexed in an SQLite FTS5 table, kept in sync by triggers,
+for BM25 keyword search. Underscores and hyphens are part of tokens, so
+identifiers like task_1770444660_3676 match as a whole.
+
+A legacy metadata.json file is migrated into the store the first time it
+is opened.
+"""
+
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import logging
+from datetime import datetime
+
+logger = logging.getLogger('vector-memory')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    timestamp TEXT,
+    start INTEGER,
+    end INTEGER,
+    text TEXT NOT NULL,
+    content_hash TEXT,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    header_path TEXT
+);
+CREATE INDEX IF NOT EXISTS chunks_source ON chunks(source_id);
+CREATE TABLE IF NOT EXISTS vectors (
+    id INTEGER PRIMARY KEY,
+    vector BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    source TEXT PRIMARY KEY,
+    content_hash TEXT,
+    mtime REAL,
+    size INTEGER,
+    indexed_at TEXT,
+    chunker TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Columns added after the first release of the store, by table
+MIGRATIONS = {
+    "chunks": {
+        "content_hash": "ALTER TABLE chunks ADD COLUMN content_hash TEXT",
+        "deleted": "ALTER TABLE chunks ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0",
+        "header_path": "ALTER TABLE chunks ADD COLUMN header_path TEXT",
+    },
+    "files": {
+        "chunker": "ALTER TABLE files ADD COLUMN chunker TEXT",
+    },
+}
+
+# Keyword index over chunk text, maintained by triggers on the chunks table
+KEYWORD_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+    text, content='chunks', content_rowid='id', tokenize="unicode61 tokenchars '_-'"
+);
+CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+# Query terms: words, identifiers with _ and -, and dotted names like vector-memory.py
+TERM_PATTERN = re.compile(r"[\w\-]+(?:\.[\w\-]+)*")
+
+CHUNK_COLUMNS = "c.id, c.text, s.name, c.timestamp, c.start, c.end, c.content_hash, c.header_path"
+
+def chunk_hash(text):
+    """Content hash used to recognize unchanged files and chunks"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def _chunk_from_row(row):
+    return {
+        "id": row[0],
+        "text": row[1],
+        "source": row[2],
+        "timestamp": row[3],
+        "start": row[4],
+        "end": row[5],
+        "content_hash": row[6],
+        "header_path": row[7]
+    }
+
+class ChunkStore:
+    """Chunk metadata keyed by FAISS id"""
+
+    def __init__(self, path, legacy_json_path=None, defaults=None):
+        """
+        Args:
+            path: SQLite database path
+            legacy_json_path: metadata.json to migrate from if the store is new
+            defaults: Meta values written when the store is created
+        """
+        self.path = path
+        self.legacy_json_path = legacy_json_path
+        self.defaults = defaults or {}
+        self._conn = None
+        self._source_ids = {}  # Interned source name -> id
+        self.keyword_index = False  # Whether SQLite has FTS5, known once opened
+
+    @property
+    def conn(self):
+        """Open the database on first use"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._migrate_schema()
+            self._conn.executescript(SCHEMA)
+            self._create_keyword_index()
+
+            if self.get_meta("created") is None:
+                self._initialize()
+        return self._conn
+
+    def _migrate_schema(self):
+        """Add columns missing from stores created by older versions"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if not columns:
+            return
+        for table, migrations in MIGRATIONS.items():
+            table_columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for column, statement in migrations.items():
+                if table_columns and column not in table_columns:
+                    self._conn.execute(statement)
+
+        if "content_hash" not in columns:
+            rows = self._conn.execute("SELECT id, text FROM chunks").fetchall()
+            self._conn.executemany(
+                "UPDATE chunks SET content_hash = ? WHERE id = ?",
+                [(chunk_hash(text), chunk_id) for chunk_id, text in rows]
+            )
+        self._conn.commit()
+
+    def _create_keyword_index(self):
+        """Create the FTS5 keyword index, indexing existing chunks the first time"""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'"
+        ).fetchone() is not None
+        try:
+            self._conn.executescript(KEYWORD_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Keyword search unavailable, SQLite lacks FTS5: {e}")
+            return
+
+        self.keyword_index = True
+        if not exists:
+            self._conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+            self._conn.commit()
+
+    def _initialize(self):
+        """Write default meta values and migrate legacy JSON metadata"""
+        for key, value in self.defaults.items():
+            self.set_meta(key, value)
+        self.set_meta("created", datetime.now().isoformat())
+
+        if self.legacy_json_path and os.path.exists(self.legacy_json_path):
+            self._migrate_json(self.legacy_json_path)
+
+        self.commit()
+
+    def _migrate_json(self, json_path):
+        """Import chunks and meta values from a metadata.json file"""
+        try:
+            with open(json_path, 'r') as f:
+                metadata = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Error reading legacy metadata {json_path}: {e}")
+            return
+
+        chunks = metadata.get("chunks", [])
+        self.add_chunks(chunks, start_id=0)
+
+        for key in ("last_update", "model_name", "embedding_dim", "chunk_size", "chunk_overlap"):
+            if metadata.get(key) is not None:
+                self.set_meta(key, metadata[key])
+
+        os.replace(json_path, json_path + ".migrated")
+        logger.info(f"Migrated {len(chunks)} chunks from {json_path}")
+
+    def close(self):
+        """Close the database connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def commit(self):
+        """Commit pending writes"""
+        if self._conn is not None:
+            self._conn.commit()
+
+    def rollback(self):
+        """Discard uncommitted writes"""
+        if self._conn is not None:
+            self._conn.rollback()
+            self._source_ids = {}
+
+    def get_meta(self, key, default=None):
+        """Get a meta value"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        """Set a meta value (committed with the next commit)"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value))
+        )
+
+    def _source_id(self, name):
+        """Intern a source name"""
+        source_id = self._source_ids.get(name)
+        if source_id is None:
+            self.conn.execute("INSERT OR IGNORE INTO sources (name) VALUES (?)", (name,))
+            source_id = self.conn.execute(
+                "SELECT id FROM sources WHERE name = ?", (name,)
+            ).fetchone()[0]
+            self._source_ids[name] = source_id
+        return source_id
+
+    def next_id(self):
+        """Next free chunk id (ids are never reused)"""
+        row = self.conn.execute("SELECT MAX(id) FROM chunks").fetchone()
+        max_id = -1 if row[0] is None else row[0]
+        return max(max_id + 1, self.get_meta("next_id", 0))
+
+    def allocate_ids(self, count):
+        """Reserve count consecutive chunk ids"""
+        start_id = self.next_id()
+        self.set_meta("next_id", start_id + count)
+        return list(range(start_id, start_id + count))
+
+    def count(self):
+        """Number of live (not tombstoned) chunks"""
+        return self.conn.execute("SELECT COUNT(*) FROM chunks WHERE deleted = 0").fetchone()[0]
+
+    def tombstone_count(self):
+        """Number of tombstoned chunks still present in the index"""
+        return self.get_meta("tombstones", 0)
+
+    def add_chunks(self, chunks, start_id=None):
+        """
+        Insert chunks
+
+        Args:
+            chunks: Chunk dictionaries with text, source, timestamp, start, end
+                and optionally id, content_hash and header_path
+            start_id: Id of the first chunk without an id, defaults to newly
+                allocated ids
+
+        Returns:
+            List of assigned ids
+        """
+        if start_id is None:
+            missing = sum(1 for chunk in chunks if "id" not in chunk)
+            fresh_ids = iter(self.allocate_ids(missing))
+        else:
+            fresh_ids = iter(range(start_id, start_id + len(chunks)))
+
+        rows = []
+        for chunk in chunks:
+            rows.append((
+                chunk["id"] if "id" in chunk else next(fresh_ids),
+                self._source_id(chunk["source"]),
+                chunk.get("timestamp"),
+                chunk.get("start"),
+                chunk.get("end"),
+                chunk["text"],
+                chunk.get("content_hash") or chunk_hash(chunk["text"]),
+                chunk.get("header_path")
+            ))
+
+        self.conn.executemany(
+            "INSERT INTO chunks (id, source_id, timestamp, start, end, text, content_hash, header_path) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        return [row[0] for row in rows]
+
+    def chunk_hashes(self, source):
+        """
+        Live chunks of a source
+
+        Returns:
+            List of (id, content_hash) tuples in id order
+        """
+        return self.conn.execute(
+            "SELECT c.id, c.content_hash FROM chunks c JOIN sources s ON s.id = c.source_id "
+            "WHERE s.name = ? AND c.deleted = 0 ORDER BY c.id",
+            (source,)
+        ).fetchall()
+
+    def delete_chunks(self, ids, tombstone=False):
+        """
+        Remove chunks whose vectors were removed from the index
+
+        Args:
+            ids: Chunk ids
+            tombstone: Keep the rows but hide them, for indexes that cannot
+                remove vectors; purge them once the index is rebuilt
+        """
+        rows = [(int(i),) for i in ids]
+        if tombstone:
+            self.conn.executemany("UPDATE chunks SET deleted = 1 WHERE id = ?", rows)
+            self.set_meta("tombstones", self.tombstone_count() + len(rows))
+        else:
+            self.conn.executemany("DELETE FROM chunks WHERE id = ?", rows)
+            self.conn.executemany("DELETE FROM vectors WHERE id = ?", rows)
+
+    def tombstoned_ids(self):
+        """Ids of tombstoned chunks"""
+        return [row[0] for row in self.conn.execute("SELECT id FROM chunks WHERE deleted = 1")]
+
+    def purge_tombstones(self):
+        """Delete tombstoned rows after their vectors were dropped from the index"""
+        self.conn.execute("DELETE FROM vectors WHERE id IN (SELECT id FROM chunks WHERE deleted = 1)")
+        self.conn.execute("DELETE FROM chunks WHERE deleted = 1")
+        self.set_meta("tombstones", 0)
+
+    def set_vectors(self, ids, blobs):
+        """Store the re-rank vectors (float16 bytes) of chunks"""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO vectors (id, vector) VALUES (?, ?)",
+            [(int(i), blob) for i, blob in zip(ids, blobs)]
+        )
+
+    def get_vectors(self, ids):
+        """
+        Fetch re-rank vectors by FAISS id
+
+        Returns:
+            Dictionary of id -> float16 bytes for the ids that have one
+        """
+        ids = [int(i) for i in ids]
+        if not ids:
+            return {}
+
+        placeholders = ",".join("?" * len(ids))
+        return dict(self.conn.execute(
+            f"SELECT id, vector FROM vectors WHERE id IN ({placeholders})", ids
+        ).fetchall())
+
+    def iter_vectors(self, batch_size=10000):
+        """Iterate over batches of (id, float16 bytes) re-rank vectors of live chunks in id order"""
+        last_id = -1
+        while True:
+            rows = self.conn.execute(
+                "SELECT v.id, v.vector FROM vectors v JOIN chunks c ON c.id = v.id "
+                "WHERE v.id > ? AND c.deleted = 0 ORDER BY v.id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def vector_count(self):
+        """Number of stored re-rank vectors"""
+        return self.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def clear_vectors(self):
+        """Drop all re-rank vectors"""
+        self.conn.execute("DELETE FROM vectors")
+
+    @staticmethod
+    def match_expression(query):
+        """
+        FTS5 query matching any term of a free-text query
+
+        Terms are quoted, so punctuation and FTS syntax in the query are taken
+        literally; dotted names become phrases of their parts.
+
+        Returns:
+            Match expression, or None if the query has no terms
+        """
+        terms = []
+        for term in TERM_PATTERN.findall(query):
+            parts = [part for part in term.split(".") if part.strip("-")]
+            if parts:
+                terms.append('"' + " ".join(parts).replace('"', '""') + '"')
+        return " OR ".join(dict.fromkeys(terms)) if terms else None
+
+    def keyword_search(self, query, limit=20):
+        """
+        BM25-ranked keyword search over live chunks
+
+        Returns:
+            List of (id, score) tuples, best first; higher scores are better
+        """
+        expression = self.match_expression(query)
+        conn = self.conn  # Opening the store detects FTS5
+        if expression is None or not self.keyword_index:
+            return []
+
+        rows = conn.execute(
+            "SELECT f.rowid, bm25(chunks_fts) AS rank FROM chunks_fts f "
+            "JOIN chunks c ON c.id = f.rowid "
+            "WHERE chunks_fts MATCH ? AND c.deleted = 0 ORDER BY rank LIMIT ?",
+            (expression, limit)
+        ).fetchall()
+        # SQLite's bm25() is negative, more negative is better
+        return [(chunk_id, -rank) for chunk_id, rank in rows]
+
+    def get_file(self, source):
+        """
+        Indexing state of a source file
+
+        Returns:
+            Dictionary with content_hash, mtime, size and the chunker the file
+            was chunked with (None for files indexed before it was recorded), or None
+        """
+        row = self.conn.execute(
+            "SELECT content_hash, mtime, size, chunker FROM files WHERE source = ?", (source,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"content_hash": row[0], "mtime": row[1], "size": row[2], "chunker": row[3]}
+
+    def set_file(self, source, content_hash, mtime, size, chunker=None):
+        """Record the indexed state of a source file"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (source, content_hash, mtime, size, indexed_at, chunker) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (source, content_hash, mtime, size, datetime.now().isoformat(), chunker)
+        )
+
+    def get_chunks(self, ids):
+        """
+        Fetch chunks by FAISS id
+
+        Returns:
+            Dictionary of id -> chunk for the ids that exist
+        """
+        ids = [int(i) for i in ids]
+        if not ids:
+            return {}
+
+        placeholders = ",".join("?" * len(ids))
+        rows = self.conn.execute(
+            f"SELECT {CHUNK_COLUMNS} "
+            f"FROM chunks c JOIN sources s ON s.id = c.source_id "
+            f"WHERE c.id IN ({placeholders}) AND c.deleted = 0",
+            ids
+        ).fetchall()
+
+        return {row[0]: _chunk_from_row(row) for row in rows}
+
+    def get(self, chunk_id):
+        """Fetch a single chunk by FAISS id"""
+        return self.get_chunks([chunk_id]).get(int(chunk_id))
+
+    def iter_chunks(self, batch_size=1000):
+        """Iterate over all live chunks in id order"""
+        last_id = -1
+        while True:
+            rows = self.conn.execute(
+                f"SELECT {CHUNK_COLUMNS} "
+                "FROM chunks c JOIN sources s ON s.id = c.source_id "
+                "WHERE c.id > ? AND c.deleted = 0 ORDER BY c.id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _chunk_from_row(row)
+            last_id = rows[-1][0]
+
+    def source_counts(self):
+        """Number of chunks per source"""
+        rows = self.conn.execute(
+            "SELECT s.name, COUNT(c.id) FROM sources s JOIN chunks c ON c.source_id = s.id "
+            "WHERE c.deleted = 0 GROUP BY s.id"
+        ).fetchall()
+        return {name: count for name, count in rows}
+
+    def clear(self):
+        """Remove all chunks and sources (committed with the next commit)"""
+        self.conn.execute("DELETE FROM chunks")
+        self.conn.execute("DELETE FROM vectors")
+        self.conn.execute("DELETE FROM sources")
+        self.conn.execute("DELETE FROM files")
+        self.set_meta("tombstones", 0)
+        self._source_ids = {}
+
+    def size_bytes(self):
+        """On-disk size of the database including the WAL file"""
+        total = 0
+        for path in (self.path, self.path + "-wal"):
+            if os.path.exists(path):
+                total += os.path.getsize(path)
+        return total